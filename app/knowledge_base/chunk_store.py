@@ -0,0 +1,240 @@
+import os
+import json
+import mmap
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Optional, Union
+import numpy as np
+from langchain_core.documents import Document
+
+# Chunk files written next to the FAISS index: texts, one row per chunk, chunk ids, and the
+# interned source names / extra metadata. None of them is pickled.
+CHUNK_TEXT_NAME = 'chunks.bin'
+CHUNK_TABLE_NAME = 'chunks.npy'
+CHUNK_IDS_NAME = 'chunk_ids.npy'
+CHUNK_ID_ORDER_NAME = 'chunk_id_order.npy'
+CHUNK_META_NAME = 'chunks.json'
+CHUNK_FILES = (CHUNK_TEXT_NAME, CHUNK_TABLE_NAME, CHUNK_IDS_NAME, CHUNK_ID_ORDER_NAME, CHUNK_META_NAME)
+# Decoded chunks kept per process for hot chunks (0 disables the cache)
+CHUNK_CACHE_SIZE = int(os.getenv("CHUNK_CACHE_SIZE", "256"))
+
+# Row i describes the chunk at FAISS position i; page is -1 when unknown
+CHUNK_TABLE_DTYPE = np.dtype([
+    ("text_start", "<i8"), ("text_end", "<i8"), ("source", "<i4"), ("page", "<i4"), ("extra", "<i4"),
+])
+
+
+def _encode_chunk(doc, sources: dict, extras: dict) -> tuple:
+    """(UTF-8 text, source, page, extra) of a Document, interning its source and extra metadata."""
+    metadata = dict(getattr(doc, 'metadata', None) or {})
+    text = getattr(doc, 'page_content', '').encode('utf-8')
+    source = str(metadata.pop('source', ''))
+    page = metadata.get('page')
+    if isinstance(page, int) and 0 <= page < 2 ** 31:
+        metadata.pop('page')
+    else:
+        page = -1
+    extra = json.dumps(metadata, sort_keys=True, default=str)
+    return text, sources.setdefault(source, len(sources)), page, extras.setdefault(extra, len(extras))
+
+
+def _save_chunk_rows(index_dir: str, table: np.ndarray, ids: list, sources: list, extras: list):
+    """Writes every chunk file except the texts."""
+    encoded_ids = np.asarray([chunk_id.encode('utf-8') for chunk_id in ids], dtype=bytes)
+    if not len(ids):
+        encoded_ids = np.zeros(0, dtype='S1')
+    np.save(os.path.join(index_dir, CHUNK_TABLE_NAME), table)
+    np.save(os.path.join(index_dir, CHUNK_IDS_NAME), encoded_ids)
+    np.save(os.path.join(index_dir, CHUNK_ID_ORDER_NAME), np.argsort(encoded_ids, kind='stable').astype(np.int64))
+    with open(os.path.join(index_dir, CHUNK_META_NAME), 'w') as f:
+        json.dump({"count": len(table), "sources": sources, "extras": extras}, f)
+
+
+def write_chunk_store(index_dir: str, vector_store):
+    """
+    Writes the chunks of a FAISS store's docstore, in index order, as flat files: UTF-8 texts
+    back to back, a fixed-size row per chunk, the chunk ids, and a small JSON table of the
+    distinct sources and extra metadata the rows point into.
+    """
+    count = len(vector_store.index_to_docstore_id)
+    table = np.zeros(count, dtype=CHUNK_TABLE_DTYPE)
+    ids, sources, extras = [], {}, {}
+    with open(os.path.join(index_dir, CHUNK_TEXT_NAME), 'wb') as text_file:
+        offset = 0
+        for position in range(count):
+            chunk_id = vector_store.index_to_docstore_id[position]
+            text, source, page, extra = _encode_chunk(vector_store.docstore.search(chunk_id), sources, extras)
+            table[position] = (offset, offset + len(text), source, page, extra)
+            text_file.write(text)
+            offset += len(text)
+            ids.append(chunk_id)
+    _save_chunk_rows(index_dir, table, ids, list(sources), [json.loads(e) for e in extras])
+
+
+def has_chunk_store(index_dir: str) -> bool:
+    return all(os.path.exists(os.path.join(index_dir, name)) for name in CHUNK_FILES)
+
+
+class ChunkStore:
+    """
+    Read-only docstore over the chunk files of an index directory.
+    Texts, rows and ids are memory-mapped, so worker processes serving the same index share
+    those pages through the OS page cache instead of each holding unpickled copies. Documents
+    are only materialized for the chunks a search returns; the most recently used ones are
+    kept decoded in a small LRU (cache_size).
+    """
+
+    def __init__(self, index_dir: str, cache_size: int = CHUNK_CACHE_SIZE):
+        self.index_dir = index_dir
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._table = np.load(os.path.join(index_dir, CHUNK_TABLE_NAME), mmap_mode='r', allow_pickle=False)
+        self._ids = np.load(os.path.join(index_dir, CHUNK_IDS_NAME), mmap_mode='r', allow_pickle=False)
+        self._id_order = np.load(os.path.join(index_dir, CHUNK_ID_ORDER_NAME), mmap_mode='r', allow_pickle=False)
+        with open(os.path.join(index_dir, CHUNK_META_NAME), 'r') as f:
+            meta = json.load(f)
+        self._sources = meta["sources"]
+        self._extras = meta["extras"]
+        if not len(self._table) == len(self._ids) == len(self._id_order) == meta["count"]:
+            raise ValueError(f"Chunk files in {index_dir} do not match")
+        with open(os.path.join(index_dir, CHUNK_TEXT_NAME), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def id_at(self, position: int) -> str:
+        return self._ids[position].decode('utf-8')
+
+    def position(self, chunk_id: str) -> Optional[int]:
+        """FAISS position of a chunk id (binary search over the sorted ids), or None."""
+        key = np.bytes_(chunk_id.encode('utf-8'))
+        i = int(np.searchsorted(self._ids, key, sorter=self._id_order))
+        if i < len(self._id_order):
+            position = int(self._id_order[i])
+            if self._ids[position] == key:
+                return position
+        return None
+
+    def _read(self, position: int) -> tuple:
+        row = self._table[position]
+        metadata = dict(self._extras[row["extra"]])
+        metadata["source"] = self._sources[row["source"]]
+        if row["page"] >= 0:
+            metadata["page"] = int(row["page"])
+        text = self._text[int(row["text_start"]):int(row["text_end"])].decode('utf-8')
+        return text, metadata, self.id_at(position)
+
+    def document(self, position: int) -> Document:
+        """The chunk at a FAISS position, as a new Document (callers may modify it)."""
+        with self._cache_lock:
+            cached = self._cache.get(position)
+            if cached is not None:
+                self._cache.move_to_end(position)
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        if cached is None:
+            cached = self._read(position)
+            if self.cache_size > 0:
+                with self._cache_lock:
+                    self._cache[position] = cached
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        text, metadata, chunk_id = cached
+        return Document(page_content=text, metadata=dict(metadata), id=chunk_id)
+
+    def search(self, search: str) -> Union[Document, str]:
+        """Docstore interface: the Document with this id, or a message string if there is none."""
+        position = self.position(search)
+        if position is None:
+            return f"ID {search} not found."
+        return self.document(position)
+
+    def index_to_docstore_id(self) -> "ChunkIds":
+        return ChunkIds(self)
+
+    def to_docstore(self):
+        """
+        Writable copy for incremental ingest: (InMemoryDocstore, {position: chunk id}) with
+        every chunk materialized, read from the chunk files instead of a pickle.
+        """
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        index_to_docstore_id, documents = {}, {}
+        for position in range(len(self)):
+            text, metadata, chunk_id = self._read(position)
+            index_to_docstore_id[position] = chunk_id
+            documents[chunk_id] = Document(page_content=text, metadata=metadata, id=chunk_id)
+        return InMemoryDocstore(documents), index_to_docstore_id
+
+    def write_updated(self, index_dir: str, keep: np.ndarray, documents: list):
+        """
+        Writes chunk files holding the rows where keep is True, in order, followed by the
+        Documents (each with its chunk id in .id). Kept texts are copied as raw bytes, runs of
+        adjacent rows in one write, without decoding a single chunk.
+        """
+        table = np.array(self._table[keep])
+        ids = [chunk_id.decode('utf-8') for chunk_id in self._ids[keep]]
+        sources = {source: i for i, source in enumerate(self._sources)}
+        extras = {json.dumps(extra, sort_keys=True, default=str): i for i, extra in enumerate(self._extras)}
+        starts, ends = table["text_start"].copy(), table["text_end"].copy()
+        rows = []
+        with open(os.path.join(index_dir, CHUNK_TEXT_NAME), 'wb') as text_file:
+            if len(table):
+                breaks = np.flatnonzero(starts[1:] != ends[:-1]) + 1
+                for first, last in zip(np.r_[0, breaks], np.r_[breaks, len(table)] - 1):
+                    text_file.write(self._text[int(starts[first]):int(ends[last])])
+            lengths = ends - starts
+            table["text_end"] = np.cumsum(lengths)
+            table["text_start"] = table["text_end"] - lengths
+            offset = int(table["text_end"][-1]) if len(table) else 0
+            for doc in documents:
+                text, source, page, extra = _encode_chunk(doc, sources, extras)
+                rows.append((offset, offset + len(text), source, page, extra))
+                text_file.write(text)
+                offset += len(text)
+                ids.append(doc.id)
+        table = np.concatenate([table, np.asarray(rows, dtype=CHUNK_TABLE_DTYPE)])
+        # Drop sources and extra metadata no row points to any more
+        used_sources, table["source"] = np.unique(table["source"], return_inverse=True)
+        used_extras, table["extra"] = np.unique(table["extra"], return_inverse=True)
+        sources, extras = list(sources), list(extras)
+        _save_chunk_rows(index_dir, table, ids, [sources[i] for i in used_sources],
+                         [json.loads(extras[i]) for i in used_extras])
+
+    def source_counts(self) -> dict:
+        """{source: number of chunks}, counted from the rows alone (no text is read)."""
+        counts = np.bincount(self._table["source"], minlength=len(self._sources))
+        return {source: int(count) for source, count in zip(self._sources, counts) if count}
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            cached = len(self._cache)
+        return {"chunks": len(self), "text_bytes": len(self._text), "sources": len(self._sources),
+                "cached": cached, "cache_hits": self.cache_hits, "cache_misses": self.cache_misses}
+
+
+class ChunkIds(Mapping):
+    """
+    FAISS position -> chunk id, read from the memory-mapped ids (the index_to_docstore_id
+    mapping LangChain's FAISS expects, without a per-process dict).
+    """
+
+    def __init__(self, store: ChunkStore):
+        self._store = store
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self._store):
+            raise KeyError(position)
+        return self._store.id_at(position)
+
+    def __iter__(self):
+        return iter(range(len(self._store)))
+
+    def __len__(self) -> int:
+        return len(self._store)
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+
+# Max number of query embeddings kept in memory
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+# Optional SQLite file for the persistent tier (disabled when empty)
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", "")
+
+logger = logging.getLogger("embedding_cache")
+
+
+def embedding_model_name(embeddings) -> str:
+    """
+    Returns the model name of an embeddings client, used as part of the cache key.
+    """
+    for attr in ("model", "model_name", "deployment"):
+        value = getattr(embeddings, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    return type(embeddings).__name__
+
+
+def embed_queries(embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embeds a batch of queries in one request (through the query cache when there is one).
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return embeddings.embed_documents(texts)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings client and caches query embeddings.
+    Keys are (model name, query text); the retriever passes the output of translate_query,
+    so repeated normalized queries skip the remote embedding call.
+    Tier 1 is a bounded in-memory LRU, tier 2 an optional SQLite table that survives restarts.
+    Document embeddings (ingestion) are passed through uncached.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = EMBEDDING_CACHE_SIZE,
+                 db_path: Optional[str] = EMBEDDING_CACHE_DB):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, query))"
+            )
+            self._db.commit()
+
+    @property
+    def model_name(self) -> str:
+        return embedding_model_name(self.embeddings)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = (self.model_name, text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self._store(key, self.embeddings.embed_query(text))
+        return list(vector)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = (self.model_name, text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self._store(key, await self.embeddings.aembed_query(text))
+        return list(vector)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds many queries: cached ones are served from the cache, the rest in one request.
+        """
+        model = self.model_name
+        vectors = [self._lookup((model, text)) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            fresh = dict(zip(missing, (self._store((model, text), vector)
+                                       for text, vector in zip(missing, self.embeddings.embed_documents(missing)))))
+            vectors = [vector if vector is not None else fresh[text] for text, vector in zip(texts, vectors)]
+        return [list(vector) for vector in vectors]
+
+    def _lookup(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?", key
+                ).fetchone()
+                if row is not None:
+                    vector = array("f", row[0])
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def _store(self, key, vector):
+        packed = array("f", vector)
+        with self._lock:
+            self._remember(key, packed)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO query_embeddings (model, query, vector) VALUES (?, ?, ?)",
+                        (key[0], key[1], packed.tobytes()),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not persist query embedding: {e}")
+        return packed
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, model_name: Optional[str] = None):
+        """
+        Drops cached embeddings. Call this when the embedding model changes.
+        model_name: only drop entries of this model; None drops everything.
+        """
+        with self._lock:
+            if model_name is None:
+                self._memory.clear()
+            else:
+                for key in [key for key in self._memory if key[0] == model_name]:
+                    del self._memory[key]
+            if self._db is not None:
+                if model_name is None:
+                    self._db.execute("DELETE FROM query_embeddings")
+                else:
+                    self._db.execute("DELETE FROM query_embeddings WHERE model = ?", (model_name,))
+                self._db.commit()
+        logger.info(f"Query embedding cache invalidated (model={model_name or 'all'})")
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters of the query embedding cache."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
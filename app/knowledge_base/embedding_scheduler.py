@@ -0,0 +1,212 @@
+import os
+import time
+import random
+import sqlite3
+import logging
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+import openai
+from app.knowledge_base.embedding_cache import embedding_model_name
+from app.services.core.tokens import estimate_tokens
+
+# Texts per embedding request
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Max concurrent embedding requests
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+# Token-per-minute budget for pacing requests (0 disables pacing)
+EMBED_TOKENS_PER_MINUTE = int(os.getenv("EMBED_TOKENS_PER_MINUTE", "1000000"))
+# Retries per batch on throttling, server and connection errors
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+# Backoff bounds in seconds
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+logger = logging.getLogger("embedding_scheduler")
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    True for throttling (429), server (5xx) and connection errors.
+    """
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Returns the Retry-After header of a provider error, if any.
+    """
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at tokens_per_minute / 60 per second.
+    acquire() blocks until the requested budget is available.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        if self.capacity <= 0:
+            return
+        # A request larger than the whole budget waits for a full bucket
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingCheckpoint:
+    """
+    SQLite table of already embedded chunks keyed by (model, chunk id).
+    Lets an interrupted ingest resume without re-embedding finished batches.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "model TEXT NOT NULL, chunk_id TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, chunk_id))"
+        )
+        self._db.commit()
+
+    def get_many(self, model: str, chunk_ids: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            for start in range(0, len(chunk_ids), 500):
+                part = chunk_ids[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT chunk_id, vector FROM chunk_embeddings WHERE model = ? "
+                    f"AND chunk_id IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                ).fetchall()
+                found.update((chunk_id, list(array("f", blob))) for chunk_id, blob in rows)
+        return found
+
+    def put_many(self, model: str, chunk_ids: List[str], vectors: List[List[float]]):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (model, chunk_id, vector) VALUES (?, ?, ?)",
+                [(model, chunk_id, array("f", vector).tobytes()) for chunk_id, vector in zip(chunk_ids, vectors)],
+            )
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM chunk_embeddings")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class EmbeddingScheduler:
+    """
+    Embeds document chunks for indexing in batches of batch_size, with at most max_in_flight
+    concurrent requests, pacing to tokens_per_minute and retrying throttled or failed batches
+    with exponential backoff and jitter. With a checkpoint, finished batches are persisted
+    by chunk id so a crashed ingest resumes where it stopped.
+    """
+
+    def __init__(self, embeddings, batch_size: int = EMBED_BATCH_SIZE, max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+                 tokens_per_minute: int = EMBED_TOKENS_PER_MINUTE, max_retries: int = EMBED_MAX_RETRIES,
+                 checkpoint: Optional[EmbeddingCheckpoint] = None):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.checkpoint = checkpoint
+        self.bucket = TokenBucket(tokens_per_minute)
+        self.model = embedding_model_name(embeddings)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.embedded = 0
+        self.resumed = 0
+
+    def embed(self, texts: List[str], ids: Optional[List[str]] = None) -> List[List[float]]:
+        """
+        Returns one vector per text, in input order.
+        ids: chunk ids used as checkpoint keys (required for resuming).
+        """
+        vectors = [None] * len(texts)
+        if self.checkpoint is not None and ids:
+            done = self.checkpoint.get_many(self.model, ids)
+            for i, chunk_id in enumerate(ids):
+                if chunk_id in done:
+                    vectors[i] = done[chunk_id]
+            with self._lock:
+                self.resumed += len(done)
+        todo = [i for i, vector in enumerate(vectors) if vector is None]
+        batches = [todo[start:start + self.batch_size] for start in range(0, len(todo), self.batch_size)]
+        if not batches:
+            return vectors
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(batches))) as pool:
+            futures = {pool.submit(self._embed_batch, [texts[i] for i in batch]): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                batch_vectors = future.result()
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+                if self.checkpoint is not None and ids:
+                    self.checkpoint.put_many(self.model, [ids[i] for i in batch], batch_vectors)
+        return vectors
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(text) for text in texts)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(tokens)
+            with self._lock:
+                self.requests += 1
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+                # Full jitter, but never earlier than the provider asked for
+                delay = max(random.uniform(0, delay), retry_after_seconds(e) or 0.0)
+                with self._lock:
+                    self.retries += 1
+                logger.warning(f"Embedding batch failed ({e}), retry {attempt + 1} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            with self._lock:
+                self.embedded += len(texts)
+            return vectors
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "requests": self.requests,
+            "retries": self.retries,
+            "embedded": self.embedded,
+            "resumed": self.resumed,
+        }
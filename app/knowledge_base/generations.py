@@ -0,0 +1,66 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+
+# File in the index directory naming the generation (subdirectory) being served
+CURRENT_NAME = 'CURRENT'
+# Published generations kept on disk: the current one and the one before it, which readers
+# that started loading just before the switch may still be reading
+KEEP_GENERATIONS = 2
+GENERATION_PREFIX = 'gen-'
+
+
+def current_dir(index_dir: str) -> str:
+    """
+    Directory holding the index files being served: the generation named by CURRENT, or
+    index_dir itself for indexes written before generations existed (and for a generation
+    directory passed in directly).
+    """
+    try:
+        with open(os.path.join(index_dir, CURRENT_NAME), 'r') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return index_dir
+    if not name.startswith(GENERATION_PREFIX) or os.path.basename(name) != name:
+        raise ValueError(f"Invalid {CURRENT_NAME} file in {index_dir}: {name!r}")
+    return os.path.join(index_dir, name)
+
+
+def new_generation(index_dir: str) -> str:
+    """Creates an empty, unpublished directory to write the next generation's files into."""
+    os.makedirs(index_dir, exist_ok=True)
+    return tempfile.mkdtemp(prefix='.gen_tmp_', dir=index_dir)
+
+
+def publish_generation(index_dir: str, written_dir: str) -> str:
+    """
+    Makes a fully written generation the served one: the directory is renamed to its final
+    name and CURRENT is replaced in one atomic rename, so a reader sees either every file of
+    the old generation or every file of the new one. Older generations (beyond
+    KEEP_GENERATIONS) and index files of the pre-generation layout are removed afterwards.
+    Returns the generation directory.
+    """
+    name = f"{GENERATION_PREFIX}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    generation = os.path.join(index_dir, name)
+    os.rename(written_dir, generation)
+    pointer = os.path.join(index_dir, f".{CURRENT_NAME}.{uuid.uuid4().hex}.tmp")
+    with open(pointer, 'w') as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(index_dir, CURRENT_NAME))
+    _prune(index_dir)
+    return generation
+
+
+def _prune(index_dir: str):
+    generations = sorted(name for name in os.listdir(index_dir) if name.startswith(GENERATION_PREFIX))
+    for name in generations[:-KEEP_GENERATIONS]:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+    # Files of the layout before generations, left over in the index directory itself
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if name != CURRENT_NAME and not name.startswith('.') and os.path.isfile(path):
+            os.remove(path)
@@ -0,0 +1,205 @@
+import os
+import time
+import uuid
+import fcntl
+import logging
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from app.knowledge_base.chunk_store import ChunkStore
+from app.knowledge_base.vector_store import shared_vector_store
+
+# Directory with PDF files
+PDFS_DIR = os.path.join(os.path.dirname(__file__), 'pdfs')
+# Directory to store FAISS index
+INDEX_DIR = os.path.join(os.path.dirname(__file__), 'faiss_index')
+# Largest PDF accepted for upload
+ADMIN_MAX_UPLOAD_BYTES = int(os.getenv("ADMIN_MAX_UPLOAD_MB", "50")) * 2 ** 20
+# Finished jobs kept for status queries
+JOB_HISTORY = 100
+
+logger = logging.getLogger("index_admin")
+
+
+def source_counts(vector_store) -> dict:
+    """{source: number of chunks} of a FAISS store."""
+    if isinstance(vector_store.docstore, ChunkStore):
+        return vector_store.docstore.source_counts()
+    return dict(Counter(vector_store.docstore.search(chunk_id).metadata.get("source")
+                        for chunk_id in vector_store.index_to_docstore_id.values()))
+
+
+def validate_source(source: str) -> str:
+    """A source is the file name of a PDF in the pdfs directory."""
+    if os.path.basename(source) != source or source.startswith('.') or not source.lower().endswith('.pdf'):
+        raise ValueError(f"Invalid source name: {source!r} (expected a file name ending in .pdf)")
+    return source
+
+
+class IndexWriter:
+    """
+    Adds and removes PDFs of the served index at runtime. Changes are applied one at a time on
+    a background thread to the published index (see ingest_and_index.update_source): only the
+    changed PDF is split and embedded and appended to the index, the chunks of a removed PDF
+    are deleted by their chunk ids, nothing else is re-read, retrained or re-tokenized. The new
+    generation is published atomically and swapped into the shared store. The first document,
+    or an index without chunk files, goes through the full incremental ingest instead. Readers keep serving the
+    generation they started with and never wait for a write; other worker processes pick the
+    new index up on their next reload check. A lock file serializes writers across processes.
+    """
+
+    def __init__(self, pdfs_dir: str = PDFS_DIR, index_dir: str = INDEX_DIR, store=shared_vector_store,
+                 **ingest_options):
+        self.pdfs_dir = pdfs_dir
+        self.index_dir = index_dir
+        self.store = store
+        self.ingest_options = ingest_options
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-writer")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def add_document(self, source: str, content: bytes) -> dict:
+        """Queues adding (or replacing) a PDF. Returns the job."""
+        validate_source(source)
+        if not content.startswith(b"%PDF-"):
+            raise ValueError("Uploaded file is not a PDF")
+        if len(content) > ADMIN_MAX_UPLOAD_BYTES:
+            raise ValueError(f"PDF is larger than {ADMIN_MAX_UPLOAD_BYTES // 2 ** 20} MB")
+        return self._submit("add", source, lambda: self._write_pdf(source, content))
+
+    def remove_document(self, source: str) -> dict:
+        """Queues removing a PDF and all its chunks. Returns the job; KeyError for unknown sources."""
+        validate_source(source)
+        vector_store = self._served()
+        known = os.path.exists(os.path.join(self.pdfs_dir, source)) or self._pending(source) \
+            or (vector_store is not None and source in source_counts(vector_store))
+        if not known:
+            raise KeyError(source)
+        return self._submit("remove", source, lambda: self._write_pdf(source, None))
+
+    def sources(self) -> dict:
+        """Sources of the index being served, with their chunk counts."""
+        vector_store = self._served()
+        if vector_store is None:
+            return {"sources": [], "chunks": 0}
+        counts = source_counts(vector_store)
+        return {
+            "sources": [{"source": source, "chunks": count} for source, count in sorted(counts.items())],
+            "chunks": vector_store.index.ntotal,
+        }
+
+    def job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(job["status"] in ("queued", "running") for job in self._jobs.values())
+        return {"pending": pending, "completed": self.completed, "failed": self.failed}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _served(self):
+        """The store being served, or None while there is no index yet."""
+        try:
+            return self.store.get()
+        except Exception as e:
+            logger.warning(f"No index to report on: {e}")
+            return None
+
+    def _pending(self, source: str) -> bool:
+        with self._lock:
+            return any(job["source"] == source and job["status"] in ("queued", "running")
+                       for job in self._jobs.values())
+
+    def _submit(self, kind: str, source: str, change) -> dict:
+        job = {"id": uuid.uuid4().hex, "kind": kind, "source": source, "status": "queued",
+               "submitted_at": time.time(), "finished_at": None, "report": None, "error": None}
+        with self._lock:
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > JOB_HISTORY:
+                oldest = next(iter(self._jobs))
+                if self._jobs[oldest]["status"] in ("queued", "running"):
+                    break
+                del self._jobs[oldest]
+        self._executor.submit(self._run, job, change)
+        return dict(job)
+
+    def _run(self, job: dict, change):
+        with self._lock:
+            job["status"] = "running"
+        try:
+            report = self._apply(job, change)
+        except Exception as e:
+            logger.error(f"Index {job['kind']} of {job['source']} failed: {e}", exc_info=True)
+            with self._lock:
+                job.update(status="failed", error=str(e), finished_at=time.time())
+                self.failed += 1
+            return
+        with self._lock:
+            job.update(status="done", report=report, finished_at=time.time())
+            self.completed += 1
+
+    def _apply(self, job: dict, change) -> dict:
+        from app.knowledge_base.ingest_and_index import ingest_all_pdfs_to_faiss, load_manifest, update_source
+        os.makedirs(self.pdfs_dir, exist_ok=True)
+        lock_path = os.path.abspath(self.index_dir).rstrip(os.sep) + '.lock'
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            options = dict(self.ingest_options)
+            # Keep the index type the index was built with (an IVF or HNSW index must not turn flat)
+            index_type = load_manifest(self.index_dir).get("index", {}).get("type")
+            if index_type is not None:
+                options.setdefault("index_type", index_type)
+            undo = change()
+            try:
+                report = None
+                if options.get("index_type") == index_type:
+                    pdf_path = os.path.join(self.pdfs_dir, job["source"]) if job["kind"] == "add" else None
+                    report = update_source(self.index_dir, job["source"], pdf_path, embeddings=self.store.embeddings)
+                if report is None:
+                    # No index to update in place (or a different index type requested): full ingest
+                    report = ingest_all_pdfs_to_faiss(pdfs_dir=self.pdfs_dir, index_dir=self.index_dir,
+                                                      embeddings=self.store.embeddings, **options)
+            except Exception:
+                # Leave the pdfs directory as the index on disk describes it
+                undo()
+                raise
+        # Serve the new generation right away instead of at the next reload check
+        self.store.reload()
+        return report
+
+    def _write_pdf(self, source: str, content: Optional[bytes]):
+        """Writes (or with content=None deletes) a PDF atomically. Returns a function restoring the old file."""
+        path = os.path.join(self.pdfs_dir, source)
+        previous = None
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                previous = f.read()
+        if content is None:
+            if previous is not None:
+                os.remove(path)
+        else:
+            tmp_path = os.path.join(self.pdfs_dir, f".{source}.{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        def undo():
+            if previous is None:
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                with open(path, 'wb') as f:
+                    f.write(previous)
+
+        return undo
+
+
+# Writer for the process-wide store
+index_writer = IndexWriter()
@@ -0,0 +1,165 @@
+import os
+import math
+import logging
+import numpy as np
+import faiss
+
+# Index built at ingest: "flat" (exact), "ivf_flat", "ivf_pq" or "hnsw"
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+# IVF cells (0 picks about 4 * sqrt(n), bounded so every cell gets enough training points)
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "0"))
+# PQ sub-quantizers (bytes per vector with 8-bit codes)
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "64"))
+# HNSW graph degree and build-time beam width
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+# Max vectors used to train IVF/PQ quantizers
+FAISS_TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "50000"))
+# Query-time knobs: IVF cells visited and HNSW search beam width
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+# Serve memory-mapped index files (IVF lists, flat vectors) and chunk files instead of reading them
+# into RAM, so all worker processes share the same pages
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+# Exact vectors kept next to compressed/graph indexes so incremental ingest can rebuild them
+VECTORS_NAME = 'vectors.npy'
+# IVF training wants about this many points per cell
+MIN_POINTS_PER_CELL = 39
+PQ_MIN_TRAIN_POINTS = 256
+
+logger = logging.getLogger("index_factory")
+
+
+def default_nlist(n_vectors: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // MIN_POINTS_PER_CELL))
+
+
+def factory_string(index_type: str, dimensions: int, n_vectors: int, nlist: int = FAISS_NLIST,
+                   pq_m: int = FAISS_PQ_M, hnsw_m: int = FAISS_HNSW_M) -> str:
+    """
+    faiss.index_factory description for an index type, sized for n_vectors.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+    nlist = nlist or default_nlist(n_vectors)
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    # Sub-quantizers must divide the dimension; "np" skips polysemous training (slow, unused here)
+    m = max(d for d in range(1, min(pq_m, dimensions) + 1) if dimensions % d == 0)
+    return f"IVF{nlist},PQ{m}np"
+
+
+def build_index(vectors: np.ndarray, index_type: str = FAISS_INDEX_TYPE, nlist: int = FAISS_NLIST,
+                pq_m: int = FAISS_PQ_M, hnsw_m: int = FAISS_HNSW_M, seed: int = 0) -> faiss.Index:
+    """
+    Builds an L2 index of the given type over the vectors. IVF/PQ quantizers are trained on a
+    random sample of at most FAISS_TRAIN_SAMPLE vectors. Collections too small to train product
+    quantization fall back to IVF-Flat, and an empty collection (every document removed) gets an
+    empty flat index, since there is nothing to train a quantizer on.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dimensions = vectors.shape
+    if not n_vectors:
+        return faiss.IndexFlatL2(dimensions)
+    if index_type == "ivf_pq" and n_vectors < PQ_MIN_TRAIN_POINTS:
+        logger.warning(f"{n_vectors} vectors are too few to train PQ, building ivf_flat instead")
+        index_type = "ivf_flat"
+    index = faiss.index_factory(dimensions, factory_string(index_type, dimensions, n_vectors, nlist, pq_m, hnsw_m),
+                                faiss.METRIC_L2)
+    if index_type == "hnsw":
+        faiss.downcast_index(index).hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n_vectors, min(n_vectors, FAISS_TRAIN_SAMPLE), replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def update_index(index, keep: np.ndarray, added: np.ndarray, kept_vectors: np.ndarray = None) -> faiss.Index:
+    """
+    Applies removals and additions to a (writable) index in place, without retraining: rows
+    where keep is False are dropped and the added vectors appended, so positions are the kept
+    rows in order followed by the new ones. Flat indexes drop rows directly; IVF/PQ and HNSW
+    indexes cannot renumber their ids, so after a removal they are emptied, keeping the trained
+    quantizer, and refilled from kept_vectors (the exact vectors of the kept rows). For IVF that
+    is one assignment pass; an HNSW graph has to be rebuilt, about as slow as building it.
+    Returns the index.
+    """
+    if not keep.all():
+        if isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+            index.remove_ids(np.flatnonzero(~keep).astype(np.int64))
+        else:
+            index.reset()
+            if len(kept_vectors):
+                index.add(np.ascontiguousarray(kept_vectors, dtype=np.float32))
+    if len(added):
+        index.add(np.ascontiguousarray(added, dtype=np.float32))
+    return index
+
+
+def index_type_of(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def tune_index(index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH):
+    """
+    Sets the query-time recall/latency knobs: nprobe for IVF indexes, efSearch for HNSW.
+    IVF-PQ precomputed distance tables (nlist x M x 256 floats, private to every process) are
+    dropped when they are larger than the PQ codes themselves; results are identical, only
+    slightly slower to compute. IVF indexes get a direct map (8 bytes per vector) so stored
+    vectors can be reconstructed by position, as context reranking does.
+    Returns the index itself (the downcast view does not own it and must not outlive it).
+    """
+    view = faiss.downcast_index(index)
+    if isinstance(view, faiss.IndexIVFPQ) and view.precomputed_table.size() > view.ntotal * view.code_size // 4:
+        view.use_precomputed_table = -1
+        view.precomputed_table.resize(0)
+    if isinstance(view, faiss.IndexIVF):
+        view.nprobe = min(nprobe, view.nlist)
+        if view.direct_map.type == faiss.DirectMap.NoMap:
+            view.make_direct_map()
+    elif isinstance(view, faiss.IndexHNSW):
+        view.hnsw.efSearch = ef_search
+    return index
+
+
+def read_index(path: str, mmap: bool = FAISS_MMAP):
+    """
+    Reads an index file. With mmap, IVF inverted lists and flat vector storage (flat and
+    HNSW indexes) stay on disk and are paged in on demand, shared by every process that maps
+    the same file; such an index is read-only.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    with open(path, 'rb') as f:
+        fourcc = f.read(4)
+    # IVF files ("Iw..") map their inverted lists; the two modes cannot be combined
+    flags = faiss.IO_FLAG_MMAP if fourcc.startswith(b"Iw") else faiss.IO_FLAG_MMAP_IFC
+    return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+
+
+def flat_vectors(index) -> np.ndarray:
+    """
+    All vectors of an exact (flat) index, in index order.
+    """
+    return index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+
+
+def flat_index(vectors: np.ndarray) -> faiss.Index:
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    if len(vectors):
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    return index
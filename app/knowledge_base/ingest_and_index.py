@@ -1,17 +1,47 @@
 import os
+import copy
+import json
+import shutil
+import hashlib
+import queue
+import argparse
+import threading
+from collections import deque
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
 from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.schema import Document
+import numpy as np
+import faiss
+from app.knowledge_base.lexical_index import LexicalIndex, LEXICAL_INDEX_NAME
+from app.knowledge_base.chunk_store import ChunkStore, has_chunk_store, write_chunk_store
+from app.knowledge_base.vector_store import load_vector_store
+from app.knowledge_base.generations import current_dir, new_generation, publish_generation
+from app.knowledge_base.index_factory import (
+    INDEX_TYPES, FAISS_INDEX_TYPE, FAISS_NLIST, VECTORS_NAME, build_index, flat_index, flat_vectors, update_index,
+)
+from app.knowledge_base.embedding_scheduler import (
+    EmbeddingScheduler, EmbeddingCheckpoint, EMBED_BATCH_SIZE, EMBED_MAX_IN_FLIGHT,
+)
 
 # Directory with PDF files
 PDFS_DIR = os.path.join(os.path.dirname(__file__), 'pdfs')
 # Directory to store FAISS index
 INDEX_DIR = os.path.join(os.path.dirname(__file__), 'faiss_index')
+# Manifest with per-file content hashes and chunk ids (stored next to the index)
+MANIFEST_NAME = 'manifest.json'
 # Chunk size and overlap for text splitting
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+# Pipeline mode: parser processes and slices buffered between stages
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+PIPELINE_QUEUE_SIZE = 8
+# Also write LangChain's pickled docstore (index.pkl), for tools that load the index with FAISS.load_local
+WRITE_PICKLED_DOCSTORE = os.getenv("WRITE_PICKLED_DOCSTORE", "0") == "1"
 
 
 def clean_text(text: str) -> str:
@@ -19,39 +49,397 @@ def clean_text(text: str) -> str:
     return ' '.join(text.replace('\t', ' ').split())
 
 
-def ingest_all_pdfs_to_faiss():
+def file_sha256(path: str) -> str:
     """
-    Loads all PDFs from the pdfs directory, splits them into chunks with metadata, embeds them, and saves the FAISS index to disk.
+    Returns the SHA-256 hex digest of a file's content.
     """
-    all_chunks = []
-    for filename in os.listdir(PDFS_DIR):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids_for(source: str, sha256: str, count: int) -> list:
+    """
+    Deterministic docstore ids for the chunks of a file with the given name and content hash.
+    The name is part of the id, so identical PDFs stored under different names get distinct chunks.
+    """
+    prefix = hashlib.sha256(f"{source}\0{sha256}".encode('utf-8')).hexdigest()[:16]
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+def load_manifest(index_dir: str = INDEX_DIR) -> dict:
+    """
+    Loads the ingestion manifest: {"files": {filename: {"sha256": ..., "chunk_ids": [...]}}}.
+    Returns an empty manifest if there is none.
+    """
+    path = os.path.join(current_dir(index_dir), MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_and_split_pdf(pdf_path: str, filename: str) -> list:
+    """
+    Loads one PDF and splits it into cleaned chunks with source metadata.
+    """
+    loader = PyPDFLoader(pdf_path)
+    documents = loader.load()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = splitter.split_documents(documents)
+    # Add source metadata to each chunk
+    for chunk in chunks:
+        if not hasattr(chunk, 'metadata') or chunk.metadata is None:
+            chunk.metadata = {}
+        chunk.metadata['source'] = filename
+        # Clean text before indexing
+        chunk.page_content = clean_text(chunk.page_content)
+    return chunks
+
+
+def save_index(vector_store, manifest: dict, index_dir: str = INDEX_DIR, index_type: str = "flat",
+               nlist: int = FAISS_NLIST):
+    """
+    Writes the index, chunk files, BM25 lexical index and manifest into a new generation
+    directory and then publishes it by atomically pointing index_dir/CURRENT at it (see
+    app.knowledge_base.generations), so readers load either the old or the new generation, never a mix.
+    FAISS only gets the vectors: chunk texts and metadata go to the chunk files (plus the pickled
+    docstore with WRITE_PICKLED_DOCSTORE).
+    vector_store holds an exact (flat) index; for other index types the serving index is built
+    from its vectors, which are also saved as vectors.npy so later incremental runs can rebuild it.
+    """
+    generation = new_generation(index_dir)
+    try:
+        if index_type == "flat":
+            serving = vector_store
+        else:
+            vectors = flat_vectors(vector_store.index)
+            np.save(os.path.join(generation, VECTORS_NAME), vectors)
+            serving = copy.copy(vector_store)
+            serving.index = build_index(vectors, index_type, nlist=nlist)
+        if WRITE_PICKLED_DOCSTORE:
+            serving.save_local(generation)
+        else:
+            faiss.write_index(serving.index, os.path.join(generation, 'index.faiss'))
+        # Rebuilt from the whole docstore: tokenizing is cheap next to embedding
+        LexicalIndex.from_vector_store(vector_store).save(generation)
+        # Non-pickled, memory-mappable copy of the chunks for serving
+        write_chunk_store(generation, vector_store)
+        manifest["index"] = {"type": index_type, "vectors": vector_store.index.ntotal}
+        with open(os.path.join(generation, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        publish_generation(index_dir, generation)
+    except BaseException:
+        shutil.rmtree(generation, ignore_errors=True)
+        raise
+
+
+def checkpoint_path_for(index_dir: str) -> str:
+    """
+    Embedding checkpoint file for an index directory. It lives next to (not inside) the
+    index directory so writing it does not trigger a hot reload of the serving store.
+    """
+    return os.path.abspath(index_dir).rstrip(os.sep) + '.checkpoint.sqlite'
+
+
+def _add_embedded_batch(vector_store, scheduler, texts, metadatas, ids):
+    """
+    Embeds chunk texts through the scheduler and adds them to the index (creating the index if needed).
+    """
+    embeddings = scheduler.embeddings
+    vectors = scheduler.embed(texts, ids)
+    if vector_store is None:
+        return FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas, ids=ids)
+    vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+    return vector_store
+
+
+def _produce_chunks(jobs, workers: int, batch_size: int, out_queue, stop):
+    """
+    Pipeline stage 1: parses, cleans and splits PDFs in a process pool and puts
+    (filename, ids, chunks) slices of at most batch_size chunks on the bounded queue.
+    At most `workers` PDFs are in flight, so memory does not grow with the corpus.
+    Stops early when the consumer sets `stop`.
+    """
+    def put(item):
+        while not stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        jobs = iter(jobs)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+
+            def submit_next():
+                for pdf_path, filename, sha256 in jobs:
+                    pending.append((filename, sha256, pool.submit(load_and_split_pdf, pdf_path, filename)))
+                    return
+
+            for _ in range(workers):
+                submit_next()
+            while pending and not stop.is_set():
+                filename, sha256, future = pending.popleft()
+                chunks = future.result()
+                submit_next()
+                ids = chunk_ids_for(filename, sha256, len(chunks))
+                # Always emit at least one item so files without text are recorded too
+                for start in range(0, max(len(chunks), 1), batch_size):
+                    put((filename, ids[start:start + batch_size], chunks[start:start + batch_size]))
+            for _, _, future in pending:
+                future.cancel()
+        put(None)
+    except BaseException as e:
+        put(e)
+
+
+def _run_pipeline(jobs, vector_store, scheduler, workers: int):
+    """
+    Runs the streaming ingest pipeline: PDF parsing in a process pool feeds a bounded queue,
+    which is drained into batched embedding and index-add calls.
+    Returns (vector_store, {filename: chunk_ids}).
+    """
+    batch_size = scheduler.batch_size
+    # Enough chunks per flush to keep every in-flight embedding request busy
+    flush_size = batch_size * scheduler.max_in_flight
+    chunk_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce_chunks, args=(jobs, workers, batch_size, chunk_queue, stop),
+                                daemon=True)
+    producer.start()
+    file_ids = {}
+    texts, metadatas, ids = [], [], []
+    progress = tqdm(total=len(jobs), desc="Indexing PDFs", unit="pdf")
+    try:
+        while True:
+            item = chunk_queue.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            filename, batch_ids, chunks = item
+            if filename not in file_ids:
+                file_ids[filename] = []
+                progress.update(1)
+            file_ids[filename].extend(batch_ids)
+            texts.extend(chunk.page_content for chunk in chunks)
+            metadatas.extend(chunk.metadata for chunk in chunks)
+            ids.extend(batch_ids)
+            if len(texts) >= flush_size:
+                vector_store = _add_embedded_batch(vector_store, scheduler, texts, metadatas, ids)
+                texts, metadatas, ids = [], [], []
+            progress.set_postfix(chunks=sum(len(v) for v in file_ids.values()))
+        if texts:
+            vector_store = _add_embedded_batch(vector_store, scheduler, texts, metadatas, ids)
+    finally:
+        stop.set()
+        progress.close()
+        producer.join()
+    return vector_store, file_ids
+
+
+def _load_existing_index(index_dir: str, embeddings, manifest: dict):
+    """
+    Loads the index on disk for an incremental update, as an exact (flat) index.
+    """
+    try:
+        flat = manifest.get("index", {}).get("type", "flat") == "flat"
+        # A memory-mapped index is read-only; other types are replaced by their exact vectors below.
+        # The docstore is updated in place, so it is always loaded as a regular in-memory one
+        # (from the chunk files).
+        vector_store = load_vector_store(index_dir, embeddings, mmap=not flat, shared_chunks=False)
+        if not flat:
+            vector_store.index = flat_index(np.load(os.path.join(current_dir(index_dir), VECTORS_NAME)))
+        return vector_store
+    except Exception as e:
+        print(f"Could not load existing index ({e}), rebuilding from scratch.")
+        return None
+
+
+def ingest_all_pdfs_to_faiss(pdfs_dir: str = PDFS_DIR, index_dir: str = INDEX_DIR,
+                             embeddings=None, full_rebuild: bool = False, pipeline: bool = False,
+                             workers: int = INGEST_WORKERS, batch_size: int = EMBED_BATCH_SIZE,
+                             max_in_flight: int = EMBED_MAX_IN_FLIGHT, checkpoint_path: str = None,
+                             index_type: str = FAISS_INDEX_TYPE, nlist: int = FAISS_NLIST) -> dict:
+    """
+    Incrementally indexes all PDFs from the pdfs directory into the FAISS index on disk.
+    Only new or modified PDFs (by content hash) are split and embedded, vectors of deleted or
+    modified PDFs are removed, and unchanged chunks are reused from the existing index.
+    pipeline=True parses PDFs in `workers` processes and streams chunks into embedding
+    batches of `batch_size`, keeping peak memory flat regardless of corpus size.
+    Embeddings go through an EmbeddingScheduler (max_in_flight concurrent requests, pacing,
+    retries) that checkpoints finished batches, so a crashed run resumes without re-embedding.
+    index_type selects the FAISS index written to disk (flat, ivf_flat, ivf_pq or hnsw); IVF/PQ
+    quantizers are trained on a sample of the vectors, with nlist IVF cells (0 = automatic).
+    Returns counts of reused, added and removed chunks.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+    if embeddings is None:
+        embeddings = OpenAIEmbeddings()
+    checkpoint_path = checkpoint_path or checkpoint_path_for(index_dir)
+    checkpoint = EmbeddingCheckpoint(checkpoint_path)
+    scheduler = EmbeddingScheduler(embeddings, batch_size=batch_size, max_in_flight=max_in_flight,
+                                   checkpoint=checkpoint)
+    try:
+        report = _ingest(pdfs_dir, index_dir, embeddings, scheduler, full_rebuild, pipeline, workers,
+                         index_type, nlist)
+    finally:
+        checkpoint.close()
+    # The new index is on disk, the checkpoint is no longer needed
+    os.remove(checkpoint_path)
+    return report
+
+
+def _ingest(pdfs_dir, index_dir, embeddings, scheduler, full_rebuild, pipeline, workers,
+            index_type="flat", nlist=FAISS_NLIST) -> dict:
+    manifest = {"files": {}} if full_rebuild else load_manifest(index_dir)
+    vector_store = None
+    if manifest["files"]:
+        vector_store = _load_existing_index(index_dir, embeddings, manifest)
+        if vector_store is None:
+            manifest = {"files": {}}
+
+    current = {}
+    for filename in sorted(os.listdir(pdfs_dir)):
         if filename.lower().endswith('.pdf'):
-            pdf_path = os.path.join(PDFS_DIR, filename)
-            loader = PyPDFLoader(pdf_path)
-            documents = loader.load()
-            splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-            chunks = splitter.split_documents(documents)
-            # Add source metadata to each chunk
-            for chunk in chunks:
-                if not hasattr(chunk, 'metadata') or chunk.metadata is None:
-                    chunk.metadata = {}
-                chunk.metadata['source'] = filename
-                # Clean text before indexing
-                chunk.page_content = clean_text(chunk.page_content)
-            all_chunks.extend(chunks)
-
-    if not all_chunks:
+            current[filename] = file_sha256(os.path.join(pdfs_dir, filename))
+
+    indexed = manifest["files"]
+    stale = [name for name, entry in indexed.items() if current.get(name) != entry["sha256"]]
+    fresh = [name for name, sha in current.items() if name not in indexed or name in stale]
+    reused = sum(len(entry["chunk_ids"]) for name, entry in indexed.items() if name not in stale)
+
+    # Remove vectors of deleted and modified PDFs
+    removed_ids = [chunk_id for name in stale for chunk_id in indexed[name]["chunk_ids"]]
+    if removed_ids:
+        vector_store.delete(removed_ids)
+    for name in stale:
+        del indexed[name]
+
+    # Split and embed only new or modified PDFs
+    new_ids = []
+    if pipeline:
+        jobs = [(os.path.join(pdfs_dir, name), name, current[name]) for name in fresh]
+        vector_store, file_ids = _run_pipeline(jobs, vector_store, scheduler, workers)
+        for filename, ids in file_ids.items():
+            indexed[filename] = {"sha256": current[filename], "chunk_ids": ids}
+            new_ids.extend(ids)
+    else:
+        new_chunks = []
+        for filename in fresh:
+            chunks = load_and_split_pdf(os.path.join(pdfs_dir, filename), filename)
+            ids = chunk_ids_for(filename, current[filename], len(chunks))
+            indexed[filename] = {"sha256": current[filename], "chunk_ids": ids}
+            new_chunks.extend(chunks)
+            new_ids.extend(ids)
+        if new_chunks:
+            vector_store = _add_embedded_batch(vector_store, scheduler,
+                                               [chunk.page_content for chunk in new_chunks],
+                                               [chunk.metadata for chunk in new_chunks], new_ids)
+
+    report = {"reused": reused, "added": len(new_ids), "removed": len(removed_ids), "files": len(current)}
+    if vector_store is None:
         print("No PDF files found in the pdfs directory.")
-        return
+        return report
+    same_type = manifest.get("index", {}).get("type", "flat") == index_type
+    if not new_ids and not removed_ids and same_type:
+        print(f"FAISS index in {index_dir} is up to date ({reused} chunks reused)")
+        return report
+    save_index(vector_store, manifest, index_dir, index_type, nlist)
+    print(f"FAISS index saved to {index_dir} ({report['reused']} chunks reused, "
+          f"{report['added']} added, {report['removed']} removed, "
+          f"{scheduler.resumed} resumed from checkpoint, {scheduler.retries} embedding retries)")
+    return report
+
+
+def update_source(index_dir: str, source: str, pdf_path: str = None, embeddings=None) -> Optional[dict]:
+    """
+    Adds or replaces the chunks of one PDF (pdf_path, indexed as `source`), or with
+    pdf_path=None removes them, by publishing a new generation derived from the current one
+    instead of re-running the ingest over the corpus. Only that PDF is split and embedded;
+    its old chunks are dropped by their ids from the manifest. The index is updated without
+    retraining (see index_factory.update_index), kept chunk texts are copied as raw bytes and
+    the lexical index is merged, so no other chunk is decoded or re-tokenized.
+    Returns the report like ingest_all_pdfs_to_faiss, or None when the index on disk cannot
+    be updated this way (no index yet, files from before chunk files, a pickled docstore
+    requested); run the full ingest then.
+    """
+    directory = current_dir(index_dir)
+    manifest = load_manifest(index_dir)
+    index_type = manifest.get("index", {}).get("type")
+    needed = ['index.faiss', LEXICAL_INDEX_NAME] + ([VECTORS_NAME] if index_type != "flat" else [])
+    if index_type is None or WRITE_PICKLED_DOCSTORE or not has_chunk_store(directory) \
+            or not all(os.path.exists(os.path.join(directory, name)) for name in needed):
+        return None
+    files = manifest["files"]
+    previous = files.get(source)
+    if pdf_path is not None:
+        sha256 = file_sha256(pdf_path)
+        if previous is not None and previous["sha256"] == sha256:
+            return {"reused": manifest["index"]["vectors"], "added": 0, "removed": 0, "files": len(files)}
+    elif previous is None:
+        return {"reused": manifest["index"]["vectors"], "added": 0, "removed": 0, "files": len(files)}
 
-    embeddings = OpenAIEmbeddings()
-    vector_store = FAISS.from_documents(all_chunks, embedding=embeddings)
+    chunks = ChunkStore(directory, cache_size=0)
+    keep = np.ones(len(chunks), dtype=bool)
+    for chunk_id in previous["chunk_ids"] if previous is not None else ():
+        position = chunks.position(chunk_id)
+        if position is not None:
+            keep[position] = False
+    index = faiss.read_index(os.path.join(directory, 'index.faiss'))
+    documents, added = [], np.zeros((0, index.d), dtype=np.float32)
+    if pdf_path is not None:
+        documents = load_and_split_pdf(pdf_path, source)
+        for doc, chunk_id in zip(documents, chunk_ids_for(source, sha256, len(documents))):
+            doc.id = chunk_id
+        if documents:
+            if embeddings is None:
+                embeddings = OpenAIEmbeddings()
+            vectors = EmbeddingScheduler(embeddings).embed([doc.page_content for doc in documents],
+                                                           [doc.id for doc in documents])
+            added = np.asarray(vectors, dtype=np.float32)
 
-    if not os.path.exists(INDEX_DIR):
-        os.makedirs(INDEX_DIR)
-    vector_store.save_local(INDEX_DIR)
-    print(f"FAISS index saved to {INDEX_DIR} (from {len(all_chunks)} chunks)")
+    generation = new_generation(index_dir)
+    try:
+        kept_vectors = None
+        if index_type != "flat":
+            kept_vectors = np.load(os.path.join(directory, VECTORS_NAME), mmap_mode='r')[keep]
+            np.save(os.path.join(generation, VECTORS_NAME), np.concatenate([kept_vectors, added]))
+        faiss.write_index(update_index(index, keep, added, kept_vectors), os.path.join(generation, 'index.faiss'))
+        chunks.write_updated(generation, keep, documents)
+        LexicalIndex.load(directory).updated(keep, [(doc.id, doc.page_content) for doc in documents]) \
+            .save(generation)
+        if pdf_path is None:
+            del files[source]
+        else:
+            files[source] = {"sha256": sha256, "chunk_ids": [doc.id for doc in documents]}
+        manifest["index"]["vectors"] = index.ntotal
+        with open(os.path.join(generation, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        publish_generation(index_dir, generation)
+    except BaseException:
+        shutil.rmtree(generation, ignore_errors=True)
+        raise
+    return {"reused": int(keep.sum()), "added": len(documents), "removed": int((~keep).sum()), "files": len(files)}
 
 
 if __name__ == "__main__":
-    ingest_all_pdfs_to_faiss() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Index PDFs from the pdfs directory into FAISS.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-embed every PDF.")
+    parser.add_argument("--pipeline", action="store_true", help="Parse PDFs in parallel and stream chunks into batched embedding.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Parser processes in pipeline mode.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Texts per embedding request.")
+    parser.add_argument("--max-in-flight", type=int, default=EMBED_MAX_IN_FLIGHT, help="Concurrent embedding requests.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=FAISS_INDEX_TYPE, help="FAISS index written to disk.")
+    parser.add_argument("--nlist", type=int, default=FAISS_NLIST, help="IVF cells (0 = automatic).")
+    args = parser.parse_args()
+    ingest_all_pdfs_to_faiss(full_rebuild=args.full, pipeline=args.pipeline, workers=args.workers,
+                             batch_size=args.batch_size, max_in_flight=args.max_in_flight,
+                             index_type=args.index_type, nlist=args.nlist)
@@ -0,0 +1,192 @@
+import os
+import re
+import math
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from app.knowledge_base.generations import current_dir
+
+# File written next to the FAISS index files
+LEXICAL_INDEX_NAME = 'lexical_index.npz'
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a about an and are as at be but by can do does for from how i if in into is it its me my not of on
+or our so that the their them then there these they this to was we what when where which who why
+will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens without stopwords. Used for both chunks and queries.
+    """
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over document chunks.
+    Posting lists are stored in flat numpy arrays (CSR layout): the postings of term i are
+    doc_ids[offsets[i]:offsets[i + 1]] with their term frequencies, so the whole index is a
+    handful of contiguous arrays that load in one read and score without Python loops per posting.
+    """
+
+    def __init__(self, chunk_ids, terms, offsets, doc_ids, term_freqs, doc_lengths,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.chunk_ids = [str(chunk_id) for chunk_id in chunk_ids]
+        self.terms = np.asarray(terms, dtype=str)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.term_freqs = np.asarray(term_freqs, dtype=np.uint16)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.int32)
+        self.k1 = k1
+        self.b = b
+        self._term_index = {str(term): i for i, term in enumerate(self.terms)}
+        avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        # Per-document part of the BM25 denominator, computed once
+        self._length_norm = (k1 * (1 - b + b * self.doc_lengths / (avg_length or 1.0))).astype(np.float32)
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[str, str]]) -> "LexicalIndex":
+        """
+        Builds the index from (chunk_id, text) pairs.
+        """
+        chunk_ids, doc_lengths, postings = [], [], {}
+        for doc, (chunk_id, text) in enumerate(chunks):
+            counts = Counter(tokenize(text))
+            chunk_ids.append(chunk_id)
+            doc_lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((doc, count))
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        pairs = [pair for term in terms for pair in postings[term]]
+        doc_ids = np.fromiter((doc for doc, _ in pairs), dtype=np.int32, count=len(pairs))
+        term_freqs = np.fromiter((min(count, 65535) for _, count in pairs), dtype=np.uint16, count=len(pairs))
+        return cls(chunk_ids, terms, offsets, doc_ids, term_freqs, doc_lengths)
+
+    @classmethod
+    def from_vector_store(cls, vector_store) -> "LexicalIndex":
+        """
+        Builds the index from the chunks in a FAISS store's docstore (keyed by docstore id).
+        """
+        chunks = []
+        for chunk_id in vector_store.index_to_docstore_id.values():
+            doc = vector_store.docstore.search(chunk_id)
+            if hasattr(doc, 'page_content'):
+                chunks.append((chunk_id, doc.page_content))
+        return cls.build(chunks)
+
+    def updated(self, keep: np.ndarray, chunks: Iterable[Tuple[str, str]]) -> "LexicalIndex":
+        """
+        New index over the chunks where keep is True, in order, followed by the new
+        (chunk_id, text) pairs. Only the new chunks are tokenized; the kept postings are
+        filtered, renumbered and merged with theirs as arrays.
+        """
+        added = LexicalIndex.build(chunks)
+        renumbered = np.cumsum(keep) - 1
+        term_of = np.repeat(np.arange(len(self.terms)), np.diff(self.offsets))
+        kept = keep[self.doc_ids]
+        terms = np.union1d(self.terms, added.terms)
+        term_ids = np.concatenate([np.searchsorted(terms, self.terms)[term_of[kept]],
+                                   np.searchsorted(terms, added.terms)[np.repeat(np.arange(len(added.terms)),
+                                                                                 np.diff(added.offsets))]])
+        doc_ids = np.concatenate([renumbered[self.doc_ids[kept]], added.doc_ids + int(keep.sum())])
+        term_freqs = np.concatenate([self.term_freqs[kept], added.term_freqs])
+        order = np.lexsort((doc_ids, term_ids))
+        counts = np.bincount(term_ids, minlength=len(terms))
+        # Terms that only occurred in removed chunks are dropped
+        present = counts > 0
+        offsets = np.zeros(int(present.sum()) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts[present])
+        chunk_ids = [chunk_id for chunk_id, k in zip(self.chunk_ids, keep) if k] + added.chunk_ids
+        return LexicalIndex(chunk_ids, terms[present], offsets, doc_ids[order], term_freqs[order],
+                            np.concatenate([self.doc_lengths[keep], added.doc_lengths]), self.k1, self.b)
+
+    def save(self, index_dir: str):
+        path = os.path.join(index_dir, LEXICAL_INDEX_NAME)
+        with open(path, 'wb') as f:
+            np.savez(f, chunk_ids=np.asarray(self.chunk_ids, dtype=str), terms=self.terms, offsets=self.offsets,
+                     doc_ids=self.doc_ids, term_freqs=self.term_freqs, doc_lengths=self.doc_lengths)
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["LexicalIndex"]:
+        """
+        Loads the index saved in index_dir (its current generation), or returns None if there is none.
+        """
+        path = os.path.join(current_dir(index_dir), LEXICAL_INDEX_NAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['chunk_ids'], data['terms'], data['offsets'], data['doc_ids'],
+                       data['term_freqs'], data['doc_lengths'])
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def _score(self, query_terms: List[str]):
+        """
+        Returns BM25 scores of all chunks and, per chunk, how many query terms it contains.
+        """
+        n_docs = len(self.chunk_ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        matched = np.zeros(n_docs, dtype=np.int32)
+        for term in query_terms:
+            i = self._term_index.get(term)
+            if i is None:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+            matched[docs] += 1
+        return scores, matched
+
+    def _top(self, scores, k: int) -> np.ndarray:
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        return hits[np.argsort(-scores[hits], kind='stable')]
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Returns up to k (chunk_id, bm25_score) pairs, best first. Chunks sharing no term with the query are skipped.
+        """
+        scores, _ = self._score(list(dict.fromkeys(tokenize(query))))
+        return [(self.chunk_ids[i], float(scores[i])) for i in self._top(scores, k)]
+
+    def confident_search(self, query: str, k: int, min_margin: float) -> Optional[List[Tuple[str, float]]]:
+        """
+        Returns the top k hits only when the lexical match is unambiguous: the best chunk contains
+        every query term known to the index, and it outscores the best chunk that matches only some
+        of them by at least min_margin (a ratio). Otherwise returns None and the caller should fall
+        back to dense retrieval.
+        """
+        query_terms = [term for term in dict.fromkeys(tokenize(query)) if term in self._term_index]
+        if not query_terms:
+            return None
+        scores, matched = self._score(query_terms)
+        top = self._top(scores, k)
+        full = matched == len(query_terms)
+        if not full[top[0]]:
+            return None
+        partial = scores[~full]
+        if len(partial) and scores[top[0]] < min_margin * partial.max():
+            return None
+        return [(self.chunk_ids[i], float(scores[i])) for i in top]
+
+    def stats(self) -> dict:
+        return {
+            "chunks": len(self.chunk_ids),
+            "terms": len(self.terms),
+            "postings": len(self.doc_ids),
+            "bytes": int(self.offsets.nbytes + self.doc_ids.nbytes + self.term_freqs.nbytes + self.doc_lengths.nbytes),
+        }
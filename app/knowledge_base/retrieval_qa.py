@@ -1,9 +1,16 @@
 import os
+import asyncio
+import threading
+from typing import Any, List
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_openai import ChatOpenAI
 from langchain.chains import RetrievalQA
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.knowledge_base.vector_store import shared_vector_store
+from app.services.llm.gateway import gateway
+from app.services.core.context import compact_context, CONTEXT_COMPRESSION, CONTEXT_OVERFETCH
 
 # Directory where FAISS index is stored
 INDEX_DIR = os.path.join(os.path.dirname(__file__), 'faiss_index')
@@ -11,55 +18,129 @@ INDEX_DIR = os.path.join(os.path.dirname(__file__), 'faiss_index')
 # Number of top chunks to retrieve
 DEFAULT_K = 2
 
+# Questions answered at the same time by answer_queries
+QA_BATCH_CONCURRENCY = int(os.getenv("QA_BATCH_CONCURRENCY", "4"))
+
 
 def get_vector_store():
     """
-    Loads the FAISS vector store from disk.
+    Returns the process-wide FAISS vector store (loaded once, hot-reloaded on change).
+    """
+    return shared_vector_store.get()
+
+
+class SharedStoreRetriever(BaseRetriever):
+    """
+    Retriever over a SharedVectorStore (the process-wide one by default), resolved on every
+    query so a cached chain follows index reloads. With `compress`, it overfetches
+    k * CONTEXT_OVERFETCH chunks and compacts them to at most k (merged overlaps, no
+    near-duplicates, MMR, token budget) before they are stuffed into the prompt.
     """
-    embeddings = OpenAIEmbeddings()
-    vector_store = FAISS.load_local(INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
-    return vector_store
+    store: Any = None
+    k: int = DEFAULT_K
+    compress: bool = CONTEXT_COMPRESSION
+
+    def _vector_store(self):
+        return (self.store or shared_vector_store).get()
 
+    def _select(self, vector_store, vector, found) -> List[Document]:
+        if not self.compress:
+            return [doc for doc, _ in found]
+        results, _ = compact_context(vector_store, found, self.k, vector)
+        return [doc for doc, _ in results]
 
-def get_retriever(k=DEFAULT_K):
+    def _fetch_k(self) -> int:
+        return self.k * CONTEXT_OVERFETCH if self.compress else self.k
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector_store = self._vector_store()
+        vector = vector_store.embeddings.embed_query(query)
+        found = vector_store.similarity_search_with_score_by_vector(vector, k=self._fetch_k())
+        return self._select(vector_store, vector, found)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        # First use may load the index from disk, keep that off the event loop
+        vector_store = await asyncio.to_thread(self._vector_store)
+        vector = await vector_store.embeddings.aembed_query(query)
+        found = await vector_store.asimilarity_search_with_score_by_vector(vector, k=self._fetch_k())
+        return self._select(vector_store, vector, found)
+
+
+def get_retriever(k=DEFAULT_K, store=None):
     """
-    Returns a retriever object for the vector store.
+    Returns a retriever object for the vector store (the process-wide one unless `store` is given).
+    With CONTEXT_COMPRESSION, retrieved chunks are compacted before they reach the LLM.
     """
-    vector_store = get_vector_store()
-    retriever = vector_store.as_retriever(search_kwargs={"k": k})
-    return retriever
+    return SharedStoreRetriever(store=store, k=k)
+
+
+# (k, model_name, temperature, store) -> RetrievalQA chain; chains are stateless and shared
+_qa_chains = {}
+_qa_chains_lock = threading.Lock()
+qa_chain_stats = {"hits": 0, "builds": 0}
 
 
-def get_qa_chain(k=DEFAULT_K, model_name="gpt-4", temperature=0.2):
+def get_qa_chain(k=DEFAULT_K, model_name="gpt-4", temperature=0.2, store=None):
     """
-    Returns a RetrievalQA chain with the specified parameters.
+    Returns the RetrievalQA chain for these parameters, built on first use and then reused.
+    The LLM is the gateway's shared model for these settings and the retriever reads the
+    shared vector store, so nothing is rebuilt or reloaded per question.
     """
-    llm = ChatOpenAI(model_name=model_name, temperature=temperature)
-    retriever = get_retriever(k=k)
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        return_source_documents=True
-    )
+    key = (k, model_name, temperature, store)
+    qa_chain = _qa_chains.get(key)
+    if qa_chain is not None:
+        qa_chain_stats["hits"] += 1
+        return qa_chain
+    with _qa_chains_lock:
+        qa_chain = _qa_chains.get(key)
+        if qa_chain is None:
+            llm = gateway.chat_model("retrieval_qa", model_name=model_name, temperature=temperature)
+            qa_chain = _qa_chains[key] = RetrievalQA.from_chain_type(
+                llm=llm,
+                chain_type="stuff",
+                retriever=get_retriever(k=k, store=store),
+                return_source_documents=True
+            )
+            qa_chain_stats["builds"] += 1
+        else:
+            qa_chain_stats["hits"] += 1
     return qa_chain
 
 
-def answer_query(query, k=DEFAULT_K):
+def _answer_and_sources(result):
+    answer = result["result"]
+    # Extract source filenames from source_documents, in rank order
+    sources = dict.fromkeys(doc.metadata.get("source") for doc in result.get("source_documents", []))
+    sources.pop(None, None)
+    return answer, list(sources)
+
+
+def answer_query(query, k=DEFAULT_K, model_name="gpt-4", temperature=0.2):
     """
     Answers a user query using RetrievalQA chain. Returns a tuple: (answer, sources).
     sources — list of source filenames (books) from which the answer was generated.
     """
-    qa_chain = get_qa_chain(k=k)
-    result = qa_chain({"query": query})
-    answer = result["result"]
-    # Extract source filenames from source_documents
-    sources = set()
-    for doc in result.get("source_documents", []):
-        source = doc.metadata.get("source")
-        if source:
-            sources.add(source)
-    return answer, list(sources)
+    qa_chain = get_qa_chain(k=k, model_name=model_name, temperature=temperature)
+    return _answer_and_sources(qa_chain.invoke({"query": query}))
+
+
+async def aanswer_query(query, k=DEFAULT_K, model_name="gpt-4", temperature=0.2):
+    """Async variant of answer_query(): retrieval and the LLM call are awaited."""
+    qa_chain = get_qa_chain(k=k, model_name=model_name, temperature=temperature)
+    return _answer_and_sources(await qa_chain.ainvoke({"query": query}))
+
+
+def answer_queries(queries, k=DEFAULT_K, model_name="gpt-4", temperature=0.2,
+                   max_concurrency=QA_BATCH_CONCURRENCY):
+    """
+    Answers many queries concurrently, at most max_concurrency at a time (the LLM gateway
+    still caps calls process-wide). Returns [(answer, sources)] in the order of the queries;
+    the first failing query raises.
+    """
+    qa_chain = get_qa_chain(k=k, model_name=model_name, temperature=temperature)
+    results = qa_chain.batch([{"query": query} for query in queries], config={"max_concurrency": max_concurrency})
+    return [_answer_and_sources(result) for result in results]
 
 # Example usage:
 # answer, sources = answer_query("How can a coach help someone find their core values?", k=2)
@@ -1,20 +1,227 @@
 import os
-from langchain.vectorstores import FAISS
-from langchain.embeddings import OpenAIEmbeddings
+import time
+import pickle
+import logging
+import threading
+from typing import Optional
+from app.knowledge_base.embedding_cache import CachedQueryEmbeddings
+from app.knowledge_base.lexical_index import LexicalIndex
+from app.knowledge_base.chunk_store import ChunkStore, has_chunk_store
+from app.knowledge_base.generations import current_dir
+from app.knowledge_base.index_factory import read_index, tune_index, index_type_of, FAISS_MMAP
 
 # Directory where FAISS index is stored
 INDEX_DIR = os.path.join(os.path.dirname(__file__), 'faiss_index')
+# Minimum number of seconds between checks of INDEX_DIR for a newer index
+RELOAD_CHECK_INTERVAL = float(os.getenv("VECTOR_STORE_RELOAD_INTERVAL", "5"))
+# Serve chunks from the on-disk chunk files instead of an in-memory docstore
+CHUNK_STORE = os.getenv("CHUNK_STORE", "1") == "1"
 
+logger = logging.getLogger("vector_store")
 
-def load_vector_store():
+
+def load_vector_store(index_dir: str = INDEX_DIR, embeddings=None, mmap: bool = FAISS_MMAP,
+                      shared_chunks: Optional[bool] = None):
     """
     Loads the FAISS vector store from disk. Returns a FAISS object ready for retrieval.
+    Any index type written at ingest (flat, IVF, IVF-PQ, HNSW) is supported; nprobe/efSearch
+    are set from FAISS_NPROBE/FAISS_EF_SEARCH. With mmap the index is memory-mapped.
+    Chunks are served read-only from the on-disk chunk files, fetched per search result, unless
+    shared_chunks is False (default: CHUNK_STORE); then they are loaded into a regular, writable
+    in-memory docstore. The pickled docstore is only read for indexes written before chunk files existed.
+    """
+    from langchain.vectorstores import FAISS
+    if embeddings is None:
+        from langchain.embeddings import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings()
+    index_dir = current_dir(index_dir)
+    index = tune_index(read_index(os.path.join(index_dir, 'index.faiss'), mmap=mmap))
+    if has_chunk_store(index_dir):
+        chunks = ChunkStore(index_dir)
+        if CHUNK_STORE if shared_chunks is None else shared_chunks:
+            return FAISS(embeddings, index, chunks, chunks.index_to_docstore_id())
+        docstore, index_to_docstore_id = chunks.to_docstore()
+        return FAISS(embeddings, index, docstore, index_to_docstore_id)
+    # Same docstore file FAISS.save_local writes (only load indexes you built yourself)
+    logger.warning(f"No chunk files in {index_dir}, loading the pickled docstore; re-run ingest to write them")
+    with open(os.path.join(index_dir, 'index.pkl'), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def cached_embeddings():
+    """
+    OpenAI embeddings with the query-embedding cache in front of them.
+    """
+    from langchain.embeddings import OpenAIEmbeddings
+    return CachedQueryEmbeddings(OpenAIEmbeddings())
+
+
+def _index_signature(index_dir: str):
+    """
+    Returns (directory, ((name, mtime_ns, size), ...)) for the generation being served from
+    index_dir (see app.knowledge_base.generations), or None if there is no index.
+    Used to detect that a new index has been published.
+    """
+    if not os.path.isdir(index_dir):
+        return None
+    try:
+        directory = current_dir(index_dir)
+        files = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                st = os.stat(path)
+                files.append((name, st.st_mtime_ns, st.st_size))
+    except (OSError, ValueError):
+        # Generation pruned while we listed it, or a damaged pointer: treat as changed
+        return None
+    return directory, tuple(files)
+
+
+class SharedVectorStore:
+    """
+    Process-wide FAISS vector store that is loaded once and shared by all callers.
+    The index files are re-checked at most every check_interval seconds; when they
+    change, the new index is fully loaded first and then swapped in, so readers
+    never see a half-loaded store. The BM25 lexical index stored alongside is loaded
+    and swapped together with it.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR, embeddings_factory=cached_embeddings,
+                 check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.index_dir = index_dir
+        self.embeddings_factory = embeddings_factory
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._store = None
+        self._lexical = None
+        self._generation = (None, None)
+        self._embeddings = None
+        self._signature = None
+        self._last_check = 0.0
+        self._load_time = None
+        self._loaded_at = None
+        self._reload_count = 0
+        self._last_error = None
+
+    @property
+    def embeddings(self):
+        """Embeddings client shared by every index generation."""
+        if self._embeddings is None:
+            self._embeddings = self.embeddings_factory()
+        return self._embeddings
+
+    def embeddings_stats(self) -> dict:
+        """Stats of the embeddings client (query embedding cache), empty until it has been built."""
+        embeddings = self._embeddings
+        if embeddings is None or not hasattr(embeddings, "stats"):
+            return {}
+        return embeddings.stats()
+
+    def get(self):
+        """Returns the current FAISS store, loading or hot-reloading it if needed."""
+        store = self._store
+        if store is not None and time.monotonic() - self._last_check < self.check_interval:
+            return store
+        # While another thread loads the next generation, keep serving the current one
+        if not self._lock.acquire(blocking=store is None):
+            return store
+        try:
+            if self._store is None or time.monotonic() - self._last_check >= self.check_interval:
+                self._maybe_reload()
+            return self._store
+        finally:
+            self._lock.release()
+
+    def lexical(self):
+        """Returns the BM25 lexical index of the current store."""
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        """
+        Returns (FAISS store, BM25 lexical index) of the same index generation, so a reader
+        never pairs lexical hits of a newer index with the chunks of an older one.
+        """
+        self.get()
+        return self._generation
+
+    def reload(self):
+        """Forces a check of the index files and reloads them if they changed."""
+        with self._lock:
+            self._maybe_reload()
+            return self._store
+
+    def _maybe_reload(self):
+        self._last_check = time.monotonic()
+        signature = _index_signature(self.index_dir)
+        if self._store is not None and signature == self._signature:
+            return
+        try:
+            # Every file is read from the one generation directory the signature names
+            directory = signature[0] if signature is not None else self.index_dir
+            start = time.perf_counter()
+            store = load_vector_store(directory, self.embeddings)
+            lexical = LexicalIndex.load(directory)
+            load_time = time.perf_counter() - start
+            # The files changed while we were reading them (an index written in place, before
+            # generations) or the index and docstore disagree: keep the old store and retry later.
+            if _index_signature(self.index_dir) != signature:
+                raise RuntimeError("Index files changed while loading")
+            if store.index.ntotal != len(store.index_to_docstore_id):
+                raise RuntimeError("Index and docstore sizes do not match")
+            if lexical is None or len(lexical) != store.index.ntotal:
+                # Index written before lexical indexing existed: build it in memory
+                lexical = LexicalIndex.from_vector_store(store)
+        except Exception as e:
+            self._last_error = str(e)
+            if self._store is None:
+                raise
+            logger.warning(f"Vector store reload skipped, serving previous index: {e}")
+            return
+        if self._store is not None:
+            self._reload_count += 1
+            logger.info(f"Vector store reloaded from {self.index_dir} in {load_time:.3f}s")
+        self._generation = (store, lexical)
+        self._lexical = lexical
+        self._store = store
+        self._signature = signature
+        self._load_time = load_time
+        self._loaded_at = time.time()
+        self._last_error = None
+
+    def stats(self) -> dict:
+        """Returns load time, index size and reload count of the shared store."""
+        store = self._store
+        return {
+            "loaded": store is not None,
+            "index_dir": self.index_dir,
+            "load_time_seconds": self._load_time,
+            "loaded_at": self._loaded_at,
+            "vectors": store.index.ntotal if store is not None else 0,
+            "index_type": index_type_of(store.index) if store is not None else None,
+            "shared_chunks": isinstance(store.docstore, ChunkStore) if store is not None else False,
+            "chunk_store": store.docstore.stats() if store is not None and isinstance(store.docstore, ChunkStore)
+            else None,
+            "index_bytes": sum(size for _, _, size in self._signature[1]) if self._signature else 0,
+            "reload_count": self._reload_count,
+            "last_error": self._last_error,
+            "lexical": self._lexical.stats() if self._lexical is not None else None,
+        }
+
+
+# Shared store for the whole process (loaded lazily on first use)
+shared_vector_store = SharedVectorStore()
+
+
+def get_shared_vector_store():
+    """
+    Returns the process-wide FAISS store. Prefer this over load_vector_store() in request paths.
     """
-    embeddings = OpenAIEmbeddings()
-    vector_store = FAISS.load_local(INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
-    return vector_store
+    return shared_vector_store.get()
 
 # Example usage:
-# vs = load_vector_store()
+# vs = get_shared_vector_store()
 # results = vs.similarity_search('What are core values in life coaching?', k=2)
-# print(results) 
\ No newline at end of file
+# print(results)
+# print(shared_vector_store.stats())
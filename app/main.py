@@ -1,28 +1,93 @@
+import sys
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, JSONResponse
 from slowapi.errors import RateLimitExceeded
 from slowapi import _rate_limit_exceeded_handler
 from app.limiter import limiter
-from app.routers import chat, quote, decision_matrix
-# from app.routers import bmi, quote, retrieval  # Remove from production
+from app.routers import chat, quote, decision_matrix, admin, retrieval
+from app.services.core.quote import quote_pool
+from app.services.warmup import warm_up, WARMUP_ON_STARTUP
+from app.services.metrics import registry, MetricsMiddleware, PROMETHEUS_CONTENT_TYPE
+from app.knowledge_base.vector_store import shared_vector_store
+from app.services.llm.agent import agent_sessions
+from app.services.llm.client import conversation_sessions
+from app.services.llm.answer_cache import answer_cache
+from app.services.llm.streaming import ttft_stats
+from app.services.llm.gateway import gateway, UpstreamBusyError
+from app.services.core.context import context_stats
+from app.services.singleflight import singleflight_stats
+from app.knowledge_base.index_admin import index_writer
+# from app.routers import bmi  # Remove from production
 # from app.routers import health  # if health-check exists, connect it
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start filling the quote pool in the background; requests are served from the fallback set meanwhile
+    quote_pool.schedule_refill()
+    if WARMUP_ON_STARTUP:
+        # The server accepts requests (and health checks) only once startup has finished
+        await asyncio.to_thread(warm_up)
+    yield
+    quote_pool.close()
+    gateway.close()
+    await gateway.aclose()
+    index_writer.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Register limiter and exception handler
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+@app.exception_handler(UpstreamBusyError)
+async def upstream_busy_handler(request: Request, exc: UpstreamBusyError):
+    # Provider throttling or outage (after retries): tell the client to come back later
+    retry_after = max(1, round(exc.retry_after or 1))
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(retry_after)})
+
+def auto_score_cache_stats() -> dict:
+    # The tools module is loaded with the agent; nothing has been scored before that
+    llm_tools = sys.modules.get("app.services.tools.llm_tools")
+    stats = dict(llm_tools.score_cache_stats) if llm_tools else {"hits": 0, "misses": 0}
+    stats["hit_ratio"] = stats["hits"] / max(1, stats["hits"] + stats["misses"])
+    return stats
+
+# Request latency, in-flight gauges and per-stage spans (Server-Timing header)
+app.add_middleware(MetricsMiddleware)
+
+# Service stats exported as gauges on /metrics
+registry.register_stats("vector_store", shared_vector_store.stats)
+registry.register_stats("query_embedding_cache", shared_vector_store.embeddings_stats)
+registry.register_stats("agent_sessions", agent_sessions.stats)
+registry.register_stats("conversation_sessions", conversation_sessions.stats)
+registry.register_stats("ttft_seconds", lambda: {name: stats.stats() for name, stats in ttft_stats.items()})
+registry.register_stats("answer_cache", answer_cache.stats)
+registry.register_stats("quote_pool", quote_pool.stats)
+registry.register_stats("auto_score_cache", auto_score_cache_stats)
+registry.register_stats("llm_gateway", gateway.stats)
+registry.register_stats("context_compression", context_stats.stats)
+registry.register_stats("singleflight", singleflight_stats)
+registry.register_stats("index_writer", index_writer.stats)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check(request: Request):
     """Health check endpoint for Render and monitoring."""
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: stage and request latency histograms, in-flight requests, tokens, cache stats."""
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # Routers registration
 app.include_router(chat.router)
 app.include_router(quote.router)  # only for tests
 app.include_router(decision_matrix.router)  # decision matrix endpoint
+app.include_router(admin.router)  # knowledge base uploads and deletes
+app.include_router(retrieval.router)  # single and batch retrieval
 # app.include_router(health.router)  # if health-check exists
 # app.include_router(bmi.router)  # only for tests
-# app.include_router(retrieval.router)  # only for tests
 
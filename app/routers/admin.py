@@ -0,0 +1,69 @@
+import os
+import asyncio
+import secrets
+from fastapi import APIRouter, HTTPException, Request, Security
+from fastapi.responses import JSONResponse
+from fastapi.security.api_key import APIKeyHeader
+from app.limiter import limiter
+from app.knowledge_base.index_admin import index_writer, ADMIN_MAX_UPLOAD_BYTES
+
+router = APIRouter(prefix="/admin")
+
+# Key for the knowledge-base admin endpoints; they are disabled while it is not set
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+api_key_header = APIKeyHeader(name="X-API-Key")
+
+def check_admin_key(api_key: str = Security(api_key_header)):
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled (ADMIN_API_KEY is not set)")
+    if not secrets.compare_digest(api_key.encode(), ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid API Key")
+
+@router.get("/documents")
+async def list_documents(request: Request, api_key: str = Security(check_admin_key)):
+    """Indexed sources (PDF file names) with their chunk counts."""
+    # First use may load the index from disk, keep that off the event loop
+    return await asyncio.to_thread(index_writer.sources)
+
+@router.put("/documents/{source}", status_code=202)
+@limiter.limit("30/minute")
+async def upload_document(source: str, request: Request, api_key: str = Security(check_admin_key)):
+    """
+    Adds or replaces a PDF (raw request body, Content-Type: application/pdf). It is split and
+    embedded in the background and swapped into the live index; poll /admin/jobs/{id} for the result.
+    """
+    if int(request.headers.get("content-length") or 0) > ADMIN_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="PDF is too large")
+    # Content-Length is optional (chunked uploads), so the limit is enforced while reading
+    parts, size = [], 0
+    async for part in request.stream():
+        size += len(part)
+        if size > ADMIN_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="PDF is too large")
+        parts.append(part)
+    content = b"".join(parts)
+    try:
+        job = index_writer.add_document(source, content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(status_code=202, content=job, headers={"Location": f"/admin/jobs/{job['id']}"})
+
+@router.delete("/documents/{source}", status_code=202)
+@limiter.limit("30/minute")
+async def delete_document(source: str, request: Request, api_key: str = Security(check_admin_key)):
+    """Removes a PDF and all its chunks from the live index, in the background."""
+    try:
+        job = await asyncio.to_thread(index_writer.remove_document, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown source: {source}")
+    return JSONResponse(status_code=202, content=job, headers={"Location": f"/admin/jobs/{job['id']}"})
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request, api_key: str = Security(check_admin_key)):
+    """Status of an upload or delete: queued, running, done (with the ingest report) or failed."""
+    job = index_writer.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
@@ -1,16 +1,28 @@
+import os
+import asyncio
 from fastapi import APIRouter, Query, Body, HTTPException, Request, Depends, Security
-from pydantic import BaseModel
-from app.services.llm.agent import chat_with_agent
+from pydantic import BaseModel, Field
+from typing import Optional
+from app.services.llm.agent import achat_with_agent
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from app.limiter import limiter
+from fastapi.responses import StreamingResponse
 from fastapi.security.api_key import APIKeyHeader
-from app.services.llm.client import generate_response_with_memory
+from app.services.llm.agent import astream_chat_with_agent
+from app.services.llm.client import agenerate_response_with_memory, astream_response_with_memory, generate_response
+from app.services.llm.streaming import sse_stream
+from app.services.llm.gateway import UpstreamBusyError
 
 router = APIRouter()
 
+# Max chats handled at once by this worker; further requests wait for a free slot
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "16"))
+chat_semaphore = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
+
 class ChatRequest(BaseModel):
     user_message: str
+    session_id: Optional[str] = Field(None, max_length=128, description="Conversation id; each session has its own memory. Without one, the message is answered without history.")
 
 class ChatResponse(BaseModel):
     response: str
@@ -26,8 +38,12 @@ def check_api_key(api_key: str = Security(api_key_header)):
 @limiter.limit("10/minute")  # Limit to 10 requests per minute per IP
 async def chat_endpoint(request: Request, body: ChatRequest, api_key: str = Security(check_api_key)):
     try:
-        answer = chat_with_agent(body.user_message)
+        async with chat_semaphore:
+            answer = await achat_with_agent(body.user_message, body.session_id)
         return ChatResponse(response=answer)
+    except UpstreamBusyError:
+        # Served as 503 by the app's exception handler
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Agent error: {str(e)}")
 
@@ -35,9 +51,35 @@ async def chat_endpoint(request: Request, body: ChatRequest, api_key: str = Secu
 @limiter.limit("10/minute")  # Limit to 10 requests per minute per IP
 async def memory_chat_endpoint(request: Request, body: ChatRequest, api_key: str = Security(check_api_key)):
     """Chat endpoint with classic conversational memory (no tools, just LLM+memory)."""
-    answer = generate_response_with_memory(body.user_message)
+    async with chat_semaphore:
+        answer = await agenerate_response_with_memory(body.user_message, body.session_id)
     return ChatResponse(response=answer)
 
+async def _limited(events):
+    # Hold a concurrency slot for the whole lifetime of the stream
+    async with chat_semaphore:
+        async for item in events:
+            yield item
+
+def _event_stream(events, metric: str) -> StreamingResponse:
+    return StreamingResponse(
+        sse_stream(_limited(events), metric),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/chat/stream")
+@limiter.limit("10/minute")  # Limit to 10 requests per minute per IP
+async def chat_stream_endpoint(request: Request, body: ChatRequest, api_key: str = Security(check_api_key)):
+    """Streaming /chat: answer tokens and tool progress as Server-Sent Events."""
+    return _event_stream(astream_chat_with_agent(body.user_message, body.session_id), "chat")
+
+@router.post("/memory-chat/stream")
+@limiter.limit("10/minute")  # Limit to 10 requests per minute per IP
+async def memory_chat_stream_endpoint(request: Request, body: ChatRequest, api_key: str = Security(check_api_key)):
+    """Streaming /memory-chat: answer tokens as Server-Sent Events."""
+    return _event_stream(astream_response_with_memory(body.user_message, body.session_id), "memory_chat")
+
 @router.get("/test-gpt")
 def test_gpt(prompt: str = Query(..., description="Prompt for GPT-4")):
     """
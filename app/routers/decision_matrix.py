@@ -1,12 +1,25 @@
 from fastapi import APIRouter, HTTPException, Security, Request
-from pydantic import BaseModel, Field
-from typing import List
-from app.services.core.decision_matrix import calculate_decision_matrix
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+from app.services.core.decision_matrix import (
+    calculate_decision_matrix, batch_decision_matrix, sensitivity_analysis,
+)
 from fastapi.security.api_key import APIKeyHeader
 from app.limiter import limiter
 
 router = APIRouter()
 
+# Limits of one batch or sensitivity request
+MAX_OPTIONS = 100
+MAX_CRITERIA = 100
+MAX_BATCH_SETS = 100000
+MAX_SENSITIVITY_SAMPLES = 100000
+# Totals computed (and returned) by one batch: score matrices x weight sets x options
+MAX_BATCH_TOTALS = 100000
+# Weighted scores computed by one sensitivity analysis (samples x options x criteria),
+# the same work as a batch at its totals limit with the maximum number of criteria
+MAX_SENSITIVITY_PRODUCTS = MAX_BATCH_TOTALS * MAX_CRITERIA
+
 API_KEY = "supersecretkey"  # Change this to your real key or load from env
 api_key_header = APIKeyHeader(name="X-API-Key")
 
@@ -23,6 +36,45 @@ class DecisionMatrixRequest(BaseModel):
 class DecisionMatrixResponse(BaseModel):
     result: dict
 
+class DecisionMatrixBatchRequest(BaseModel):
+    options: List[str] = Field(..., max_length=MAX_OPTIONS, description="List of options to choose from.")
+    criteria: List[str] = Field(..., max_length=MAX_CRITERIA, description="List of criteria for evaluation.")
+    weight_sets: List[List[float]] = Field(..., max_length=MAX_BATCH_SETS, description="Weight vectors to evaluate, each with one weight per criterion.")
+    score_sets: List[List[List[float]]] = Field(..., max_length=MAX_BATCH_SETS, description="Score matrices to evaluate, each [option][criterion].")
+
+    @model_validator(mode="after")
+    def check_batch_size(self):
+        totals = len(self.score_sets) * len(self.weight_sets) * len(self.options)
+        if totals > MAX_BATCH_TOTALS:
+            raise ValueError(f"Batch too large: {totals} totals (score sets x weight sets x options), "
+                             f"at most {MAX_BATCH_TOTALS} per request.")
+        return self
+
+class DecisionMatrixBatchResponse(BaseModel):
+    totals: List[List[List[float]]] = Field(..., description="Totals per [matrix][weight_set][option].")
+    rankings: List[List[List[str]]] = Field(..., description="Option names best first per [matrix][weight_set].")
+    best: List[List[str]] = Field(..., description="Best option per [matrix][weight_set].")
+
+class SensitivityRequest(DecisionMatrixRequest):
+    options: List[str] = Field(..., max_length=MAX_OPTIONS, description="List of options to choose from.")
+    criteria: List[str] = Field(..., max_length=MAX_CRITERIA, description="List of criteria for evaluation.")
+    weights: List[float] = Field(..., max_length=MAX_CRITERIA, description="List of weights for each criterion.")
+    scores: List[List[float]] = Field(..., max_length=MAX_OPTIONS, description="Matrix of scores: each row is an option, each column is a criterion.")
+    perturbation: float = Field(0.2, ge=0, le=1, description="Max relative change applied to each weight.")
+    samples: int = Field(1000, ge=1, le=MAX_SENSITIVITY_SAMPLES, description="Number of perturbed weight vectors.")
+    seed: Optional[int] = Field(None, description="Random seed for reproducible results.")
+
+    @model_validator(mode="after")
+    def check_analysis_size(self):
+        products = self.samples * len(self.options) * len(self.criteria)
+        if products > MAX_SENSITIVITY_PRODUCTS:
+            raise ValueError(f"Analysis too large: {products} weighted scores (samples x options x criteria), "
+                             f"at most {MAX_SENSITIVITY_PRODUCTS} per request.")
+        return self
+
+class SensitivityResponse(BaseModel):
+    result: dict
+
 @router.post("/decision-matrix", response_model=DecisionMatrixResponse)
 @limiter.limit("10/minute")
 def decision_matrix_endpoint(
@@ -40,4 +92,45 @@ def decision_matrix_endpoint(
         )
         return DecisionMatrixResponse(result=result)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/decision-matrix/batch", response_model=DecisionMatrixBatchResponse)
+@limiter.limit("10/minute")
+def decision_matrix_batch_endpoint(
+    request: Request,
+    body: DecisionMatrixBatchRequest,
+    api_key: str = Security(check_api_key)
+):
+    """Endpoint to score many score matrices against many weight sets in one call."""
+    try:
+        result = batch_decision_matrix(
+            options=body.options,
+            criteria=body.criteria,
+            weight_sets=body.weight_sets,
+            score_sets=body.score_sets
+        )
+        return DecisionMatrixBatchResponse(**result)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/decision-matrix/sensitivity", response_model=SensitivityResponse)
+@limiter.limit("10/minute")
+def decision_matrix_sensitivity_endpoint(
+    request: Request,
+    body: SensitivityRequest,
+    api_key: str = Security(check_api_key)
+):
+    """Endpoint to check how stable the top choice is when the weights are perturbed."""
+    try:
+        result = sensitivity_analysis(
+            options=body.options,
+            criteria=body.criteria,
+            weights=body.weights,
+            scores=body.scores,
+            perturbation=body.perturbation,
+            samples=body.samples,
+            seed=body.seed
+        )
+        return SensitivityResponse(result=result)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
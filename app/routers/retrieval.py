@@ -1,21 +1,67 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from app.services.retrieval import AdvancedRetriever, RetrievalResult
+import os
+import asyncio
+import orjson
+from fastapi import APIRouter, HTTPException, Request, Security
+from fastapi.responses import StreamingResponse
+from fastapi.security.api_key import APIKeyHeader
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from app.limiter import limiter
+from app.services.core.retrieval import AdvancedRetriever, RetrievalResult
 
 router = APIRouter()
 
+API_KEY = "supersecretkey"  # Change this to your real key or load from env
+api_key_header = APIKeyHeader(name="X-API-Key")
+
+def check_api_key(api_key: str = Security(api_key_header)):
+    if api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API Key")
+
+# Queries per embedding request / FAISS search in batch retrieval (results stream after each slice)
+RETRIEVAL_BATCH_SLICE = int(os.getenv("RETRIEVAL_BATCH_SLICE", "256"))
+# Max queries accepted by one batch request
+RETRIEVAL_BATCH_MAX = int(os.getenv("RETRIEVAL_BATCH_MAX", "5000"))
+# Max chunks returned per query
+RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", "20"))
+
+# Shared retriever; the vector store behind it is loaded once per process
+retriever = AdvancedRetriever()
+
 class RetrievalRequest(BaseModel):
     query: str
-    k: int = 2
+    k: int = Field(2, ge=1, le=RETRIEVAL_MAX_K)
+    mode: Optional[str] = None  # "vector", "lexical" or "hybrid" (server default when omitted)
+
+class BatchRetrievalRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=RETRIEVAL_BATCH_MAX)
+    k: int = Field(2, ge=1, le=RETRIEVAL_MAX_K)
+    mode: Optional[str] = None
 
 @router.post("/retrieval", response_model=RetrievalResult)
-async def retrieval_endpoint(request: RetrievalRequest):
-    retriever = AdvancedRetriever(k=request.k)
+@limiter.limit("10/minute")
+async def retrieval_endpoint(request: Request, body: RetrievalRequest, api_key: str = Security(check_api_key)):
     try:
-        result = retriever.retrieve(request.query)
+        result = retriever.retrieve(body.query, k=body.k, mode=body.mode)
         return result
     except Exception as e:
         # Log error and return HTTP 500
         import logging
         logging.getLogger("retrieval").error(f"Retrieval endpoint error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Retrieval error") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Retrieval error") 
+
+async def _ndjson_results(request: BatchRetrievalRequest):
+    for start in range(0, len(request.queries), RETRIEVAL_BATCH_SLICE):
+        part = request.queries[start:start + RETRIEVAL_BATCH_SLICE]
+        results = await asyncio.to_thread(retriever.retrieve_many, part, request.k, request.mode)
+        yield b"".join(orjson.dumps(result.model_dump()) + b"\n" for result in results)
+
+@router.post("/retrieval/batch")
+@limiter.limit("10/minute")
+async def batch_retrieval_endpoint(request: Request, body: BatchRetrievalRequest,
+                                   api_key: str = Security(check_api_key)):
+    """
+    Retrieves many queries at once. Streams one RetrievalResult JSON object per line (NDJSON),
+    in input order; each slice of queries is embedded in one request and searched in one FAISS call.
+    """
+    return StreamingResponse(_ndjson_results(body), media_type="application/x-ndjson")
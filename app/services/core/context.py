@@ -0,0 +1,246 @@
+import os
+import logging
+import threading
+import weakref
+from typing import List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from app.services.core.tokens import estimate_tokens
+
+# Post-retrieval stage: merge overlapping / near-duplicate chunks, rerank with MMR, fit a token budget
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "1") == "1"
+# Candidates fetched per requested chunk before merging and reranking
+CONTEXT_OVERFETCH = int(os.getenv("CONTEXT_OVERFETCH", "3"))
+# MMR trade-off: 1 ranks by relevance only, lower values favour chunks unlike those already picked
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Cosine similarity of stored vectors above which two chunks count as the same passage
+NEAR_DUPLICATE_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_SIMILARITY", "0.95"))
+# Max (estimated) tokens of chunk text returned per call (0 = no budget)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Shortest shared prefix/suffix treated as splitter overlap between two chunks
+MIN_OVERLAP_CHARS = 40
+# A chunk cut to fit the budget keeps at least this many tokens, otherwise it is dropped
+MIN_TRIMMED_TOKENS = 50
+
+logger = logging.getLogger("context")
+
+
+class ContextStats:
+    """Totals over all calls: chunks merged or dropped and tokens saved versus plain top-k."""
+
+    def __init__(self):
+        self.calls = 0
+        self.candidates = 0
+        self.merged = 0
+        self.near_duplicates = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def record(self, report: dict):
+        with self._lock:
+            self.calls += 1
+            self.candidates += report["candidates"]
+            self.merged += report["merged"]
+            self.near_duplicates += report["near_duplicates"]
+            self.tokens_before += report["tokens_before"]
+            self.tokens_after += report["tokens_after"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "candidates": self.candidates,
+                "merged": self.merged,
+                "near_duplicates": self.near_duplicates,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+            }
+
+
+context_stats = ContextStats()
+
+# FAISS store -> {chunk id: position}, for docstores that cannot look positions up themselves
+_positions = weakref.WeakKeyDictionary()
+_positions_lock = threading.Lock()
+
+
+def _position_map(vector_store) -> dict:
+    with _positions_lock:
+        positions = _positions.get(vector_store)
+        if positions is None:
+            positions = {chunk_id: position for position, chunk_id in vector_store.index_to_docstore_id.items()}
+            _positions[vector_store] = positions
+        return positions
+
+
+def stored_vectors(vector_store, docs: List[Document]) -> Optional[np.ndarray]:
+    """
+    Unit-length vectors of the documents, read back from the FAISS index (no embedding call).
+    Rows of documents the index does not know are zero. None if the index cannot reconstruct.
+    """
+    index = getattr(vector_store, "index", None)
+    if index is None or not docs:
+        return None
+    lookup = getattr(vector_store.docstore, "position", None)
+    if lookup is None:
+        lookup = _position_map(vector_store).get
+    vectors = np.zeros((len(docs), index.d), dtype=np.float32)
+    try:
+        for row, doc in enumerate(docs):
+            position = lookup(doc.id) if doc.id is not None else None
+            if position is not None:
+                vectors[row] = index.reconstruct(int(position))
+    except RuntimeError as e:
+        logger.warning(f"Index cannot reconstruct stored vectors, reranking by rank only: {e}")
+        return None
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def overlap_merge(first: str, second: str) -> Optional[str]:
+    """
+    Joins two chunks when one contains the other or the end of `first` is the start of
+    `second` (the overlap the text splitter leaves between neighbouring chunks).
+    Returns the joined text, or None if the chunks do not overlap.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return None
+    start = first.find(probe, max(0, len(first) - len(second)))
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first[:start] + second
+        start = first.find(probe, start + 1)
+    return None
+
+
+def _merge_overlapping(candidates: list) -> Tuple[list, int]:
+    """
+    Merges (doc, score, vector, chunks) candidates of the same source and page whose texts
+    overlap, until no two overlap (a chunk can bridge two others). The merged chunk takes the
+    place, score and vector of the better ranked one and adds up the chunk counts.
+    Returns (candidates, merges).
+    """
+    rows = list(candidates)
+    merges = 0
+
+    def merge_pair():
+        for i, (kept, score, vector, size) in enumerate(rows):
+            key = (kept.metadata.get("source"), kept.metadata.get("page"))
+            for j in range(i + 1, len(rows)):
+                doc = rows[j][0]
+                if (doc.metadata.get("source"), doc.metadata.get("page")) != key:
+                    continue
+                text = overlap_merge(kept.page_content, doc.page_content) or \
+                    overlap_merge(doc.page_content, kept.page_content)
+                if text is not None:
+                    rows[i] = (Document(page_content=text, metadata=kept.metadata, id=kept.id), score, vector,
+                               size + rows[j][3])
+                    del rows[j]
+                    return True
+        return False
+
+    while merge_pair():
+        merges += 1
+    return rows, merges
+
+
+def _mmr(relevance: np.ndarray, vectors: Optional[np.ndarray], sizes: List[int], k: int,
+         mmr_lambda: float) -> List[int]:
+    """
+    Maximal marginal relevance: repeatedly picks the row maximizing λ·relevance − (1−λ)·max
+    similarity to the rows already picked. A row made of n merged chunks uses n of the k slots;
+    a row wider than the slots left takes them all (the token budget trims it).
+    Without vectors the rows are taken in order.
+    """
+    selected = []
+    slots = k
+    available = np.ones(len(sizes), dtype=bool)
+    redundancy = np.zeros(len(relevance), dtype=np.float32)
+    while slots > 0 and available.any():
+        if vectors is None:
+            best = int(np.argmax(available))
+        else:
+            best = int(np.argmax(np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)))
+            redundancy = np.maximum(redundancy, vectors @ vectors[best])
+        selected.append(best)
+        slots -= sizes[best]
+        available[best] = False
+    return selected
+
+
+def _fit_budget(docs: list, budget: int) -> list:
+    """Keeps chunks in order while they fit the token budget; the first one that does not is cut at a word."""
+    if budget <= 0:
+        return docs
+    fitted = []
+    remaining = budget
+    for doc, score in docs:
+        tokens = estimate_tokens(doc.page_content)
+        if tokens <= remaining:
+            fitted.append((doc, score))
+            remaining -= tokens
+            continue
+        if remaining >= MIN_TRIMMED_TOKENS or not fitted:
+            text = doc.page_content[:remaining * 4].rsplit(" ", 1)[0]
+            fitted.append((Document(page_content=text, metadata=doc.metadata, id=doc.id), score))
+        break
+    return fitted
+
+
+def compact_context(vector_store, candidates: List[Tuple[Document, float]], k: int,
+                    query_vector=None, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                    mmr_lambda: float = MMR_LAMBDA,
+                    near_duplicate: float = NEAR_DUPLICATE_SIMILARITY) -> Tuple[list, dict]:
+    """
+    Shrinks ranked (Document, score) candidates (best first, usually k * CONTEXT_OVERFETCH of
+    them) to at most k chunks' worth: merges overlapping chunks of the same page (the overlap
+    is sent once), drops near-duplicates by stored-vector similarity, picks with MMR (relevance
+    is the similarity to query_vector when given, the candidate rank otherwise) and trims the
+    picks to the token budget, never more than the plain top-k would use.
+    The picks are returned in their original rank order, with their original scores.
+    Returns (results, report); the report compares tokens with the plain top-k.
+    """
+    tokens_before = sum(estimate_tokens(doc.page_content) for doc, _ in candidates[:k])
+    vectors = stored_vectors(vector_store, [doc for doc, _ in candidates])
+    rows = [(doc, score, vectors[i] if vectors is not None else None, 1) for i, (doc, score) in enumerate(candidates)]
+    rows, merges = _merge_overlapping(rows)
+
+    duplicates = 0
+    if vectors is not None and near_duplicate < 1:
+        unique = []
+        for row in rows:
+            if any(float(row[2] @ kept[2]) >= near_duplicate for kept in unique):
+                duplicates += 1
+            else:
+                unique.append(row)
+        rows = unique
+
+    kept_vectors = np.stack([row[2] for row in rows]) if vectors is not None and rows else None
+    if kept_vectors is not None and query_vector is not None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        relevance = kept_vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    else:
+        relevance = 1.0 - np.arange(len(rows), dtype=np.float32) / max(1, len(rows))
+    picked = sorted(_mmr(relevance, kept_vectors, [row[3] for row in rows], k, mmr_lambda))
+    budget = min(token_budget, tokens_before) if token_budget > 0 else tokens_before
+    results = _fit_budget([(rows[i][0], rows[i][1]) for i in picked], budget)
+
+    tokens_after = sum(estimate_tokens(doc.page_content) for doc, _ in results)
+    report = {
+        "candidates": len(candidates),
+        "merged": merges,
+        "near_duplicates": duplicates,
+        "returned": len(results),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
+    context_stats.record(report)
+    return results, report
@@ -1,4 +1,41 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
+import numpy as np
+
+
+def _validate(options: List[str], criteria: List[str], weights, scores) -> None:
+    if not (len(criteria) == len(weights)):
+        raise ValueError("Criteria and weights must have the same length.")
+    if not (len(options) == len(scores)):
+        raise ValueError("Each option must have a list of scores.")
+    for row in scores:
+        if len(row) != len(criteria):
+            raise ValueError("Each score row must match number of criteria.")
+
+
+def score_matrices(scores, weights) -> np.ndarray:
+    """
+    Vectorized weighted scoring.
+    scores: [option][criterion] or a batch [matrix][option][criterion]
+    weights: [criterion] or a batch [weight_set][criterion]
+    Returns totals shaped [matrix?][weight_set?][option] (batch axes only when given).
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if scores.ndim not in (2, 3) or weights.ndim not in (1, 2):
+        raise ValueError("Scores must be 2-D or 3-D and weights 1-D or 2-D.")
+    if scores.shape[-1] != weights.shape[-1]:
+        raise ValueError("Each score row must match number of criteria.")
+    # (..., options, criteria) x (..., criteria) -> (..., [weight_sets,] options)
+    if weights.ndim == 1:
+        return scores @ weights
+    return np.einsum("...oc,wc->...wo", scores, weights)
+
+
+def rank_options(totals: np.ndarray) -> np.ndarray:
+    """
+    Option indices sorted best first along the last axis (stable for ties).
+    """
+    return np.argsort(-totals, axis=-1, kind="stable")
 
 
 def calculate_decision_matrix(
@@ -15,17 +52,78 @@ def calculate_decision_matrix(
     scores: matrix [option][criterion] with scores (same order)
     Returns dict: {option: total_score}
     """
-    if not (len(criteria) == len(weights)):
+    _validate(options, criteria, weights, scores)
+    if not options:
+        return {}
+    totals = score_matrices(scores, weights) if criteria else np.zeros(len(options))
+    return {option: float(total) for option, total in zip(options, totals)}
+
+
+def batch_decision_matrix(
+    options: List[str],
+    criteria: List[str],
+    weight_sets: List[List[float]],
+    score_sets: List[List[List[float]]]
+) -> Dict[str, list]:
+    """
+    Scores every score matrix against every weight set in one vectorized call.
+    Returns {"totals": [matrix][weight_set][option], "rankings": [matrix][weight_set][option names best first],
+    "best": [matrix][weight_set]}.
+    """
+    if not weight_sets or not score_sets or not options or not criteria:
+        raise ValueError("At least one option, criterion, weight set and score matrix are required.")
+    try:
+        weight_sets = np.asarray(weight_sets, dtype=np.float64)
+        score_sets = np.asarray(score_sets, dtype=np.float64)
+    except ValueError:
+        raise ValueError("All weight sets and score matrices must have the same shape.")
+    if weight_sets.ndim != 2 or weight_sets.shape[1] != len(criteria):
         raise ValueError("Criteria and weights must have the same length.")
-    if not (len(options) == len(scores)):
-        raise ValueError("Each option must have a list of scores.")
-    for row in scores:
-        if len(row) != len(criteria):
-            raise ValueError("Each score row must match number of criteria.")
-    result = {}
-    for i, option in enumerate(options):
-        total = 0.0
-        for j, weight in enumerate(weights):
-            total += scores[i][j] * weight
-        result[option] = total
-    return result 
\ No newline at end of file
+    if score_sets.ndim != 3 or score_sets.shape[1:] != (len(options), len(criteria)):
+        raise ValueError("Each score matrix must have one row per option and one column per criterion.")
+    totals = score_matrices(score_sets, weight_sets)
+    order = rank_options(totals)
+    names = np.asarray(options, dtype=object)
+    return {
+        "totals": totals.tolist(),
+        "rankings": names[order].tolist(),
+        "best": names[order[..., 0]].tolist(),
+    }
+
+
+def sensitivity_analysis(
+    options: List[str],
+    criteria: List[str],
+    weights: List[float],
+    scores: List[List[float]],
+    perturbation: float = 0.2,
+    samples: int = 1000,
+    seed: Optional[int] = None
+) -> Dict[str, object]:
+    """
+    Weight-perturbation sensitivity analysis.
+    Each weight is scaled by a random factor in [1 - perturbation, 1 + perturbation] for `samples`
+    draws; all draws are scored at once. Reports how often each option comes out on top and
+    how stable the baseline best option is (share of draws where it stays first).
+    """
+    _validate(options, criteria, weights, scores)
+    if not options or not criteria:
+        raise ValueError("At least one option and one criterion are required.")
+    if samples < 1 or perturbation < 0:
+        raise ValueError("Samples must be positive and perturbation non-negative.")
+    rng = np.random.default_rng(seed)
+    base = np.asarray(weights, dtype=np.float64)
+    factors = rng.uniform(1 - perturbation, 1 + perturbation, size=(samples, len(criteria)))
+    weight_sets = np.clip(base * factors, 0, None)
+    totals = score_matrices(scores, weight_sets)
+    top = rank_options(totals)[:, 0]
+    baseline_best = int(rank_options(score_matrices(scores, base))[0])
+    wins = np.bincount(top, minlength=len(options)) / samples
+    return {
+        "best_option": options[baseline_best],
+        "stability": float(wins[baseline_best]),
+        "top_choice_frequency": {option: float(share) for option, share in zip(options, wins)},
+        "mean_total": {option: float(total) for option, total in zip(options, totals.mean(axis=0))},
+        "samples": samples,
+        "perturbation": perturbation,
+    }
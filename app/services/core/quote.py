@@ -1,18 +1,148 @@
-import requests
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Optional
+import httpx
+from app.services.metrics import span
+
+# ZenQuotes bulk endpoint (returns ~50 quotes per call)
+ZENQUOTES_BULK_URL = os.getenv("ZENQUOTES_URL", "https://zenquotes.io/api/quotes")
+# Refill the pool when fewer quotes than this are left
+QUOTE_POOL_LOW_WATER = int(os.getenv("QUOTE_POOL_LOW_WATER", "10"))
+# Max quotes kept in memory
+QUOTE_POOL_SIZE = int(os.getenv("QUOTE_POOL_SIZE", "200"))
+# Upstream timeout in seconds; a slow upstream never delays a request, it only delays the refill
+QUOTE_FETCH_TIMEOUT = float(os.getenv("QUOTE_FETCH_TIMEOUT", "3"))
+
+logger = logging.getLogger("quote")
+
+# Bundled quotes served while the pool is empty or the upstream is slow or down
+FALLBACK_QUOTES = [
+    ("The only way to do great work is to love what you do.", "Steve Jobs"),
+    ("It always seems impossible until it's done.", "Nelson Mandela"),
+    ("Believe you can and you're halfway there.", "Theodore Roosevelt"),
+    ("What you do today can improve all your tomorrows.", "Ralph Marston"),
+    ("Act as if what you do makes a difference. It does.", "William James"),
+    ("Courage starts with showing up and letting ourselves be seen.", "Brene Brown"),
+    ("Becoming is better than being.", "Carol Dweck"),
+    ("The secret of getting ahead is getting started.", "Mark Twain"),
+    ("You are never too old to set another goal or to dream a new dream.", "C.S. Lewis"),
+    ("Start where you are. Use what you have. Do what you can.", "Arthur Ashe"),
+]
+
+
+def format_quote(quote: str, author: str) -> str:
+    return f'"{quote}" – {author}'
+
+
+class QuotePool:
+    """
+    In-memory pool of motivational quotes, refilled in bulk in the background.
+    Refills run on a private event loop thread with one shared, connection-pooled
+    httpx.AsyncClient, so get() never waits on the network from any thread or event loop.
+    """
+
+    def __init__(self, url: str = ZENQUOTES_BULK_URL, low_water: int = QUOTE_POOL_LOW_WATER,
+                 max_size: int = QUOTE_POOL_SIZE, timeout: float = QUOTE_FETCH_TIMEOUT):
+        self.url = url
+        self.low_water = low_water
+        self.timeout = timeout
+        self._quotes = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._refill_future = None
+        self.served = 0
+        self.fallbacks = 0
+        self.refills = 0
+        self.errors = 0
+        self.last_refill = None
+
+    def get(self) -> str:
+        """Returns a formatted quote from memory, falling back to the bundled set when the pool is empty."""
+        with self._lock:
+            item = self._quotes.popleft() if self._quotes else None
+            remaining = len(self._quotes)
+            self.served += 1
+            if item is None:
+                self.fallbacks += 1
+        if remaining < self.low_water:
+            self.schedule_refill()
+        if item is None:
+            item = random.choice(FALLBACK_QUOTES)
+        return format_quote(*item)
+
+    def schedule_refill(self):
+        """Starts a background refill unless one is already running."""
+        with self._lock:
+            if self._refill_future is not None and not self._refill_future.done():
+                return self._refill_future
+            self._refill_future = asyncio.run_coroutine_threadsafe(self._refill(), self._ensure_loop())
+            return self._refill_future
+
+    def refill_now(self, timeout: Optional[float] = None):
+        """Blocks until a refill has finished (used at warm-up and in tests)."""
+        self.schedule_refill().result(timeout)
+
+    def _ensure_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="quote-pool", daemon=True).start()
+        return self._loop
+
+    async def _refill(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=2)
+            )
+        try:
+            with span("quote_fetch"):
+                response = await self._client.get(self.url)
+            response.raise_for_status()
+            fetched = [(item["q"], item["a"]) for item in response.json() if item.get("q") and item.get("a")]
+            random.shuffle(fetched)
+            with self._lock:
+                self._quotes.extend(fetched)
+            self.refills += 1
+            self.last_refill = time.time()
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Quote pool refill failed: {e}")
+
+    def close(self):
+        """Closes the shared HTTP client and stops the background loop."""
+        if self._loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+        self._client = None
+        self._refill_future = None
+
+    def stats(self) -> dict:
+        return {
+            "pooled": len(self._quotes),
+            "served": self.served,
+            "fallbacks": self.fallbacks,
+            "refills": self.refills,
+            "errors": self.errors,
+            "last_refill": self.last_refill,
+        }
+
+
+# Shared pool for the whole process
+quote_pool = QuotePool()
+
 
 def get_quote() -> str:
     """
-    Fetch a random motivational quote from ZenQuotes API.
-    Returns formatted quote with author or error message.
+    Return a random motivational quote (ZenQuotes, prefetched in bulk) with author.
+    Served from memory; falls back to a bundled quote while the upstream is slow or unavailable.
     """
-    try:
-        response = requests.get("https://zenquotes.io/api/random", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            quote = data[0]["q"]
-            author = data[0]["a"]
-            return f'"{quote}" – {author}'
-        else:
-            return "Could not fetch quote (API error)."
-    except Exception as e:
-        return f"Could not fetch quote: {str(e)}"
+    return quote_pool.get()
@@ -1,12 +1,35 @@
+import os
+import asyncio
 import logging
 from typing import List, Optional
+import numpy as np
+import faiss
 from pydantic import BaseModel, Field, validator
-from app.knowledge_base.vector_store import load_vector_store
+from app.knowledge_base.vector_store import shared_vector_store
+from app.knowledge_base.embedding_cache import embed_queries
+from app.services.metrics import span
+from app.services.core.context import compact_context, CONTEXT_COMPRESSION, CONTEXT_OVERFETCH
+from app.services.singleflight import SingleFlight
+
+# Default retrieval mode: "vector" (FAISS only), "lexical" (BM25 only) or "hybrid" (both, fused);
+# deployments opt in to lexical or hybrid retrieval once they serve a lexical index
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+# Candidates taken from each ranking before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+# Reciprocal rank fusion constant
+RRF_K = 60
+# Hybrid mode answers from BM25 alone (no embedding call) when the best chunk contains every
+# query term and outscores the runner-up by this ratio; 0 disables the fast path
+LEXICAL_FAST_PATH_MARGIN = float(os.getenv("LEXICAL_FAST_PATH_MARGIN", "1.2"))
 
 # Configure logger for retrieval operations
 logger = logging.getLogger("retrieval")
 logger.setLevel(logging.INFO)
 
+# Concurrent identical retrievals (same retriever, translated query, k and mode) share one search
+retrieval_flights = SingleFlight("retrieval")
+
 class RetrievedChunk(BaseModel):
     text: str
     source: str
@@ -18,11 +41,28 @@ class RetrievalResult(BaseModel):
     translated_query: str
     chunks: List[RetrievedChunk]
     not_found: bool = False
+    mode: Optional[str] = None
+    # Context compression report: candidates merged / dropped and tokens saved versus plain top-k
+    context: Optional[dict] = None
 
 class AdvancedRetriever:
-    def __init__(self, k: int = 2):
+    def __init__(self, k: int = 2, store=None, mode: str = RETRIEVAL_MODE,
+                 fast_path_margin: float = LEXICAL_FAST_PATH_MARGIN, compress: bool = CONTEXT_COMPRESSION,
+                 overfetch: int = CONTEXT_OVERFETCH):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
         self.k = k
-        self.vector_store = load_vector_store()
+        self.mode = mode
+        self.fast_path_margin = fast_path_margin
+        # Overfetch candidates and compact them (see app.services.core.context)
+        self.compress = compress
+        self.overfetch = max(1, overfetch)
+        # Process-wide store: loaded once, hot-reloaded when the index on disk changes
+        self.store = store if store is not None else shared_vector_store
+
+    @property
+    def vector_store(self):
+        return self.store.get()
 
     def translate_query(self, query: str) -> str:
         # Simple normalization, can be extended
@@ -44,36 +84,246 @@ class AdvancedRetriever:
         # Replace tabs with spaces and collapse multiple spaces
         return ' '.join(text.replace('\t', ' ').split())
 
-    def retrieve(self, query: str, k: Optional[int] = None) -> RetrievalResult:
+    def retrieve(self, query: str, k: Optional[int] = None, mode: Optional[str] = None) -> RetrievalResult:
+        """
+        Returns the top k chunks for a query.
+        Scores are L2 distances in vector mode (lower is better), BM25 scores in lexical mode and
+        reciprocal-rank-fusion scores in hybrid mode (higher is better); `mode` of the result tells which.
+        With compression, k * overfetch candidates are compacted to at most k chunks.
+        Identical retrievals already in flight are joined instead of run again.
+        """
+        key = self._flight_key(query, k, mode)
+        if key is None:
+            return self._retrieve(query, k, mode)
+        return self._own(retrieval_flights.do(key, self._retrieve, query, k, mode), query)
+
+    async def aretrieve(self, query: str, k: Optional[int] = None, mode: Optional[str] = None) -> RetrievalResult:
+        """
+        Async variant of retrieve(): the query embedding is awaited and the FAISS search
+        runs in the default executor, so the event loop is never blocked.
+        """
+        key = self._flight_key(query, k, mode)
+        if key is None:
+            return await self._aretrieve(query, k, mode)
+        return self._own(await retrieval_flights.ado(key, self._aretrieve, query, k, mode), query)
+
+    def _flight_key(self, query, k: Optional[int], mode: Optional[str]):
+        """Single-flight key: queries equal after translation share one retrieval (None = do not coalesce)."""
+        if not isinstance(query, str) or not query.strip():
+            return None
+        return id(self), self.translate_query(query), k if k is not None else self.k, mode or self.mode
+
+    def _own(self, result: RetrievalResult, query: str) -> RetrievalResult:
+        # A joined retrieval may come from a query that only differs in case or spacing
+        if result.original_query != query:
+            return result.model_copy(update={"original_query": query})
+        return result
+
+    def _retrieve(self, query: str, k: Optional[int] = None, mode: Optional[str] = None) -> RetrievalResult:
         try:
             self.validate_query(query)
             translated_query = self.translate_query(query)
             top_k = k if k is not None else self.k
-            # FAISS similarity_search returns list of Document
-            results = self.vector_store.similarity_search_with_score(translated_query, k=top_k)
-            chunks = []
-            for doc, score in results:
-                source = doc.metadata.get("source", "unknown")
-                page = doc.metadata.get("page")
-                chunks.append(RetrievedChunk(
-                    text=self.clean_text(doc.page_content),
-                    source=source,
-                    page=page,
-                    score=score
-                ))
-            not_found = len(chunks) == 0
-            logger.info(f"Retrieval query: '{query}' | Translated: '{translated_query}' | Results: {len(chunks)}")
-            return RetrievalResult(
-                original_query=query,
-                translated_query=translated_query,
-                chunks=chunks,
-                not_found=not_found
-            )
+            fetch_k = self._fetch_k(top_k)
+            vector_store, mode, lexical_hits, results = self._lexical_stage(translated_query, fetch_k, mode)
+            vector = None
+            if results is None:
+                with span("embedding"):
+                    vector = vector_store.embeddings.embed_query(translated_query)
+                # FAISS similarity_search returns list of (Document, distance)
+                with span("faiss_search"):
+                    dense = vector_store.similarity_search_with_score_by_vector(vector, k=self._dense_k(mode, fetch_k))
+                results = self._combine(vector_store, mode, dense, lexical_hits, fetch_k)
+            return self._finish(vector_store, query, translated_query, results, mode, top_k, vector)
         except Exception as e:
             logger.error(f"Retrieval error: {e}", exc_info=True)
-            return RetrievalResult(
-                original_query=query,
-                translated_query=query,
-                chunks=[],
-                not_found=True
-            ) 
\ No newline at end of file
+            return self._empty_result(query)
+
+    async def _aretrieve(self, query: str, k: Optional[int] = None, mode: Optional[str] = None) -> RetrievalResult:
+        try:
+            self.validate_query(query)
+            translated_query = self.translate_query(query)
+            top_k = k if k is not None else self.k
+            fetch_k = self._fetch_k(top_k)
+            # First use may load the index from disk, keep that off the event loop
+            vector_store, mode, lexical_hits, results = await asyncio.to_thread(
+                self._lexical_stage, translated_query, fetch_k, mode)
+            vector = None
+            if results is None:
+                with span("embedding"):
+                    vector = await vector_store.embeddings.aembed_query(translated_query)
+                with span("faiss_search"):
+                    dense = await vector_store.asimilarity_search_with_score_by_vector(vector,
+                                                                                       k=self._dense_k(mode, fetch_k))
+                results = self._combine(vector_store, mode, dense, lexical_hits, fetch_k)
+            return self._finish(vector_store, query, translated_query, results, mode, top_k, vector)
+        except Exception as e:
+            logger.error(f"Retrieval error: {e}", exc_info=True)
+            return self._empty_result(query)
+
+    def retrieve_many(self, queries: List[str], k: Optional[int] = None, mode: Optional[str] = None) -> List[RetrievalResult]:
+        """
+        Batch variant of retrieve(). Returns one result per query, in input order (an invalid
+        query gets an empty result). All queries that need dense search are embedded in one
+        request and searched with a single multi-query FAISS call.
+        """
+        top_k = k if k is not None else self.k
+        fetch_k = self._fetch_k(top_k)
+        results = [None] * len(queries)
+        pending = []
+        vector_store = None
+        for position, query in enumerate(queries):
+            try:
+                self.validate_query(query)
+                translated_query = self.translate_query(query)
+                vector_store, used_mode, lexical_hits, found = self._lexical_stage(translated_query, fetch_k, mode)
+                if found is not None:
+                    results[position] = self._finish(vector_store, query, translated_query, found, used_mode, top_k)
+                else:
+                    pending.append((position, query, translated_query, used_mode, lexical_hits))
+            except Exception as e:
+                logger.error(f"Retrieval error: {e}", exc_info=True)
+                results[position] = self._empty_result(query)
+        if pending:
+            try:
+                dense_k = max(self._dense_k(used_mode, fetch_k) for _, _, _, used_mode, _ in pending)
+                dense, vectors = self._dense_search_many(vector_store, [item[2] for item in pending], dense_k)
+                for (position, query, translated_query, used_mode, lexical_hits), found, vector in zip(
+                        pending, dense, vectors):
+                    found = self._combine(vector_store, used_mode, found[:self._dense_k(used_mode, fetch_k)],
+                                          lexical_hits, fetch_k)
+                    results[position] = self._finish(vector_store, query, translated_query, found, used_mode,
+                                                     top_k, vector)
+            except Exception as e:
+                logger.error(f"Batch retrieval error: {e}", exc_info=True)
+                for position, query, _, _, _ in pending:
+                    results[position] = self._empty_result(query)
+        return results
+
+    def _dense_search_many(self, vector_store, texts: List[str], k: int):
+        """
+        One embedding request and one FAISS search for all texts.
+        Returns (batches, query vectors): per text, a list of (Document, distance) like
+        similarity_search_with_score, and its embedding.
+        """
+        with span("embedding"):
+            vectors = np.asarray(embed_queries(vector_store.embeddings, texts), dtype=np.float32)
+        with span("faiss_search"):
+            if vector_store._normalize_L2:
+                faiss.normalize_L2(vectors)
+            distances, indices = vector_store.index.search(vectors, k)
+        batches = []
+        for row_distances, row_indices in zip(distances, indices):
+            found = []
+            for distance, i in zip(row_distances, row_indices):
+                if i == -1:
+                    continue
+                doc = vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+                if hasattr(doc, "page_content"):
+                    found.append((doc, float(distance)))
+            batches.append(found)
+        return batches, vectors
+
+    def _lexical_stage(self, query: str, top_k: int, mode: Optional[str]):
+        """
+        Loads the store and runs the BM25 part of the lookup.
+        Returns (vector_store, mode, lexical_hits, results); results is already final when no
+        dense search is needed (lexical mode, or a confident lexical match in hybrid mode).
+        """
+        mode = mode or self.mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if mode == "vector":
+            return self.store.get(), mode, [], None
+        # Chunks and BM25 index of one index generation, even if a reload swaps them meanwhile
+        vector_store, lexical = self.store.snapshot()
+        if lexical is None:
+            return vector_store, "vector", [], None
+        with span("bm25_search"):
+            if mode == "lexical":
+                return vector_store, mode, [], self._lexical_documents(vector_store, lexical.search(query, top_k))
+            if self.fast_path_margin > 0:
+                confident = lexical.confident_search(query, top_k, self.fast_path_margin)
+                if confident is not None:
+                    return vector_store, "lexical", [], self._lexical_documents(vector_store, confident)
+            return vector_store, mode, lexical.search(query, max(top_k, HYBRID_CANDIDATES)), None
+
+    def _fetch_k(self, top_k: int) -> int:
+        return top_k * self.overfetch if self.compress else top_k
+
+    def _dense_k(self, mode: str, top_k: int) -> int:
+        return top_k if mode == "vector" else max(top_k, HYBRID_CANDIDATES)
+
+    def _lexical_documents(self, vector_store, hits):
+        results = []
+        for chunk_id, score in hits:
+            doc = vector_store.docstore.search(chunk_id)
+            # The docstore returns a message string for ids it does not know
+            if hasattr(doc, "page_content"):
+                results.append((doc, score))
+        return results
+
+    def _combine(self, vector_store, mode: str, dense, lexical_hits, top_k: int):
+        if mode == "vector":
+            return dense
+        return self._fuse(vector_store, dense, lexical_hits, top_k)
+
+    def _fuse(self, vector_store, dense, lexical_hits, top_k: int):
+        """
+        Reciprocal rank fusion of the dense and BM25 rankings: score = sum of 1 / (RRF_K + rank).
+        """
+        fused, docs = {}, {}
+        for rank, (doc, _) in enumerate(dense):
+            fused[doc.id] = fused.get(doc.id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            docs[doc.id] = doc
+        for rank, (chunk_id, _) in enumerate(lexical_hits):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        ranked = sorted(fused, key=fused.get, reverse=True)
+        results = []
+        for chunk_id in ranked:
+            doc = docs.get(chunk_id) or vector_store.docstore.search(chunk_id)
+            if hasattr(doc, "page_content"):
+                results.append((doc, fused[chunk_id]))
+            if len(results) == top_k:
+                break
+        return results
+
+    def _finish(self, vector_store, query: str, translated_query: str, results, mode: str, top_k: int,
+                query_vector=None) -> RetrievalResult:
+        """Compacts the candidates to top_k chunks (when compression is on) and builds the result."""
+        report = None
+        if self.compress:
+            results, report = compact_context(vector_store, results, top_k, query_vector)
+        return self._build_result(query, translated_query, results, mode, report)
+
+    def _build_result(self, query: str, translated_query: str, results, mode: Optional[str] = None,
+                      context: Optional[dict] = None) -> RetrievalResult:
+        chunks = []
+        for doc, score in results:
+            source = doc.metadata.get("source", "unknown")
+            page = doc.metadata.get("page")
+            chunks.append(RetrievedChunk(
+                text=self.clean_text(doc.page_content),
+                source=source,
+                page=page,
+                score=score
+            ))
+        not_found = len(chunks) == 0
+        saved = f" | Tokens saved: {context['tokens_saved']}" if context else ""
+        logger.info(f"Retrieval query: '{query}' | Translated: '{translated_query}' | Mode: {mode} | Results: {len(chunks)}{saved}")
+        return RetrievalResult(
+            original_query=query,
+            translated_query=translated_query,
+            chunks=chunks,
+            not_found=not_found,
+            mode=mode,
+            context=context
+        )
+
+    def _empty_result(self, query: str) -> RetrievalResult:
+        return RetrievalResult(
+            original_query=query,
+            translated_query=query,
+            chunks=[],
+            not_found=True
+        )
@@ -0,0 +1,5 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (about 4 characters per token); avoids running a tokenizer on every turn.
+    """
+    return len(text) // 4 + 1
@@ -1,23 +1,12 @@
-from langchain_openai import ChatOpenAI
-from langchain.agents import initialize_agent, AgentType
-from langchain.memory import ConversationBufferMemory
-from app.services.tools.llm_tools import all_tools
-import os
-
-# Load OpenAI API key from environment
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Initialize LLM
-llm = ChatOpenAI(
-    model_name="gpt-4",
-    temperature=0.7,
-    openai_api_key=OPENAI_API_KEY
-)
-
-# Initialize memory
-memory = ConversationBufferMemory(return_messages=True)
+from app.services.llm.memory import SessionStore, new_session_memory
+from app.services.llm.answer_cache import answer_cache, ToolRecorder
+from app.services.metrics import metrics_callbacks
+from app.services.llm.gateway import gateway, raise_if_upstream_busy, upstream_error_event
+from typing import Optional
+import time
+import asyncio
+import threading
 
-# Initialize agent with tools, LLM, and memory
 system_prompt = (
     "You are an assistant that always chooses the right tool for the user's request. "
     "If the user is making a decision, choosing between options, or comparing alternatives, always use the decision_matrix tool. "
@@ -29,21 +18,138 @@ system_prompt = (
     "Always return the result as a table with numbers and a short explanation for decisions."
 )
 
-agent = initialize_agent(
-    tools=all_tools,
-    llm=llm,
-    agent=AgentType.OPENAI_FUNCTIONS,
-    memory=memory,
-    verbose=True,
-    system_prompt=system_prompt
-)
+# Agent template shared by all sessions, built on first use (see get_agent)
+agent = None
+_agent_lock = threading.Lock()
+
+def get_agent():
+    """
+    Returns the agent template, building the LLM and the agent on first use.
+    The prompt includes the session's (token-windowed) history.
+    """
+    global agent
+    if agent is None:
+        with _agent_lock:
+            if agent is None:
+                # Heavy imports are deferred until the agent is needed
+                from langchain.agents import initialize_agent, AgentType
+                from langchain.prompts import MessagesPlaceholder
+                from app.services.tools.llm_tools import all_tools
+                llm = gateway.chat_model("agent", model_name="gpt-4", temperature=0.7)
+                agent = initialize_agent(
+                    tools=all_tools,
+                    llm=llm,
+                    agent=AgentType.OPENAI_FUNCTIONS,
+                    verbose=True,
+                    system_prompt=system_prompt,
+                    agent_kwargs={"extra_prompt_messages": [MessagesPlaceholder(variable_name="history")]}
+                )
+    return agent
+
+def new_agent_executor():
+    """Executor with its own bounded memory, sharing the agent template."""
+    from langchain.agents import AgentExecutor
+    template = get_agent()
+    return AgentExecutor.from_agent_and_tools(
+        agent=template.agent,
+        tools=template.tools,
+        memory=new_session_memory(),
+        verbose=True
+    )
+
+# One executor (with its own bounded memory) per session
+agent_sessions = SessionStore(new_agent_executor)
+
+def _has_history(executor) -> bool:
+    return bool(executor.memory.chat_memory.messages)
+
+def _cached_answer(session_id: Optional[str], executor, user_message: str, answer: str) -> str:
+    # Record the turn so follow-up questions in this session still have the context
+    executor.memory.save_context({"input": user_message}, {"output": answer})
+    agent_sessions.observe_memory(session_id)
+    return answer
+
+def chat_with_agent(user_message: str, session_id: Optional[str] = None) -> str:
+    """
+    Run the agent with the user message in the given session and return the response.
+    Paraphrases of recently answered questions are served from the semantic answer cache.
+    """
+    try:
+        with agent_sessions.sync_turn(session_id) as executor:
+            lookup = answer_cache.lookup(user_message, has_history=_has_history(executor))
+            if lookup is not None and lookup.answer is not None:
+                return _cached_answer(session_id, executor, user_message, lookup.answer)
+            agent_sessions.observe_prompt(session_id, user_message)
+            tools = ToolRecorder()
+            start = time.perf_counter()
+            response = executor.invoke({"input": user_message}, config={"callbacks": [tools, metrics_callbacks]})
+            agent_sessions.observe_memory(session_id)
+        answer = response["output"] if isinstance(response, dict) and "output" in response else str(response)
+        answer_cache.store(lookup, answer, time.perf_counter() - start, tools.used)
+        return answer
+    except Exception as e:
+        raise_if_upstream_busy(e)
+        return f"Error: {str(e)}"
+
+async def achat_with_agent(user_message: str, session_id: Optional[str] = None) -> str:
+    """
+    Async variant of chat_with_agent: awaits the agent (LLM calls and async tools),
+    so the event loop keeps serving other requests meanwhile.
+    """
+    try:
+        async with agent_sessions.turn(session_id) as executor:
+            # The lookup embeds the question, keep that off the event loop
+            lookup = await asyncio.to_thread(answer_cache.lookup, user_message, _has_history(executor))
+            if lookup is not None and lookup.answer is not None:
+                return _cached_answer(session_id, executor, user_message, lookup.answer)
+            agent_sessions.observe_prompt(session_id, user_message)
+            tools = ToolRecorder()
+            start = time.perf_counter()
+            response = await executor.ainvoke({"input": user_message},
+                                              config={"callbacks": [tools, metrics_callbacks]})
+            agent_sessions.observe_memory(session_id)
+        answer = response["output"] if isinstance(response, dict) and "output" in response else str(response)
+        answer_cache.store(lookup, answer, time.perf_counter() - start, tools.used)
+        return answer
+    except Exception as e:
+        raise_if_upstream_busy(e)
+        return f"Error: {str(e)}"
 
-def chat_with_agent(user_message: str) -> str:
+async def astream_chat_with_agent(user_message: str, session_id: Optional[str] = None):
     """
-    Run the agent with the user message and return the response.
+    Streaming variant of chat_with_agent. Yields (event, data) tuples:
+    ("token", text) for answer tokens, ("tool_start", {...}) / ("tool_end", {...}) for tool progress,
+    then ("done", {"response": full_answer}) or ("error", {"detail": ...}).
     """
     try:
-        response = agent.invoke({"input": user_message})
-        return response["output"] if isinstance(response, dict) and "output" in response else str(response)
+        async with agent_sessions.turn(session_id) as executor:
+            lookup = await asyncio.to_thread(answer_cache.lookup, user_message, _has_history(executor))
+            if lookup is not None and lookup.answer is not None:
+                answer = _cached_answer(session_id, executor, user_message, lookup.answer)
+                yield "token", answer
+                yield "done", {"response": answer, "cached": True}
+                return
+            agent_sessions.observe_prompt(session_id, user_message)
+            output = None
+            tools_used = set()
+            start = time.perf_counter()
+            async for event in executor.astream_events({"input": user_message}, version="v2",
+                                                     config={"callbacks": [metrics_callbacks]}):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        yield "token", content
+                elif kind == "on_tool_start":
+                    tools_used.add(event["name"])
+                    yield "tool_start", {"tool": event["name"], "input": event["data"].get("input")}
+                elif kind == "on_tool_end":
+                    yield "tool_end", {"tool": event["name"]}
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    output = event["data"].get("output")
+            agent_sessions.observe_memory(session_id)
+        answer = output["output"] if isinstance(output, dict) and "output" in output else str(output)
+        answer_cache.store(lookup, answer, time.perf_counter() - start, tools_used)
+        yield "done", {"response": answer}
     except Exception as e:
-        return f"Error: {str(e)}" 
\ No newline at end of file
+        yield "error", upstream_error_event(e)
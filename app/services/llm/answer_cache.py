@@ -0,0 +1,221 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+import numpy as np
+import faiss
+from langchain_core.callbacks import BaseCallbackHandler
+from app.services.metrics import span
+
+# Set to 0 to disable the answer cache
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+# Minimum cosine similarity between a new question and a cached one to reuse its answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+# Cached answers expire after this many seconds
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Max cached answers (least recently used are evicted first)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+# Answers are only cached when every tool used is deterministic and user-independent
+CACHEABLE_TOOLS = frozenset({"knowledge_base_search"})
+
+# Messages that refer back to the conversation only make sense within their session
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|that|this|those|these|they|them|more|again|above|previous|earlier|before|"
+    r"you said|told you|remember|last)\b", re.IGNORECASE
+)
+# Numbers (weights, heights, scores) and requests for quotes make answers personal or random
+VOLATILE_PATTERN = re.compile(r"\d|\b(quote|motivat\w*|inspir\w*)\b", re.IGNORECASE)
+
+logger = logging.getLogger("answer_cache")
+
+
+def is_cacheable_message(message: str, has_history: bool = False) -> bool:
+    """
+    False for messages whose answer depends on the session or is personal or random.
+    """
+    if VOLATILE_PATTERN.search(message):
+        return False
+    return not (has_history and FOLLOW_UP_PATTERN.search(message))
+
+
+class ToolRecorder(BaseCallbackHandler):
+    """
+    Callback that records the names of the tools used during an agent run.
+    """
+
+    def __init__(self):
+        self.used = set()
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.used.add((serialized or {}).get("name") or kwargs.get("name"))
+
+
+class AnswerLookup:
+    """
+    Result of a cache lookup: the question's embedding and, on a hit, the cached answer.
+    has_history records whether the question was asked in a session with earlier turns.
+    """
+    __slots__ = ("question", "vector", "answer", "has_history")
+
+    def __init__(self, question: str, vector: np.ndarray, answer: Optional[str] = None,
+                 has_history: bool = False):
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.has_history = has_history
+
+
+class _Entry:
+    __slots__ = ("question", "answer", "created", "latency")
+
+    def __init__(self, question: str, answer: str, created: float, latency: float):
+        self.question = question
+        self.answer = answer
+        self.created = created
+        self.latency = latency
+
+
+class SemanticAnswerCache:
+    """
+    Caches agent answers by question meaning. Questions are embedded (normalized) into a small
+    dedicated FAISS inner-product index; a new question whose nearest cached neighbour has a
+    cosine similarity of at least `threshold` gets that neighbour's answer without running the agent.
+    Entries expire after ttl_seconds; the least recently used are evicted beyond max_entries.
+    """
+
+    def __init__(self, embeddings_factory: Optional[Callable] = None, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 enabled: bool = ANSWER_CACHE_ENABLED, clock: Callable[[], float] = time.monotonic):
+        self.embeddings_factory = embeddings_factory
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.clock = clock
+        self._embeddings = None
+        self._lock = threading.Lock()
+        self._index = None
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self.lookups = 0
+        self.hits = 0
+        self.bypassed = 0
+        self.stored = 0
+        self.evicted = 0
+        self.expired = 0
+        self.latency_saved = 0.0
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            if self.embeddings_factory is None:
+                # Same (query-cached) embeddings client as retrieval
+                from app.knowledge_base.vector_store import shared_vector_store
+                self._embeddings = shared_vector_store.embeddings
+            else:
+                self._embeddings = self.embeddings_factory()
+        return self._embeddings
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray([self.embeddings.embed_query(text.strip().lower())], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, question: str, has_history: bool = False) -> Optional[AnswerLookup]:
+        """
+        Returns None when the question bypasses the cache, otherwise an AnswerLookup whose
+        answer is set on a hit. Pass the lookup to store() after answering a miss.
+        """
+        if not self.enabled:
+            return None
+        if not is_cacheable_message(question, has_history):
+            with self._lock:
+                self.bypassed += 1
+            return None
+        try:
+            with span("answer_cache_embedding"):
+                vector = self._embed(question)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup skipped: {e}")
+            return None
+        with self._lock:
+            self.lookups += 1
+            if self._index is None or self._index.ntotal == 0:
+                return AnswerLookup(question, vector, has_history=has_history)
+            scores, ids = self._index.search(vector, 1)
+            entry_id = int(ids[0][0])
+            if entry_id < 0 or scores[0][0] < self.threshold:
+                return AnswerLookup(question, vector, has_history=has_history)
+            entry = self._entries[entry_id]
+            if self.clock() - entry.created >= self.ttl_seconds:
+                self._remove(entry_id)
+                self.expired += 1
+                return AnswerLookup(question, vector, has_history=has_history)
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            self.latency_saved += entry.latency
+            logger.info(f"Answer cache hit ({scores[0][0]:.3f}): '{question}' ~ '{entry.question}'")
+            return AnswerLookup(question, vector, entry.answer, has_history)
+
+    def store(self, lookup: Optional[AnswerLookup], answer: str, latency: float, tools_used: Iterable[str] = ()):
+        """
+        Caches the answer to a missed lookup, unless it is an error, used a non-cacheable tool
+        or was given in a session with history (it may depend on what the user said earlier,
+        e.g. "What is my name?", and must not be served to other sessions).
+        latency: seconds the agent took (reported as saved on later hits).
+        """
+        if lookup is None or lookup.answer is not None or answer.startswith("Error:"):
+            return
+        if lookup.has_history or not set(tools_used) <= CACHEABLE_TOOLS:
+            with self._lock:
+                self.bypassed += 1
+            return
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(lookup.vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(lookup.vector, np.asarray([entry_id], dtype=np.int64))
+            self._entries[entry_id] = _Entry(lookup.question, answer, self.clock(), latency)
+            self.stored += 1
+            self._evict()
+
+    def _evict(self):
+        now = self.clock()
+        for entry_id in [i for i, entry in self._entries.items() if now - entry.created >= self.ttl_seconds]:
+            self._remove(entry_id)
+            self.expired += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evicted += 1
+
+    def _remove(self, entry_id: int):
+        del self._entries[entry_id]
+        self._index.remove_ids(np.asarray([entry_id], dtype=np.int64))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index = None
+
+    def stats(self) -> dict:
+        """Returns hit rate and the agent time saved by cache hits."""
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_ratio": self.hits / self.lookups if self.lookups else 0.0,
+            "bypassed": self.bypassed,
+            "stored": self.stored,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "latency_saved_seconds": self.latency_saved,
+        }
+
+
+# Answer cache for the agent (/chat)
+answer_cache = SemanticAnswerCache()
@@ -1,50 +1,39 @@
 import os
+import threading
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
+from langchain_core.messages import HumanMessage
+from app.services.llm.memory import SessionStore, new_session_memory
+from app.services.llm.gateway import gateway, raise_if_upstream_busy, upstream_error_event
+from typing import Optional
 
-# Print current working directory
-print("Current working directory:", os.getcwd())
-
-# Always load .env from the current working directory
+# Always load .env from the current working directory (variables already set take precedence)
 DOTENV_PATH = os.path.join(os.getcwd(), '.env')
-print("Loading .env from:", DOTENV_PATH)
 load_dotenv(DOTENV_PATH)
 
-# Print contents of .env
-try:
-    with open(DOTENV_PATH, 'r') as f:
-        print(".env contents:\n", f.read())
-except Exception as e:
-    print("Could not read .env:", e)
-
-# Print all OPENAI-related env vars
-for k, v in os.environ.items():
-    if "OPENAI" in k:
-        print(f"{k}={v}")
-
-# Use only OPENAI_API_KEY
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-print("OPENAI_API_KEY used:", OPENAI_API_KEY)
+# ChatOpenAI model (GPT-4), built on first use (see get_chat_model)
+chat_model = None
+_chat_model_lock = threading.Lock()
 
-# Initialize ChatOpenAI model (GPT-4)
-chat_model = ChatOpenAI(
-    model_name="gpt-4",
-    temperature=0.7,
-    openai_api_key=OPENAI_API_KEY
-)
+def get_chat_model():
+    """Returns the shared ChatOpenAI model (calls go through the LLM gateway), creating it on first use."""
+    global chat_model
+    if chat_model is None:
+        with _chat_model_lock:
+            if chat_model is None:
+                chat_model = gateway.chat_model("chat", model_name="gpt-4", temperature=0.7)
+    return chat_model
 
-# Initialize Conversation Memory
-memory = ConversationBufferMemory(return_messages=True)
+def new_conversation_chain():
+    """ConversationChain with its own token-windowed memory."""
+    from langchain.chains import ConversationChain
+    return ConversationChain(
+        llm=get_chat_model(),
+        memory=new_session_memory(),
+        verbose=True
+    )
 
-# Initialize ConversationChain with memory
-conversation_chain = ConversationChain(
-    llm=chat_model,
-    memory=memory,
-    verbose=True
-)
+# One ConversationChain per session
+conversation_sessions = SessionStore(new_conversation_chain)
 
 def generate_response(prompt: str) -> str:
     """
@@ -56,23 +45,67 @@ def generate_response(prompt: str) -> str:
     """
     try:
         messages = [HumanMessage(content=prompt)]
-        response = chat_model(messages)
+        response = get_chat_model().invoke(messages)
         return response.content
     except Exception as e:
-        # Return error message for debugging
+        # Throttling and provider outages are served as 503, anything else as a message for debugging
+        raise_if_upstream_busy(e)
         return f"Error: {str(e)}"
 
-def generate_response_with_memory(prompt: str) -> str:
+def generate_response_with_memory(prompt: str, session_id: Optional[str] = None) -> str:
     """
     Generate a response from GPT-4 using LangChain ConversationChain with memory.
     Args:
         prompt (str): The user prompt to send to the model.
+        session_id (str): Conversation whose memory is used (a fresh, unkept one if None).
+    Returns:
+        str: The model's response as a string, with conversational memory.
+    """
+    try:
+        with conversation_sessions.sync_turn(session_id) as conversation_chain:
+            conversation_sessions.observe_prompt(session_id, prompt)
+            response = conversation_chain.predict(input=prompt)
+            conversation_sessions.observe_memory(session_id)
+        return response
+    except Exception as e:
+        raise_if_upstream_busy(e)
+        return f"Error: {str(e)}"
+
+async def agenerate_response_with_memory(prompt: str, session_id: Optional[str] = None) -> str:
+    """
+    Async variant of generate_response_with_memory (does not block the event loop).
+    Args:
+        prompt (str): The user prompt to send to the model.
+        session_id (str): Conversation whose memory is used (a fresh, unkept one if None).
     Returns:
         str: The model's response as a string, with conversational memory.
     """
     try:
-        response = conversation_chain.predict(input=prompt)
+        async with conversation_sessions.turn(session_id) as conversation_chain:
+            conversation_sessions.observe_prompt(session_id, prompt)
+            response = await conversation_chain.apredict(input=prompt)
+            conversation_sessions.observe_memory(session_id)
         return response
     except Exception as e:
-        # Return error message for debugging
-        return f"Error: {str(e)}" 
\ No newline at end of file
+        raise_if_upstream_busy(e)
+        return f"Error: {str(e)}"
+
+async def astream_response_with_memory(prompt: str, session_id: Optional[str] = None):
+    """
+    Streaming variant of generate_response_with_memory.
+    Yields ("token", text) tuples, then ("done", {"response": full_answer}) or ("error", {"detail": ...}).
+    """
+    try:
+        async with conversation_sessions.turn(session_id) as conversation_chain:
+            conversation_sessions.observe_prompt(session_id, prompt)
+            parts = []
+            async for event in conversation_chain.astream_events({"input": prompt}, version="v2"):
+                if event["event"] == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        parts.append(content)
+                        yield "token", content
+            conversation_sessions.observe_memory(session_id)
+        yield "done", {"response": "".join(parts)}
+    except Exception as e:
+        yield "error", upstream_error_event(e)
@@ -0,0 +1,448 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Optional
+import httpx
+from app.services.metrics import registry, metrics_callbacks
+
+# Max LLM requests in flight in this process, over all callers; further calls wait for a slot (0 = no limit)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Seconds a call may wait for a slot before it fails as upstream-busy (0 = wait as long as it takes)
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+# Retries of throttled (429), server (5xx) and connection errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+# Keep-alive connection pool shared by all callers
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# Backoff bounds in seconds
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20.0
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+logger = logging.getLogger("llm_gateway")
+
+upstream_seconds = registry.histogram(
+    "llm_upstream_duration_seconds", "LLM HTTP calls per caller, retries and backoff included.", ("caller",))
+
+
+class UpstreamBusyError(Exception):
+    """The LLM provider is throttling or failing (after retries), or no call slot freed up in time."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_upstream_busy(error: Exception) -> bool:
+    """
+    True for errors a client should retry later: throttling (429), provider 5xx,
+    connection failures and a full gateway.
+    """
+    if isinstance(error, UpstreamBusyError):
+        return True
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+def as_upstream_busy(error: Exception) -> Optional[UpstreamBusyError]:
+    """The error as an UpstreamBusyError (with the provider's Retry-After), or None if it is not one."""
+    if isinstance(error, UpstreamBusyError):
+        return error
+    if not is_upstream_busy(error):
+        return None
+    response = getattr(error, "response", None)
+    retry_after = _retry_after(response) if isinstance(response, httpx.Response) else None
+    busy = UpstreamBusyError(f"LLM provider is busy: {error}", retry_after)
+    busy.__cause__ = error
+    return busy
+
+
+def raise_if_upstream_busy(error: Exception):
+    """Re-raises provider throttling / outages as UpstreamBusyError (served as 503), ignores other errors."""
+    busy = as_upstream_busy(error)
+    if busy is not None:
+        raise busy
+
+
+def upstream_error_event(error: Exception) -> dict:
+    """Data of a stream's "error" event; upstream-busy errors carry status 503 and a retry hint."""
+    busy = as_upstream_busy(error)
+    if busy is None:
+        return {"detail": f"Error: {str(error)}"}
+    return {"detail": str(busy), "status": 503, "retry_after": busy.retry_after}
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        value = response.headers.get("retry-after")
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter, but never earlier than the provider asked for."""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    return max(delay, min(retry_after or 0.0, RETRY_MAX_DELAY))
+
+
+class ConcurrencyLimiter:
+    """
+    Process-wide limit on concurrent calls, usable from threads (acquire) and from any event
+    loop (aacquire) alike. Waiters are served first come, first served: release() hands the
+    slot straight to the oldest waiter.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _try_acquire(self) -> bool:
+        if self.limit <= 0 or (self.active < self.limit and not self._waiters):
+            self.active += 1
+            return True
+        return False
+
+    def _cancel(self, waiter) -> bool:
+        # Under the lock: still queued means the wait failed; otherwise the slot was handed over
+        try:
+            self._waiters.remove(waiter)
+            return False
+        except ValueError:
+            return True
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._try_acquire():
+                return True
+            event = threading.Event()
+            waiter = event.set
+            self._waiters.append(waiter)
+        if event.wait(timeout):
+            return True
+        with self._lock:
+            return self._cancel(waiter)
+
+    async def aacquire(self, timeout: Optional[float] = None) -> bool:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_acquire():
+                return True
+            future = loop.create_future()
+
+            def waiter():
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            with self._lock:
+                return self._cancel(waiter)
+        except asyncio.CancelledError:
+            with self._lock:
+                owned = self._cancel(waiter)
+            if owned:
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                try:
+                    # The slot moves to the waiter, active stays the same
+                    waiter()
+                    return
+                except RuntimeError:
+                    # The waiter's event loop is gone
+                    continue
+            self.active -= 1
+
+
+class CallerStats:
+    """Counters of one caller (agent, chat, auto_score, ...)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "mean_seconds": round(self.seconds / self.calls, 4) if self.calls else 0.0,
+            "max_seconds": round(self.max_seconds, 4),
+        }
+
+
+class _Call:
+    """Bookkeeping of one HTTP call: the slot is released and stats recorded exactly once."""
+
+    def __init__(self, gateway, caller: str):
+        self.gateway = gateway
+        self.caller = caller
+        self.start = time.perf_counter()
+        self._done = False
+
+    def retry(self, status: Optional[int], delay: float, reason):
+        self.gateway._count(self.caller, retries=1, throttled=int(status == 429))
+        logger.warning(f"LLM call from {self.caller} failed ({reason}), retry in {delay:.2f}s")
+
+    def response(self, response: httpx.Response, stream_class) -> httpx.Response:
+        # The slot is held until the body is read or the stream closed
+        if response.status_code == 429:
+            self.gateway._count(self.caller, throttled=1)
+        stream = stream_class(response.stream, self, response.status_code >= 400)
+        return httpx.Response(response.status_code, headers=response.headers, stream=stream,
+                              extensions=response.extensions)
+
+    def finish(self, error: bool):
+        if self._done:
+            return
+        self._done = True
+        self.gateway.limiter.release()
+        seconds = time.perf_counter() - self.start
+        self.gateway._finish(self.caller, seconds, error)
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream, call: _Call, error: bool):
+        self._stream = stream
+        self._call = call
+        self._error = error
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._call.finish(self._error)
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, call: _Call, error: bool):
+        self._stream = stream
+        self._call = call
+        self._error = error
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._call.finish(self._error)
+
+
+class _GatewayTransport(httpx.BaseTransport):
+    """Per-caller transport over the shared pool: takes a slot, retries, records the call."""
+
+    def __init__(self, gateway, caller: str):
+        self.gateway = gateway
+        self.caller = caller
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        gateway = self.gateway
+        if not gateway.limiter.acquire(gateway.queue_timeout or None):
+            gateway._count(self.caller, rejected=1)
+            raise UpstreamBusyError("Too many LLM calls in flight", retry_after=1.0)
+        call = _Call(gateway, self.caller)
+        try:
+            for attempt in range(gateway.max_retries + 1):
+                try:
+                    response = gateway.transport.handle_request(request)
+                except RETRYABLE_TRANSPORT_ERRORS as e:
+                    if attempt == gateway.max_retries:
+                        raise
+                    delay = backoff_delay(attempt)
+                    call.retry(None, delay, e)
+                    gateway.sleep(delay)
+                    continue
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == gateway.max_retries:
+                    return call.response(response, _ReleasingStream)
+                delay = backoff_delay(attempt, _retry_after(response))
+                response.close()
+                call.retry(response.status_code, delay, f"HTTP {response.status_code}")
+                gateway.sleep(delay)
+        except BaseException:
+            call.finish(error=True)
+            raise
+
+    def close(self):
+        # The pool is shared with the other callers, see LLMGateway.close()
+        pass
+
+
+class _AsyncGatewayTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of _GatewayTransport."""
+
+    def __init__(self, gateway, caller: str):
+        self.gateway = gateway
+        self.caller = caller
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        gateway = self.gateway
+        if not await gateway.limiter.aacquire(gateway.queue_timeout or None):
+            gateway._count(self.caller, rejected=1)
+            raise UpstreamBusyError("Too many LLM calls in flight", retry_after=1.0)
+        call = _Call(gateway, self.caller)
+        try:
+            for attempt in range(gateway.max_retries + 1):
+                try:
+                    response = await gateway.async_transport.handle_async_request(request)
+                except RETRYABLE_TRANSPORT_ERRORS as e:
+                    if attempt == gateway.max_retries:
+                        raise
+                    delay = backoff_delay(attempt)
+                    call.retry(None, delay, e)
+                    await gateway.asleep(delay)
+                    continue
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == gateway.max_retries:
+                    return call.response(response, _AsyncReleasingStream)
+                delay = backoff_delay(attempt, _retry_after(response))
+                await response.aclose()
+                call.retry(response.status_code, delay, f"HTTP {response.status_code}")
+                await gateway.asleep(delay)
+        except BaseException:
+            call.finish(error=True)
+            raise
+
+    async def aclose(self):
+        pass
+
+
+class LLMGateway:
+    """
+    Shared HTTP layer of all chat models in the process.
+    Every caller gets clients over one keep-alive connection pool (sync and async), and every
+    call goes through a process-wide concurrency limit and is retried with exponential
+    backoff and jitter on throttling, provider 5xx and connection errors. Latency and errors
+    are counted per caller. The OpenAI client's own retries are turned off so that calls
+    are not retried twice.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, max_connections: int = LLM_MAX_CONNECTIONS,
+                 max_keepalive: int = LLM_MAX_KEEPALIVE, timeout: float = LLM_TIMEOUT,
+                 transport: Optional[httpx.BaseTransport] = None,
+                 async_transport: Optional[httpx.AsyncBaseTransport] = None):
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.transport = transport or httpx.HTTPTransport(limits=limits)
+        self.async_transport = async_transport or httpx.AsyncHTTPTransport(limits=limits)
+        self.limiter = ConcurrencyLimiter(max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._callers = {}
+        self._models = {}
+        self._lock = threading.Lock()
+
+    # Overridable in tests
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    async def asleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+    def _stats(self, caller: str) -> CallerStats:
+        stats = self._callers.get(caller)
+        if stats is None:
+            stats = self._callers.setdefault(caller, CallerStats())
+        return stats
+
+    def _count(self, caller: str, **amounts):
+        with self._lock:
+            stats = self._stats(caller)
+            for name, amount in amounts.items():
+                setattr(stats, name, getattr(stats, name) + amount)
+
+    def _finish(self, caller: str, seconds: float, error: bool):
+        with self._lock:
+            stats = self._stats(caller)
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+        upstream_seconds.observe(seconds, caller=caller)
+
+    def http_client(self, caller: str) -> httpx.Client:
+        return httpx.Client(transport=_GatewayTransport(self, caller), timeout=self.timeout)
+
+    def async_http_client(self, caller: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=_AsyncGatewayTransport(self, caller), timeout=self.timeout)
+
+    def chat_model(self, caller: str, model_name: str = "gpt-4", temperature: float = 0.7, **kwargs):
+        """
+        ChatOpenAI whose requests go through the gateway, labelled `caller` in the stats.
+        Models are shared: the same (caller, model, temperature, options) returns the same instance.
+        """
+        key = (caller, model_name, temperature, tuple(sorted(kwargs.items())))
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    from langchain_openai import ChatOpenAI
+                    model = self._models[key] = ChatOpenAI(
+                        model_name=model_name,
+                        temperature=temperature,
+                        openai_api_key=os.getenv("OPENAI_API_KEY"),
+                        http_client=self.http_client(caller),
+                        http_async_client=self.async_http_client(caller),
+                        max_retries=0,
+                        callbacks=[metrics_callbacks],
+                        **{"request_timeout": self.timeout, **kwargs}
+                    )
+        return model
+
+    def stats(self) -> dict:
+        with self._lock:
+            callers = {caller: stats.as_dict() for caller, stats in self._callers.items()}
+        return {
+            "in_flight": self.limiter.active,
+            "waiting": self.limiter.waiting,
+            "max_concurrency": self.limiter.limit,
+            "models": len(self._models),
+            "callers": callers,
+        }
+
+    def close(self):
+        self.transport.close()
+
+    async def aclose(self):
+        """Closes the async connection pool; call from the event loop that used it."""
+        await self.async_transport.aclose()
+
+
+# Process-wide gateway
+gateway = LLMGateway()
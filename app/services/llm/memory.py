@@ -0,0 +1,208 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Optional
+from app.services.core.tokens import estimate_tokens
+
+# Conversation history kept per session, in tokens (older turns are dropped first)
+SESSION_MAX_TOKENS = int(os.getenv("SESSION_MAX_TOKENS", "2000"))
+# Idle sessions are evicted after this many seconds
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+# Max live sessions per process
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+# Global cap on buffered history across all sessions, in (estimated) tokens
+MAX_TOTAL_MEMORY_TOKENS = int(os.getenv("MAX_TOTAL_MEMORY_TOKENS", "2000000"))
+
+logger = logging.getLogger("session_memory")
+
+
+def memory_tokens(memory) -> int:
+    """
+    Estimated size in tokens of the history held by a LangChain memory.
+    """
+    return sum(estimate_tokens(str(message.content)) for message in memory.chat_memory.messages)
+
+
+def new_session_memory():
+    """
+    Token-windowed conversation memory for one session.
+    """
+    from app.services.llm.token_memory import TokenWindowMemory
+    return TokenWindowMemory(max_token_limit=SESSION_MAX_TOKENS, return_messages=True)
+
+
+def __getattr__(name):
+    # TokenWindowMemory lives in its own module so importing this one does not load LangChain's memory package
+    if name == "TokenWindowMemory":
+        from app.services.llm.token_memory import TokenWindowMemory
+        return TokenWindowMemory
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _Session:
+    __slots__ = ("value", "last_used", "tokens", "turn_lock", "thread_lock")
+
+    def __init__(self, value, now: float):
+        self.value = value
+        self.last_used = now
+        self.tokens = 0
+        # Async turns queue on turn_lock; every turn, sync or async, holds thread_lock for its whole
+        # duration, so turns of one session do not interleave
+        self.turn_lock = asyncio.Lock()
+        self.thread_lock = threading.Lock()
+
+
+async def _acquire_off_loop(lock: threading.Lock):
+    """
+    Acquires a thread lock in a worker thread so the event loop is not blocked meanwhile.
+    If the waiting coroutine is cancelled, the lock is released as soon as the thread gets it.
+    """
+    if lock.acquire(blocking=False):
+        return
+    acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        acquiring.add_done_callback(lambda done: None if done.cancelled() or done.exception() else lock.release())
+        raise
+
+
+class SessionStore:
+    """
+    Per-session conversation objects (agent executors or chains, each with its own `.memory`).
+    Idle sessions expire after ttl_seconds; least recently used sessions are evicted when there
+    are more than max_sessions or their buffered history exceeds max_total_tokens.
+    A request without a session_id gets a fresh conversation of its own that is not kept, so
+    clients that do not send one never share history.
+    """
+
+    def __init__(self, factory: Callable, max_sessions: int = MAX_SESSIONS,
+                 ttl_seconds: float = SESSION_TTL_SECONDS, max_total_tokens: int = MAX_TOTAL_MEMORY_TOKENS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_total_tokens = max_total_tokens
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._total_tokens = 0
+        self.created = 0
+        self.ephemeral = 0
+        self.evicted = 0
+        self.prompts = 0
+        self.prompt_tokens = 0
+
+    def get(self, session_id: Optional[str] = None):
+        """
+        Returns the conversation object of a session, creating it if needed
+        (a new, unstored one when there is no session_id).
+        """
+        return self._session(session_id).value
+
+    @asynccontextmanager
+    async def turn(self, session_id: Optional[str] = None):
+        """
+        Async context manager holding a session for one turn and yielding its conversation
+        object. Concurrent turns of the same session wait for each other, so their history
+        updates cannot interleave; different sessions run in parallel.
+        """
+        session = self._session(session_id)
+        async with session.turn_lock:
+            await _acquire_off_loop(session.thread_lock)
+            try:
+                yield session.value
+            finally:
+                session.thread_lock.release()
+
+    @contextmanager
+    def sync_turn(self, session_id: Optional[str] = None):
+        """
+        Blocking counterpart of turn for synchronous callers; it excludes async turns of the
+        same session as well.
+        """
+        session = self._session(session_id)
+        with session.thread_lock:
+            yield session.value
+
+    def _session(self, session_id: Optional[str]) -> _Session:
+        with self._lock:
+            now = self.clock()
+            if not session_id:
+                self.ephemeral += 1
+                return _Session(self.factory(), now)
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = _Session(self.factory(), now)
+                self._sessions[session_id] = session
+                self.created += 1
+                self._evict_over_capacity(keep=session_id)
+            else:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def observe_prompt(self, session_id: Optional[str], user_message: str):
+        """Records the estimated prompt size (history + new message) of a turn."""
+        session = self._sessions.get(session_id) if session_id else None
+        history = memory_tokens(session.value.memory) if session is not None else 0
+        with self._lock:
+            self.prompts += 1
+            self.prompt_tokens += history + estimate_tokens(user_message)
+
+    def observe_memory(self, session_id: Optional[str]):
+        """Updates the buffered size of a session after a turn and enforces the global cap."""
+        if not session_id:
+            return
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            tokens = memory_tokens(session.value.memory)
+            self._total_tokens += tokens - session.tokens
+            session.tokens = tokens
+            self._evict_over_capacity(keep=session_id)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_tokens -= session.tokens
+
+    def _evict_expired(self, now: float):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.ttl_seconds:
+                break
+            self._evict(session_id)
+
+    def _evict_over_capacity(self, keep: str):
+        while self._sessions and (len(self._sessions) > self.max_sessions
+                                  or self._total_tokens > self.max_total_tokens):
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            self._evict(session_id)
+
+    def _evict(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._total_tokens -= session.tokens
+        self.evicted += 1
+        logger.info(f"Evicted conversation session {session_id}")
+
+    def stats(self) -> dict:
+        """Returns live sessions, evictions and the average prompt size in tokens."""
+        return {
+            "live_sessions": len(self._sessions),
+            "created": self.created,
+            "ephemeral": self.ephemeral,
+            "evicted": self.evicted,
+            "buffered_tokens": self._total_tokens,
+            "prompts": self.prompts,
+            "avg_prompt_tokens": self.prompt_tokens / self.prompts if self.prompts else 0.0,
+        }
@@ -0,0 +1,67 @@
+import json
+import time
+import threading
+from collections import deque
+from typing import AsyncIterator, Tuple
+
+# Number of most recent samples kept per latency metric
+LATENCY_WINDOW = 1000
+
+
+class LatencyStats:
+    """
+    Keeps the most recent latency samples (seconds) and reports count, mean and percentiles.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count, "avg": None, "p50": None, "p95": None}
+
+        def percentile(q: float) -> float:
+            return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+        return {
+            "count": self.count,
+            "avg": sum(samples) / len(samples),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+        }
+
+
+# Time from request start to the first streamed token, per endpoint
+ttft_stats = {
+    "chat": LatencyStats(),
+    "memory_chat": LatencyStats(),
+}
+
+
+def sse_event(event: str, data) -> str:
+    """
+    Formats one Server-Sent Event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def sse_stream(events: AsyncIterator[Tuple[str, object]], metric: str) -> AsyncIterator[str]:
+    """
+    Turns (event, data) tuples into SSE text and records time-to-first-token under `metric`.
+    """
+    start = time.perf_counter()
+    first_token = True
+    async for event, data in events:
+        if event == "token" and first_token:
+            ttft_stats[metric].record(time.perf_counter() - start)
+            first_token = False
+        yield sse_event(event, data)
@@ -0,0 +1,19 @@
+from typing import Any, Dict
+from langchain.memory import ConversationBufferMemory
+from app.services.core.tokens import estimate_tokens
+from app.services.llm.memory import SESSION_MAX_TOKENS, memory_tokens
+
+
+class TokenWindowMemory(ConversationBufferMemory):
+    """
+    Conversation buffer that drops the oldest messages once the history exceeds max_token_limit
+    (estimated tokens), so prompts stop growing with the length of the conversation.
+    """
+    max_token_limit: int = SESSION_MAX_TOKENS
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        messages = self.chat_memory.messages
+        total = memory_tokens(self)
+        while messages and total > self.max_token_limit:
+            total -= estimate_tokens(str(messages.pop(0).content))
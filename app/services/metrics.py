@@ -0,0 +1,370 @@
+import os
+import re
+import time
+import bisect
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Callable, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Per-request instrumentation (spans, request histograms, token counts); /metrics still exports stats() when off
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger("metrics")
+
+# Stages timed during the current request, as (stage, seconds); None outside a request
+_trace: ContextVar[Optional[list]] = ContextVar("metrics_trace", default=None)
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                                for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket histogram. observe() only increments the first bucket the value fits in;
+    buckets are accumulated when rendered.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels) -> Optional[dict]:
+        """Returns count and sum of one label combination, or None if it was never observed."""
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return {"count": series[2], "sum": series[1]} if series else None
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else _format_value(float(bound))
+                bucket_labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds the process metrics and renders them in the Prometheus text format.
+    Besides its own counters, gauges and histograms it exports the stats() dicts of the
+    services registered with register_stats(): every numeric value becomes a gauge named
+    <source>_<key> (nested dicts are flattened), collected only when /metrics is scraped.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics = []
+        self._stats_sources = {}
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def register_stats(self, source: str, stats: Callable[[], dict]):
+        """Exports the numeric values of stats() under the `source` prefix."""
+        self._stats_sources[source] = stats
+
+    def _stats_lines(self) -> list:
+        lines = []
+        for source, stats in self._stats_sources.items():
+            try:
+                values = stats() or {}
+            except Exception as e:
+                logger.warning(f"Could not collect {source} stats: {e}")
+                continue
+            for key, value in _flatten(values):
+                name = _metric_name(f"{source}_{key}")
+                lines += [f"# TYPE {name} gauge", f"{name} {_format_value(value)}"]
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        lines += self._stats_lines()
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(values: dict, prefix: str = ""):
+    for key, value in values.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name + "_")
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "stage_duration_seconds", "Time spent per request stage (LLM calls, tools, embeddings, searches).", ("stage",))
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency, until the last body byte.", ("method", "path", "status"))
+requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served.", ("path",))
+llm_tokens = registry.counter("llm_tokens_total", "Tokens used by LLM calls.", ("model", "type"))
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.stage, time.perf_counter() - self.start)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(stage: str):
+    """
+    Context manager timing a stage of the current request (works around sync and awaited code).
+    When metrics are disabled it returns a shared no-op.
+    """
+    if not registry.enabled:
+        return _NOOP_SPAN
+    return _Span(stage)
+
+
+def record_stage(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((stage, seconds))
+
+
+def current_trace() -> Optional[list]:
+    """(stage, seconds) pairs recorded so far in the current request."""
+    return _trace.get()
+
+
+def server_timing(trace: list) -> str:
+    """Server-Timing header value: total milliseconds and count per stage, in first-seen order."""
+    totals = {}
+    for stage, seconds in trace:
+        total, count = totals.get(stage, (0.0, 0))
+        totals[stage] = (total + seconds, count + 1)
+    return ", ".join(f'{_metric_name(stage)};dur={total * 1000:.1f};desc="{stage} x{count}"'
+                     for stage, (total, count) in totals.items())
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records LLM calls ("llm") and tool runs ("tool:<name>") as stages of the current request
+    and counts the tokens reported by the LLM.
+    """
+    # Run in the caller's context (not an executor) so stages land in the request's trace
+    run_inline = True
+
+    def __init__(self):
+        self._starts = {}
+
+    def _start(self, run_id, stage: str):
+        if registry.enabled:
+            self._starts[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            record_stage(started[0], time.perf_counter() - started[1])
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+        if registry.enabled:
+            self._count_tokens(response)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, f"tool:{(serialized or {}).get('name') or kwargs.get('name')}")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    @staticmethod
+    def _count_tokens(response):
+        llm_output = response.llm_output or {}
+        model = llm_output.get("model_name", "")
+        prompt = completion = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt += usage.get("input_tokens", 0)
+                    completion += usage.get("output_tokens", 0)
+        if not prompt and not completion:
+            usage = llm_output.get("token_usage") or {}
+            prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        if prompt:
+            llm_tokens.inc(prompt, model=model, type="prompt")
+        if completion:
+            llm_tokens.inc(completion, model=model, type="completion")
+
+
+# Shared handler, passed to the chat models and agent runs
+metrics_callbacks = MetricsCallbackHandler()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: in-flight gauge and latency histogram per route, plus a request-scoped
+    trace of stages, returned in a Server-Timing header. Unknown paths are labelled "other".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._paths = None
+
+    def _path_label(self, scope) -> str:
+        if self._paths is None and "app" in scope:
+            self._paths = {getattr(route, "path", None) for route in scope["app"].routes}
+        return scope["path"] if self._paths and scope["path"] in self._paths else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not registry.enabled:
+            await self.app(scope, receive, send)
+            return
+        path = self._path_label(scope)
+        trace = []
+        token = _trace.set(trace)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", server_timing(trace).encode("latin-1"))]
+            await send(message)
+
+        requests_in_flight.inc(path=path)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            requests_in_flight.dec(path=path)
+            request_seconds.observe(time.perf_counter() - start, method=scope["method"], path=path,
+                                    status=str(status))
+            _trace.reset(token)
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Flight:
+    def __init__(self, loop=None):
+        self.future = Future()
+        # Event loop the computation runs on, None when it runs in a thread
+        self.loop = loop
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key runs the computation,
+    callers arriving while it is in flight wait for it and get the same result, or the same
+    exception. Nothing is kept once the call finishes (this is not a cache).
+    Works from threads (do) and from event loops (ado), for the same keys; shared results
+    must be treated as read-only.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+        _groups.append(self)
+
+    def _join(self, key: Hashable, loop=None):
+        """Returns (flight, leader)."""
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight(loop)
+            self.executed += 1
+            return flight, True
+
+    def _land(self, key: Hashable, flight: _Flight, result=None, error: BaseException = None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if error is not None:
+                self.errors += 1
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs):
+        """Runs fn(*args, **kwargs), or waits for the identical call already in flight."""
+        flight, leader = self._join(key)
+        if not leader:
+            if flight.loop is not None and _running_loop() is flight.loop:
+                # Blocking here would stall the loop the leader runs on: compute independently
+                return fn(*args, **kwargs)
+            return flight.future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, result)
+        return result
+
+    async def ado(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs):
+        """
+        Async variant of do(). The computation runs as its own task, so a cancelled caller
+        (e.g. a disconnected client) does not cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        flight, leader = self._join(key, loop)
+        if leader:
+            task = loop.create_task(fn(*args, **kwargs))
+
+            def land(done: asyncio.Task):
+                if done.cancelled():
+                    self._land(key, flight, error=asyncio.CancelledError())
+                elif done.exception() is not None:
+                    self._land(key, flight, error=done.exception())
+                else:
+                    self._land(key, flight, done.result())
+
+            task.add_done_callback(land)
+        return await asyncio.shield(asyncio.wrap_future(flight.future))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "in_flight": len(self._flights),
+            }
+
+
+_groups = []
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def singleflight_stats() -> dict:
+    """Stats of every SingleFlight group by name; `coalesced` counts upstream calls saved."""
+    return {group.name: group.stats() for group in _groups}
@@ -1,13 +1,22 @@
+import json
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from langchain.tools import StructuredTool
 from pydantic import BaseModel, Field
 from app.services.core.retrieval import AdvancedRetriever
 from app.services.core.bmi import calculate_bmi
 from app.services.core.quote import get_quote
 from app.services.core.decision_matrix import calculate_decision_matrix
-from langchain_openai import ChatOpenAI
+from app.services.llm.gateway import gateway
+from app.services.singleflight import SingleFlight
 import os
 
 # Retrieval Tool
+# One retriever for all tool calls; it reads from the shared vector store
+retriever = AdvancedRetriever()
+
 class RetrievalInput(BaseModel):
     query: str = Field(..., description="User's question for knowledge base search.")
 
@@ -17,14 +26,20 @@ def retrieval_tool_func(input: RetrievalInput = None, **kwargs) -> str:
         query = input.query
     else:
         query = kwargs.get("query")
-    retriever = AdvancedRetriever()
-    result = retriever.retrieve(query)
+    return format_retrieval_result(retriever.retrieve(query))
+
+async def aretrieval_tool_func(input: RetrievalInput = None, **kwargs) -> str:
+    query = input.query if input is not None else kwargs.get("query")
+    return format_retrieval_result(await retriever.aretrieve(query))
+
+def format_retrieval_result(result) -> str:
     if result.not_found or not result.chunks:
         return "No relevant information found in the knowledge base."
     return '\n\n'.join([f"Source: {chunk.source}, Page: {chunk.page}\n{chunk.text}" for chunk in result.chunks])
 
 retrieval_tool = StructuredTool.from_function(
     func=retrieval_tool_func,
+    coroutine=aretrieval_tool_func,
     name="knowledge_base_search",
     description="Use this tool to answer questions that require information from the knowledge base (PDF books). Returns relevant excerpts with sources and pages.",
     args_schema=RetrievalInput
@@ -48,8 +63,13 @@ def bmi_tool_func(input: BMIInput = None, **kwargs) -> str:
     except Exception as e:
         return f"Error: {str(e)}"
 
+async def abmi_tool_func(input: BMIInput = None, **kwargs) -> str:
+    # Pure arithmetic, safe to run on the event loop
+    return bmi_tool_func(input, **kwargs)
+
 bmi_tool = StructuredTool.from_function(
     func=bmi_tool_func,
+    coroutine=abmi_tool_func,
     name="bmi_calculator",
     description="Calculate BMI. Provide weight_kg and height_cm. Returns BMI value.",
     args_schema=BMIInput
@@ -62,20 +82,37 @@ class QuoteInput(BaseModel):
 def quote_tool_func(input: QuoteInput = None) -> str:
     return get_quote()
 
+async def aquote_tool_func(input: QuoteInput = None) -> str:
+    # Served from the in-memory quote pool, never blocks
+    return get_quote()
+
 quote_tool = StructuredTool.from_function(
     func=quote_tool_func,
+    coroutine=aquote_tool_func,
     name="motivational_quote",
     description="Get a random motivational quote. No input required.",
     args_schema=QuoteInput
 )
 
 # Decision Matrix Tool
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-llm = ChatOpenAI(
-    model_name="gpt-4",
-    temperature=0.7,
-    openai_api_key=OPENAI_API_KEY
-)
+# LLM used for auto-scoring, built on first use (see get_llm)
+llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """Returns the auto-scoring LLM (calls go through the LLM gateway), creating it on first use."""
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                llm = gateway.chat_model("auto_score", model_name="gpt-4", temperature=0.7)
+    return llm
+
+# Concurrent identical scoring prompts share one LLM call (the calls are stateless)
+score_flights = SingleFlight("auto_score")
+
+def _invoke_llm(prompt):
+    return score_flights.do(prompt, lambda: get_llm().invoke(prompt))
 
 class DecisionMatrixInput(BaseModel):
     options: list[str] = Field(..., description="List of options to choose from.")
@@ -83,40 +120,124 @@ class DecisionMatrixInput(BaseModel):
     weights: list[float] = Field(..., description="List of weights for each criterion.")
     scores: list[list[float]] | None = Field(None, description="Matrix of scores: each row is an option, each column is a criterion. If not provided, the agent will estimate scores automatically.")
 
-def auto_score(options, criteria, with_explanations=False):
+# Scoring: one structured LLM call for all criteria, falling back to concurrent per-criterion calls
+AUTO_SCORE_SINGLE_CALL = os.getenv("AUTO_SCORE_SINGLE_CALL", "1") == "1"
+AUTO_SCORE_CONCURRENCY = int(os.getenv("AUTO_SCORE_CONCURRENCY", "4"))
+AUTO_SCORE_CACHE_SIZE = int(os.getenv("AUTO_SCORE_CACHE_SIZE", "1024"))
+
+typical_objective_criteria = {
+    "salary", "income", "pay", "money", "earnings", "wage",
+    "schedule", "shift", "hours", "workload", "physical", "prestige",
+    "demand", "job market", "employment", "growth", "stability",
+    "difficulty", "training", "education", "competition"
+}
+
+# (options, criterion) -> (scores, explanations); repeated comparisons skip the LLM
+_score_cache = OrderedDict()
+_score_cache_lock = threading.Lock()
+score_cache_stats = {"hits": 0, "misses": 0}
+
+def _score_cache_key(options, criterion):
+    return tuple(option.strip().lower() for option in options), criterion.strip().lower()
+
+def _cached_scores(options, criterion):
+    key = _score_cache_key(options, criterion)
+    with _score_cache_lock:
+        value = _score_cache.get(key)
+        if value is not None:
+            _score_cache.move_to_end(key)
+            score_cache_stats["hits"] += 1
+        else:
+            score_cache_stats["misses"] += 1
+        return value
+
+def _cache_scores(options, criterion, scores, explanations):
+    with _score_cache_lock:
+        _score_cache[_score_cache_key(options, criterion)] = (scores, explanations)
+        while len(_score_cache) > AUTO_SCORE_CACHE_SIZE:
+            _score_cache.popitem(last=False)
+
+def _valid_scores(options, data):
+    """Returns (scores, explanations) from a parsed LLM answer, or None if it does not fit the options."""
+    if not isinstance(data, dict):
+        return None
+    crit_scores = data.get("scores")
+    crit_expls = data.get("explanations", ["No explanation" for _ in options])
+    if not isinstance(crit_scores, list) or len(crit_scores) != len(options):
+        return None
+    if not isinstance(crit_expls, list) or len(crit_expls) != len(options):
+        crit_expls = ["No explanation" for _ in options]
+    return crit_scores, crit_expls
+
+def _score_criteria_single_call(options, criteria):
+    """Scores all criteria with one structured LLM call. Returns {criterion: (scores, explanations)}."""
+    prompt = (
+        f"Evaluate the options by each of these criteria on a scale from 1 to 5: {json.dumps(criteria)}. "
+        f"Options: {', '.join(options)}. "
+        "Return only JSON: {\"criteria\": {\"<criterion>\": {\"scores\": [score1, score2, ...], "
+        "\"explanations\": [\"explanation1\", ...]}, ...}}"
+    )
+    response = _invoke_llm(prompt)
+    try:
+        data = json.loads(response.content).get("criteria", {})
+    except Exception:
+        return {}
+    results = {}
+    for criterion in criteria:
+        parsed = _valid_scores(options, data.get(criterion) if isinstance(data, dict) else None)
+        if parsed is not None:
+            results[criterion] = parsed
+    return results
+
+def _score_criterion(options, criterion):
+    """Scores one criterion with its own LLM call. Returns (scores, explanations) or None on a bad answer."""
+    prompt = (
+        f"Evaluate the options by the criterion '{criterion}' on a scale from 1 to 5. "
+        f"Options: {', '.join(options)}. "
+        "Return only JSON: {\"scores\": [score1, score2, ...], \"explanations\": [\"explanation1\", ...]}"
+    )
+    response = _invoke_llm(prompt)
+    try:
+        return _valid_scores(options, json.loads(response.content))
+    except Exception:
+        return None
+
+def auto_score(options, criteria, with_explanations=False, single_call=AUTO_SCORE_SINGLE_CALL):
     """
     Use LLM to estimate scores for each option by each criterion (1-5 scale) for objective criteria.
     For subjective criteria, assign all options a score of 1.
+    Cached (options, criterion) pairs skip the LLM; the rest are scored in one structured call
+    (single_call=True) and anything it misses by per-criterion calls run concurrently
+    (at most AUTO_SCORE_CONCURRENCY at a time).
     If with_explanations=True, returns (scores, explanations)
     """
-    typical_objective_criteria = {
-        "salary", "income", "pay", "money", "earnings", "wage",
-        "schedule", "shift", "hours", "workload", "physical", "prestige",
-        "demand", "job market", "employment", "growth", "stability",
-        "difficulty", "training", "education", "competition"
-    }
+    scored = {}
+    pending = []
+    for criterion in criteria:
+        if any(obj in criterion.lower() for obj in typical_objective_criteria):
+            cached = _cached_scores(options, criterion)
+            if cached is not None:
+                scored[criterion] = cached
+            elif criterion not in pending:
+                pending.append(criterion)
+    if pending and single_call and len(pending) > 1:
+        for criterion, result in _score_criteria_single_call(options, pending).items():
+            scored[criterion] = result
+            _cache_scores(options, criterion, *result)
+        pending = [criterion for criterion in pending if criterion not in scored]
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(AUTO_SCORE_CONCURRENCY, len(pending)))) as pool:
+            for criterion, result in zip(pending, pool.map(lambda c: _score_criterion(options, c), pending)):
+                if result is None:
+                    result = ([3 for _ in options], ["No explanation" for _ in options])
+                else:
+                    _cache_scores(options, criterion, *result)
+                scored[criterion] = result
     scores = []
     explanations = []
     for criterion in criteria:
-        if any(obj in criterion.lower() for obj in typical_objective_criteria):
-            prompt = (
-                f"Evaluate the options by the criterion '{criterion}' on a scale from 1 to 5. "
-                f"Options: {', '.join(options)}. "
-                "Return only JSON: {\"scores\": [score1, score2, ...], \"explanations\": [\"explanation1\", ...]}"
-            )
-            response = llm.invoke(prompt)
-            import json
-            try:
-                data = json.loads(response.content)
-                crit_scores = data.get("scores", [3 for _ in options])
-                crit_expls = data.get("explanations", ["No explanation" for _ in options])
-                if not isinstance(crit_scores, list) or len(crit_scores) != len(options):
-                    crit_scores = [3 for _ in options]
-                if not isinstance(crit_expls, list) or len(crit_expls) != len(options):
-                    crit_expls = ["No explanation" for _ in options]
-            except Exception:
-                crit_scores = [3 for _ in options]
-                crit_expls = ["No explanation" for _ in options]
+        if criterion in scored:
+            crit_scores, crit_expls = scored[criterion]
         else:
             crit_scores = [1 for _ in options]
             crit_expls = ["Subjective criterion, all options are equally important" for _ in options]
@@ -192,8 +313,13 @@ def decision_matrix_tool_func(input: DecisionMatrixInput = None, **kwargs) -> st
     except Exception as e:
         return f"Error: {str(e)}"
 
+async def adecision_matrix_tool_func(input: DecisionMatrixInput = None, **kwargs) -> str:
+    # auto_score makes blocking LLM calls, keep them off the event loop
+    return await asyncio.to_thread(decision_matrix_tool_func, input, **kwargs)
+
 decision_matrix_tool = StructuredTool.from_function(
     func=decision_matrix_tool_func,
+    coroutine=adecision_matrix_tool_func,
     name="decision_matrix",
     description=(
         "Use this tool for any decision, choice, or comparison between options, even if the user does not explicitly ask for a matrix. "
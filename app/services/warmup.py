@@ -0,0 +1,44 @@
+import os
+import time
+import logging
+from app.knowledge_base.vector_store import shared_vector_store
+
+# Build the agent, LLM clients and vector store at startup instead of on the first request
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+
+logger = logging.getLogger("warmup")
+
+
+def _warmup_steps():
+    from app.services.llm.agent import get_agent, new_agent_executor
+    from app.services.llm.client import get_chat_model, new_conversation_chain
+    from app.services.tools.llm_tools import get_llm
+    return [
+        ("agent", get_agent),
+        ("agent_executor", new_agent_executor),
+        ("chat_model", get_chat_model),
+        ("conversation_chain", new_conversation_chain),
+        ("auto_score_llm", get_llm),
+        ("query_embeddings", lambda: shared_vector_store.embeddings),
+        ("vector_store", shared_vector_store.get),
+    ]
+
+
+def warm_up() -> dict:
+    """
+    Preloads everything that is otherwise created on first use (heavy imports included).
+    Returns {step: seconds}, or {step: "error: ..."} for a step that failed; failures are
+    logged and skipped, so e.g. a missing index does not keep the worker from starting.
+    """
+    report = {}
+    start = time.perf_counter()
+    for name, step in _warmup_steps():
+        began = time.perf_counter()
+        try:
+            step()
+            report[name] = round(time.perf_counter() - began, 3)
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+            report[name] = f"error: {e}"
+    logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s: {report}")
+    return report
@@ -0,0 +1,53 @@
+"""
+Load test: N concurrent /chat and /memory-chat requests against the local fake OpenAI server.
+With the async path, N chats finish in roughly the latency of the slowest one, not the sum.
+
+    python -m benchmarks.bench_chat_concurrency --concurrency 10 --latency 0.5
+"""
+import os
+import time
+import asyncio
+import argparse
+from benchmarks.fake_openai import FakeOpenAIServer
+
+HEADERS = {"X-API-Key": "supersecretkey"}
+
+
+async def fire(client, path: str, n: int):
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[
+        client.post(path, json={"user_message": f"What are core values? #{i}"}, headers=HEADERS)
+        for i in range(n)
+    ])
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+    return elapsed
+
+
+async def run(n: int, latency: float):
+    import httpx
+    from app.main import app
+    from app.limiter import limiter
+    limiter.enabled = False
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for path in ("/chat", "/memory-chat"):
+            single = await fire(client, path, 1)
+            many = await fire(client, path, n)
+            print(f"{path:<13} 1 request: {single:.2f}s  {n} concurrent: {many:.2f}s  "
+                  f"(sequential would be ~{single * n:.2f}s, upstream latency {latency:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    with FakeOpenAIServer(latency=args.latency) as server:
+        os.environ["OPENAI_API_KEY"] = "test"
+        os.environ["OPENAI_API_BASE"] = server.url
+        asyncio.run(run(args.concurrency, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: context sent to the LLM per retrieval call, plain top-k vs. compacted (overfetch,
+merge overlapping chunks, drop near-duplicates, MMR, token budget).
+
+Pages are long enough to be split into several chunks with the ingest splitter settings
+(CHUNK_SIZE / CHUNK_OVERLAP), so neighbouring chunks share their overlap like in the real index,
+and every page keeps to one topic, so those neighbours tend to be retrieved together.
+"distinct" counts the different sentences in the returned context: the information the LLM
+actually gets, per estimated token.
+
+    python -m benchmarks.bench_context --books 8 --pages 20 --queries 200 --k 4
+"""
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.knowledge_base.ingest_and_index import CHUNK_SIZE, CHUNK_OVERLAP, clean_text
+from app.knowledge_base.lexical_index import LexicalIndex
+from app.knowledge_base.vector_store import SharedVectorStore
+from app.services.core.retrieval import AdvancedRetriever
+from app.services.core.tokens import estimate_tokens
+from benchmarks.fixtures import TOPICS, VERBS, OBJECTS, questions
+from benchmarks.bench_hybrid_retrieval import HashedBagOfWords
+
+
+def page_text(rng: random.Random, sentences: int) -> str:
+    # Like a book page, every page sticks to one topic, so its neighbouring chunks rank together
+    topic = rng.choice(TOPICS)
+    return " ".join(f"{topic.capitalize()} {rng.choice(VERBS)} {rng.choice(OBJECTS)} and {rng.choice(TOPICS)}, "
+                    f"{rng.choice(VERBS)} {rng.choice(OBJECTS)}." for _ in range(sentences))
+
+
+def build_chunks(books: int, pages: int, sentences: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    documents = [Document(page_content=page_text(rng, sentences), metadata={"source": f"book_{b:03d}.pdf", "page": p})
+                 for b in range(books) for p in range(pages)]
+    chunks = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP).split_documents(documents)
+    for chunk in chunks:
+        chunk.page_content = clean_text(chunk.page_content)
+    return chunks
+
+
+def distinct_sentences(texts) -> int:
+    return len({sentence.strip() for text in texts for sentence in text.split(".") if len(sentence.strip()) > 20})
+
+
+def run(retriever, queries, k):
+    tokens, distinct, latencies, merged = [], [], [], 0
+    for query in queries:
+        start = time.perf_counter()
+        result = retriever.retrieve(query, k=k)
+        latencies.append(time.perf_counter() - start)
+        texts = [chunk.text for chunk in result.chunks]
+        tokens.append(sum(estimate_tokens(text) for text in texts))
+        distinct.append(distinct_sentences(texts))
+        merged += bool(result.context and result.context["merged"])
+    return {
+        "tokens": statistics.mean(tokens),
+        "distinct": statistics.mean(distinct),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "merged_calls": merged / len(queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--sentences", type=int, default=40, help="Sentences per page (about 90 chars each)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.books, args.pages, args.sentences)
+    embeddings = HashedBagOfWords()
+    with tempfile.TemporaryDirectory() as index_dir:
+        store = FAISS.from_documents(chunks, embeddings, ids=[f"c{i}" for i in range(len(chunks))])
+        store.save_local(index_dir)
+        LexicalIndex.from_vector_store(store).save(index_dir)
+        shared = SharedVectorStore(index_dir=index_dir, embeddings_factory=lambda: embeddings, check_interval=3600)
+        shared.get()
+        print(f"{len(chunks)} chunks ({CHUNK_SIZE} chars, {CHUNK_OVERLAP} overlap), {args.queries} queries, k={args.k}")
+        print(f"{'mode':8} {'context':9} {'tokens':>7} {'distinct':>9} {'tok/sent':>9} {'p50 ms':>7} {'merged':>7}")
+        query_list = questions(args.queries)
+        for mode in ("vector", "hybrid"):
+            plain = None
+            for name, compress in (("plain", False), ("compact", True)):
+                retriever = AdvancedRetriever(k=args.k, store=shared, mode=mode, compress=compress,
+                                              fast_path_margin=0)
+                r = run(retriever, query_list, args.k)
+                print(f"{mode:8} {name:9} {r['tokens']:7.0f} {r['distinct']:9.1f} {r['tokens'] / max(r['distinct'], 1):9.1f} "
+                      f"{r['p50_ms']:7.2f} {r['merged_calls']:7.0%}")
+                if plain is None:
+                    plain = r
+                else:
+                    print(f"{'':8} {'saved':9} {plain['tokens'] - r['tokens']:7.0f} "
+                          f"({1 - r['tokens'] / plain['tokens']:.0%} of input tokens per call)")
+
+
+if __name__ == "__main__":
+    main()
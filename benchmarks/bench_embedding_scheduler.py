@@ -0,0 +1,35 @@
+"""
+Benchmark: embedding throughput of the ingest EmbeddingScheduler against the local fake server.
+
+    python -m benchmarks.bench_embedding_scheduler --chunks 2000 --latency 0.2
+"""
+import time
+import argparse
+from langchain_openai import OpenAIEmbeddings
+from app.knowledge_base.embedding_scheduler import EmbeddingScheduler
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server latency per request (s).")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    texts = [f"chunk {i} " + "lorem ipsum " * 80 for i in range(args.chunks)]
+    with FakeOpenAIServer(latency=args.latency) as server:
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-small", base_url=server.url, api_key="test",
+                                      check_embedding_ctx_length=False, max_retries=0)
+        print(f"{'in_flight':>9} {'seconds':>8} {'chunks/s':>9} {'requests':>8}")
+        for in_flight in (1, 2, 4, 8):
+            scheduler = EmbeddingScheduler(embeddings, batch_size=args.batch_size, max_in_flight=in_flight,
+                                           tokens_per_minute=0)
+            start = time.perf_counter()
+            scheduler.embed(texts)
+            elapsed = time.perf_counter() - start
+            print(f"{in_flight:>9} {elapsed:>8.2f} {args.chunks / elapsed:>9.0f} {scheduler.requests:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: vector vs. lexical (BM25) vs. hybrid retrieval on a generated coaching corpus.
+
+Every chunk mentions one author and one coaching topic among generic filler; each query asks
+for a specific (author, topic) pair, so recall@k measures whether exact names and terms are found.
+Query embeddings come from a small hashed bag-of-words model with `--embed-latency` seconds
+added per call to stand in for the remote embedding API. "hybrid+fp" is hybrid mode with the
+lexical-only fast path enabled (default margin).
+
+    python -m benchmarks.bench_hybrid_retrieval --chunks 5000 --queries 200 --embed-latency 0.05
+"""
+import time
+import random
+import zlib
+import argparse
+import tempfile
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from app.knowledge_base.lexical_index import LexicalIndex, tokenize
+from app.knowledge_base.vector_store import SharedVectorStore
+from app.services.core.retrieval import AdvancedRetriever, LEXICAL_FAST_PATH_MARGIN
+
+TOPICS = ["vulnerability", "perfectionism", "resilience", "gratitude", "mindfulness", "accountability",
+          "procrastination", "self-compassion", "boundaries", "purpose", "habits", "courage"]
+FILLER = ("coach client session goal progress reflect values growth change plan step practice week "
+          "feedback listen question insight energy focus journey support trust").split()
+
+
+class HashedBagOfWords(Embeddings):
+    """Hashed bag-of-words vectors; a cheap, local stand-in for a semantic embedding model."""
+
+    def __init__(self, dimensions: int = 128, latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokenize(text):
+            h = zlib.crc32(token.encode())
+            vector[h % self.dimensions] += 1.0 if h & 1 << 31 else -1.0
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+def build_corpus(n_chunks, n_authors, rng):
+    authors = [f"author{i} surname{i * 7 % n_authors}" for i in range(n_authors)]
+    chunks = []
+    for i in range(n_chunks):
+        author, topic = rng.choice(authors), rng.choice(TOPICS)
+        filler = " ".join(rng.choice(FILLER) for _ in range(40))
+        chunks.append((f"chunk-{i}", f"{filler} {author} on {topic}. {filler}", author, topic))
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--authors", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    chunks = build_corpus(args.chunks, args.authors, rng)
+    embeddings = HashedBagOfWords(latency=args.embed_latency)
+    with tempfile.TemporaryDirectory() as index_dir:
+        store = FAISS.from_texts([text for _, text, _, _ in chunks], embeddings,
+                                 ids=[chunk_id for chunk_id, _, _, _ in chunks])
+        store.save_local(index_dir)
+        start = time.perf_counter()
+        LexicalIndex.from_vector_store(store).save(index_dir)
+        build_time = time.perf_counter() - start
+        shared = SharedVectorStore(index_dir=index_dir, embeddings_factory=lambda: embeddings, check_interval=3600)
+        shared.get()
+        print(f"corpus: {args.chunks} chunks, lexical index built in {build_time * 1000:.0f} ms, "
+              f"{shared.stats()['lexical']}")
+
+        queries = []
+        for _ in range(args.queries):
+            _, _, author, topic = rng.choice(chunks)
+            relevant = {text for _, text, a, t in chunks if a == author and t == topic}
+            queries.append((f"What does {author} say about {topic}?", relevant))
+
+        print(f"{'mode':10} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'lexical-only':>13}")
+        runs = [("vector", "vector", 0.0), ("lexical", "lexical", 0.0), ("hybrid", "hybrid", 0.0),
+                ("hybrid+fp", "hybrid", LEXICAL_FAST_PATH_MARGIN)]
+        for name, mode, margin in runs:
+            retriever = AdvancedRetriever(k=args.k, store=shared, mode=mode, fast_path_margin=margin)
+            latencies, recalls, lexical_only = [], [], 0
+            for query, relevant in queries:
+                start = time.perf_counter()
+                result = retriever.retrieve(query)
+                latencies.append(time.perf_counter() - start)
+                found = sum(chunk.text in relevant for chunk in result.chunks)
+                recalls.append(found / min(len(relevant), args.k))
+                lexical_only += result.mode == "lexical"
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1000
+            p95 = latencies[int(len(latencies) * 0.95)] * 1000
+            print(f"{name:10} {sum(recalls) / len(recalls):9.3f} {p50:8.2f} {p95:8.2f} "
+                  f"{lexical_only / len(queries):13.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: recall@k, query latency and RAM of the FAISS index types against the exact flat index.
+
+Vectors are a synthetic clustered set (a stand-in for chunk embeddings). Each index is written
+to disk and loaded in a fresh process (memory-mapped where supported) to measure resident memory;
+"anon MB" is the private part, i.e. what every worker process pays on its own.
+
+    python -m benchmarks.bench_index_types --vectors 50000 --dim 256 --queries 200 --k 10
+"""
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import faiss
+from app.knowledge_base.index_factory import build_index, read_index, tune_index
+
+
+def clustered_vectors(n, d, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, d))
+    return (centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, d))).astype(np.float32)
+
+
+def memory_mb() -> tuple:
+    """(resident, private) memory of this process in MB; mapped file pages are resident but not private."""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value
+    return int(fields["VmRSS"].split()[0]) / 1024, int(fields["RssAnon"].split()[0]) / 1024
+
+
+def measure_memory(path, mmap, queries, k, out):
+    """Runs in a fresh process: memory added by loading the index and querying it."""
+    rss, anon = memory_mb()
+    index = tune_index(read_index(path, mmap=mmap))
+    index.search(queries, k)
+    rss_after, anon_after = memory_mb()
+    out.put((rss_after - rss, anon_after - anon))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    vectors = clustered_vectors(args.vectors, args.dim, args.clusters, seed=0)
+    queries = clustered_vectors(args.queries, args.dim, args.clusters, seed=1)
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    runs = [("flat", {}), ("ivf_flat", {"nprobe": 4}), ("ivf_flat", {"nprobe": 16}), ("ivf_flat", {"nprobe": 64}),
+            ("ivf_pq", {"nprobe": 16}), ("ivf_pq", {"nprobe": 64}),
+            ("hnsw", {"ef_search": 16}), ("hnsw", {"ef_search": 64}), ("hnsw", {"ef_search": 256})]
+    built = {}
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.queries} queries, k={args.k}")
+    print(f"{'index':10} {'params':14} {'build s':>8} {'recall':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'file MB':>8} {'RSS MB':>7} {'anon MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for index_type, params in runs:
+            path = os.path.join(tmp, f"{index_type}.faiss")
+            if index_type not in built:
+                start = time.perf_counter()
+                faiss.write_index(build_index(vectors, index_type), path)
+                built[index_type] = time.perf_counter() - start
+            index = tune_index(read_index(path, mmap=True), **params)
+            latencies, found = [], []
+            for query in queries:
+                start = time.perf_counter()
+                _, ids = index.search(query[None, :], args.k)
+                latencies.append(time.perf_counter() - start)
+                found.append(ids[0])
+            recall = np.mean([len(set(t) & set(f)) / args.k for t, f in zip(truth, found)])
+            latencies.sort()
+            out = ctx.Queue()
+            process = ctx.Process(target=measure_memory, args=(path, True, queries, args.k, out))
+            process.start()
+            rss, anon = out.get()
+            process.join()
+            label = ",".join(f"{key}={value}" for key, value in params.items()) or "-"
+            print(f"{index_type:10} {label:14} {built[index_type]:8.2f} {recall:7.3f} "
+                  f"{latencies[len(latencies) // 2] * 1000:7.3f} {latencies[int(len(latencies) * 0.95)] * 1000:7.3f} "
+                  f"{os.path.getsize(path) / 2 ** 20:8.1f} {rss:7.1f} {anon:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
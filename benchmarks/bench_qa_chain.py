@@ -0,0 +1,95 @@
+"""
+Benchmark: answer_query per-call overhead, rebuilding the RetrievalQA pipeline for every question
+(new ChatOpenAI and embeddings clients, FAISS index reloaded from disk, new chain) vs. the cached
+chain on the shared store; then answer_queries vs. a loop of answer_query at a given LLM latency.
+Both OpenAI APIs are served by the local fake server.
+
+    python -m benchmarks.bench_qa_chain --chunks 20000 --queries 50 --latency 0.2 --concurrency 4
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+from benchmarks.fake_openai import FakeOpenAIServer, fake_vector
+
+DIMENSIONS = 256
+
+
+def rebuilt_answer(query: str, index_dir: str, k: int):
+    """answer_query as it was: every call builds the models, reloads the index and builds the chain."""
+    from langchain.chains import RetrievalQA
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+    from langchain_community.vectorstores import FAISS
+    llm = ChatOpenAI(model_name="gpt-4", temperature=0.2)
+    embeddings = OpenAIEmbeddings(model="text-embedding-3-small", check_embedding_ctx_length=False)
+    vector_store = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+    qa_chain = RetrievalQA.from_chain_type(llm=llm, chain_type="stuff", return_source_documents=True,
+                                           retriever=vector_store.as_retriever(search_kwargs={"k": k}))
+    return qa_chain.invoke({"query": query})["result"]
+
+
+def timed(fn, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append(time.perf_counter() - start)
+    return statistics.mean(latencies) * 1000, statistics.median(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server latency per request (s).")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--k", type=int, default=2)
+    args = parser.parse_args()
+    logging.getLogger("context").setLevel(logging.WARNING)
+
+    with FakeOpenAIServer(latency=0.0, dimensions=DIMENSIONS) as server, tempfile.TemporaryDirectory() as index_dir:
+        os.environ["OPENAI_API_KEY"] = "test"
+        os.environ["OPENAI_API_BASE"] = server.url
+        os.environ["OPENAI_BASE_URL"] = server.url
+        from langchain_openai import OpenAIEmbeddings
+        from langchain_community.vectorstores import FAISS
+        from app.knowledge_base import retrieval_qa
+        from app.knowledge_base.vector_store import SharedVectorStore
+
+        texts = [f"chunk {i} about coaching topic {i % 97}, values, goals and habits" for i in range(args.chunks)]
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-small", check_embedding_ctx_length=False)
+        vectors = [fake_vector(text, DIMENSIONS) for text in texts]
+        FAISS.from_embeddings(list(zip(texts, vectors)), embeddings,
+                              metadatas=[{"source": f"book_{i % 20}.pdf"} for i in range(args.chunks)]) \
+            .save_local(index_dir)
+        retrieval_qa.shared_vector_store = SharedVectorStore(index_dir=index_dir, embeddings_factory=lambda: embeddings,
+                                                             check_interval=3600)
+        queries = [f"question {i} about topic {i % 97}" for i in range(args.queries)]
+        retrieval_qa.answer_query(queries[0], k=args.k)
+
+        # Upstream is instant here, so the time is the pipeline's own overhead
+        rebuilt = timed(lambda q: rebuilt_answer(q, index_dir, args.k), queries)
+        cached = timed(lambda q: retrieval_qa.answer_query(q, k=args.k), queries)
+        print(f"{args.chunks} chunks, {args.queries} questions, k={args.k}, upstream latency 0")
+        print(f"{'pipeline':10} {'mean ms':>8} {'p50 ms':>8}")
+        print(f"{'rebuilt':10} {rebuilt[0]:8.1f} {rebuilt[1]:8.1f}")
+        print(f"{'cached':10} {cached[0]:8.1f} {cached[1]:8.1f}")
+        print(f"removed per call: {rebuilt[0] - cached[0]:.1f} ms ({1 - cached[0] / rebuilt[0]:.0%})")
+
+        server.latency = args.latency
+        start = time.perf_counter()
+        for query in queries:
+            retrieval_qa.answer_query(query, k=args.k)
+        sequential = time.perf_counter() - start
+        start = time.perf_counter()
+        retrieval_qa.answer_queries(queries, k=args.k, max_concurrency=args.concurrency)
+        batch = time.perf_counter() - start
+        print(f"upstream latency {args.latency:.2f}s: answer_query loop {sequential:.2f}s, "
+              f"answer_queries (concurrency {args.concurrency}) {batch:.2f}s")
+        print(f"chains built: {retrieval_qa.qa_chain_stats['builds']}, reused: {retrieval_qa.qa_chain_stats['hits']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark: batch retrieval (retrieve_many) vs. a loop of retrieve() calls, with query embeddings
+served by the local fake OpenAI server.
+
+    python -m benchmarks.bench_retrieve_many --queries 1000 --chunks 20000 --latency 0.02
+"""
+import time
+import logging
+import argparse
+import tempfile
+from langchain_openai import OpenAIEmbeddings
+from langchain_community.vectorstores import FAISS
+from app.knowledge_base.vector_store import SharedVectorStore
+from app.services.core.retrieval import AdvancedRetriever
+from benchmarks.fake_openai import FakeOpenAIServer, fake_vector
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake server latency per request (s).")
+    parser.add_argument("--slice", type=int, default=256, help="Queries per retrieve_many call.")
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+    # One log line per query would dominate the loop timing
+    logging.getLogger("retrieval").setLevel(logging.WARNING)
+
+    texts = [f"chunk {i} about coaching topic {i % 97}" for i in range(args.chunks)]
+    queries = [f"question {i} about topic {i % 97}" for i in range(args.queries)]
+    with FakeOpenAIServer(latency=args.latency, dimensions=args.dimensions) as server, \
+            tempfile.TemporaryDirectory() as index_dir:
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-small", base_url=server.url, api_key="test",
+                                      check_embedding_ctx_length=False, max_retries=0)
+        vectors = [fake_vector(text, args.dimensions) for text in texts]
+        FAISS.from_embeddings(list(zip(texts, vectors)), embeddings).save_local(index_dir)
+        store = SharedVectorStore(index_dir=index_dir, embeddings_factory=lambda: embeddings, check_interval=3600)
+        retriever = AdvancedRetriever(k=args.k, store=store, mode="vector")
+        store.get()
+
+        print(f"{args.queries} queries, {args.chunks} chunks x {args.dimensions} dims, "
+              f"{args.latency * 1000:.0f} ms per embedding request")
+        print(f"{'method':14} {'seconds':>8} {'queries/s':>10} {'requests':>9}")
+
+        requests = server.requests
+        start = time.perf_counter()
+        loop = [retriever.retrieve(query) for query in queries]
+        elapsed = time.perf_counter() - start
+        print(f"{'loop':14} {elapsed:8.2f} {args.queries / elapsed:10.0f} {server.requests - requests:9}")
+
+        requests = server.requests
+        start = time.perf_counter()
+        batch = []
+        for offset in range(0, len(queries), args.slice):
+            batch.extend(retriever.retrieve_many(queries[offset:offset + args.slice]))
+        elapsed = time.perf_counter() - start
+        print(f"{'retrieve_many':14} {elapsed:8.2f} {args.queries / elapsed:10.0f} {server.requests - requests:9}")
+
+        same = sum([c.text for c in a.chunks] == [c.text for c in b.chunks] for a, b in zip(loop, batch))
+        print(f"identical results: {same}/{args.queries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: cold import time of app.main (what every worker start and --reload cycle pays) and the
+time of the optional warm-up, each measured in fresh interpreters. Also lists the imports that
+contribute most, from `python -X importtime`.
+
+    python -m benchmarks.bench_startup --runs 5 --top 15
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter() - start
+from app.services.warmup import warm_up
+start = time.perf_counter()
+steps = warm_up()
+print(json.dumps({"import": imported, "warm_up": time.perf_counter() - start, "steps": steps}))
+"""
+
+
+def run_probe(env) -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(env, top: int) -> list:
+    """(cumulative seconds, module) of the slowest imports below app.main."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], env=env,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, cumulative, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        rows.append((int(cumulative) / 1e6, name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    # No network is used: clients are only constructed; a missing index shows up as a failed step
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "test"), "PYTHONPATH": os.getcwd()}
+
+    results = [run_probe(env) for _ in range(args.runs)]
+    imports = [r["import"] for r in results]
+    warmups = [r["warm_up"] for r in results]
+    print(f"{args.runs} fresh interpreters")
+    print(f"import app.main  median {statistics.median(imports):.3f}s  min {min(imports):.3f}s")
+    print(f"warm_up()        median {statistics.median(warmups):.3f}s  min {min(warmups):.3f}s")
+    for step, seconds in results[-1]["steps"].items():
+        print(f"  {step:20} {seconds if isinstance(seconds, str) else f'{seconds:.3f}s'}")
+    print(f"\nslowest imports (cumulative):")
+    for seconds, name in top_imports(env, args.top):
+        print(f"  {seconds:7.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
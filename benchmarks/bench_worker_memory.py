@@ -0,0 +1,114 @@
+"""
+Benchmark: memory per worker process when N workers serve the same index, with the index and
+chunks loaded privately (in-memory docstore, FAISS_MMAP=0 CHUNK_STORE=0) vs. memory-mapped and
+shared (chunk files, FAISS_MMAP=1 CHUNK_STORE=1).
+
+Each worker loads the store the way the app does (SharedVectorStore), runs dense and lexical
+searches and reports its memory while all workers are alive. RSS counts shared pages in every
+process; "private" (RssAnon) is what each worker adds on its own, and PSS splits shared pages
+between the processes that map them, so the PSS total is the real footprint.
+
+    python -m benchmarks.bench_worker_memory --chunks 20000 --dim 768 --workers 4 8
+"""
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+
+
+def memory_mb() -> dict:
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name == "Pss":
+                fields["Pss"] = value
+    return {key: int(fields[name].split()[0]) / 1024
+            for key, name in (("rss", "VmRSS"), ("private", "RssAnon"), ("pss", "Pss"))}
+
+
+def worker(index_dir, dim, queries, barrier, out):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.knowledge_base.vector_store import SharedVectorStore
+    embeddings = DeterministicFakeEmbedding(size=dim)
+    before = memory_mb()
+    store = SharedVectorStore(index_dir=index_dir, embeddings_factory=lambda: embeddings, check_interval=3600)
+    started = time.perf_counter()
+    vector_store = store.get()
+    load_time = time.perf_counter() - started
+    rng = np.random.default_rng(os.getpid())
+    for query in queries:
+        vector_store.similarity_search_with_score_by_vector(rng.normal(size=dim).astype(np.float32).tolist(), k=4)
+        store.lexical().search(query, 4)
+    barrier.wait()
+    after = memory_mb()
+    out.put({"load_time": load_time, **after, "index_private": after["private"] - before["private"]})
+    barrier.wait()
+
+
+def build_index(index_dir, chunks, dim):
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.knowledge_base.ingest_and_index import save_index
+    rng = np.random.default_rng(0)
+    words = np.array("core values growth mindset courage habits goals focus feedback practice".split())
+    texts = [" ".join(rng.choice(words, 140)) for _ in range(chunks)]
+    vectors = rng.normal(size=(chunks, dim)).astype(np.float32)
+    metadatas = [{"source": f"book_{i // 400}.pdf", "page": i % 400} for i in range(chunks)]
+    store = FAISS.from_embeddings(list(zip(texts, vectors.tolist())), DeterministicFakeEmbedding(size=dim),
+                                  metadatas=metadatas)
+    save_index(store, {"files": {}}, index_dir)
+
+
+def run(index_dir, dim, workers, mmap, queries):
+    # Spawned workers read FAISS_MMAP and CHUNK_STORE when they import the app
+    os.environ["FAISS_MMAP"] = "1" if mmap else "0"
+    os.environ["CHUNK_STORE"] = "1" if mmap else "0"
+    ctx = multiprocessing.get_context("spawn")
+    barrier, out = ctx.Barrier(workers), ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(index_dir, dim, queries, barrier, out)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [out.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return reports
+
+
+def main():
+    from app.knowledge_base.generations import current_dir
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+    queries = [f"courage habits {i}" for i in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        build_index(index_dir, args.chunks, args.dim)
+        generation = current_dir(index_dir)
+        sizes = {name: os.path.getsize(os.path.join(generation, name)) / 2 ** 20 for name in os.listdir(generation)}
+        print(f"{args.chunks} chunks x {args.dim} dims; index.faiss {sizes['index.faiss']:.0f} MB, "
+              f"chunks.bin {sizes['chunks.bin']:.0f} MB")
+        print(f"{'mode':8} {'workers':>7} {'load s':>7} {'RSS MB':>8} {'private MB':>11} "
+              f"{'index private':>14} {'PSS MB':>8} {'PSS total':>10}")
+        for workers in args.workers:
+            for mode, mmap in (("private", False), ("shared", True)):
+                reports = run(index_dir, args.dim, workers, mmap, queries)
+
+                def mean(key):
+                    return sum(r[key] for r in reports) / len(reports)
+
+                print(f"{mode:8} {workers:7} {mean('load_time'):7.2f} {mean('rss'):8.0f} {mean('private'):11.0f} "
+                      f"{mean('index_private'):14.0f} {mean('pss'):8.0f} {sum(r['pss'] for r in reports):10.0f}")
+
+
+if __name__ == "__main__":
+    main()
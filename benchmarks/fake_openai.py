@@ -0,0 +1,163 @@
+"""
+Local stand-in for the OpenAI API, used by tests and benchmarks to run offline.
+
+    with FakeOpenAIServer(latency=0.05) as server:
+        embeddings = OpenAIEmbeddings(base_url=server.url, api_key="test", check_embedding_ctx_length=False)
+        chat = ChatOpenAI(base_url=server.url, api_key="test")
+"""
+import json
+import time
+import base64
+import hashlib
+import threading
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_vector(text: str, dimensions: int) -> list:
+    """Deterministic unit-length vector for a text."""
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    raw = [(seed[i % len(seed)] ^ (i * 31 % 256)) / 255.0 - 0.5 for i in range(dimensions)]
+    norm = sum(x * x for x in raw) ** 0.5 or 1.0
+    return [x / norm for x in raw]
+
+
+class FakeOpenAIServer:
+    """
+    Serves /v1/embeddings (deterministic vectors) and /v1/chat/completions (fixed reply) on localhost.
+    latency: seconds added to every request.
+    reply: assistant message returned by every chat completion (streamed word by word when stream=true).
+    token_delay: seconds between streamed chunks.
+    fail_first: number of initial requests answered with `fail_status` (e.g. 429) to exercise retries.
+    """
+
+    def __init__(self, latency: float = 0.0, dimensions: int = 64, fail_first: int = 0, fail_status: int = 429,
+                 reply: str = "This is a fake answer about core values.", token_delay: float = 0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply = reply
+        self.dimensions = dimensions
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def embeddings(self, body: dict) -> dict:
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_vector(str(text), self.dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(len(str(text)) // 4 + 1 for text in inputs)
+        return {"object": "list", "data": data, "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def chat_completion(self, body: dict) -> dict:
+        prompt_tokens = sum(len(str(m.get("content") or "")) // 4 + 1 for m in body.get("messages", []))
+        completion_tokens = len(self.reply) // 4 + 1
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def chat_completion_chunks(self, body: dict):
+        """Yields chat.completion.chunk payloads for a streamed completion."""
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "fake")}
+        yield {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            yield {**base, "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]}
+        yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = self.chat_completion(body)["usage"]
+            yield {**base, "choices": [], "usage": usage}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: dict, headers: dict = None):
+                raw = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _stream(self, chunks):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for i, chunk in enumerate(chunks):
+                    if i and server.token_delay:
+                        time.sleep(server.token_delay)
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    failing = server.requests <= server.fail_first
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    if failing:
+                        self._send(server.fail_status, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                   {"Retry-After": "0"})
+                    elif self.path.endswith("/embeddings"):
+                        self._send(200, server.embeddings(body))
+                    elif self.path.endswith("/chat/completions") and body.get("stream"):
+                        self._stream(server.chat_completion_chunks(body))
+                    elif self.path.endswith("/chat/completions"):
+                        self._send(200, server.chat_completion(body))
+                    else:
+                        self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+        return Handler
@@ -0,0 +1,69 @@
+"""
+Generated fixture corpus for benchmarks and tests: small text PDFs about coaching topics,
+deterministic for a given seed, so runs on different machines index the same chunks.
+"""
+import os
+import random
+
+TOPICS = ["core values", "growth mindset", "courage", "habits", "resilience", "goal setting",
+          "self awareness", "accountability", "feedback", "motivation", "focus", "confidence"]
+VERBS = ["builds", "strengthens", "depends on", "starts with", "grows through", "is tested by"]
+OBJECTS = ["daily practice", "honest reflection", "small experiments", "clear priorities",
+           "deliberate rest", "supportive relationships", "written commitments", "weekly reviews"]
+
+
+def write_pdf(path, pages):
+    """Writes a minimal PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 10 Tf 20 800 Td ({escaped}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def page_text(rng: random.Random, sentences: int = 8) -> str:
+    parts = []
+    for _ in range(sentences):
+        parts.append(f"{rng.choice(TOPICS).capitalize()} {rng.choice(VERBS)} {rng.choice(OBJECTS)} "
+                     f"and {rng.choice(TOPICS)}.")
+    return " ".join(parts)
+
+
+def write_corpus(directory: str, books: int = 8, pages: int = 20, seed: int = 0) -> list:
+    """Writes `books` PDFs of `pages` pages each into directory; returns their paths."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for book in range(books):
+        path = os.path.join(directory, f"book_{book:03d}.pdf")
+        write_pdf(path, [page_text(rng) for _ in range(pages)])
+        paths.append(path)
+    return paths
+
+
+def questions(n: int, seed: int = 1) -> list:
+    """
+    n questions about the corpus topics, distinct as long as n fits the topic combinations.
+    They contain no digits, which would make the answer cache bypass them.
+    """
+    combos = [(a, o, b) for a in TOPICS for o in OBJECTS for b in TOPICS if a != b]
+    random.Random(seed).shuffle(combos)
+    return [f"How does {a} relate to {o} and {b}?" for a, o, b in (combos * (n // len(combos) + 1))[:n]]
@@ -0,0 +1,219 @@
+"""
+Offline benchmark suite: latency percentiles and throughput of the main code paths, with the
+OpenAI chat-completions and embeddings APIs served by the local fake server (fixed reply,
+configurable latency) and a generated fixture corpus. No network access or API key is needed.
+
+Measured: ingest_all_pdfs_to_faiss (full rebuilds of the corpus), AdvancedRetriever.retrieve,
+and the /chat, /memory-chat and /decision-matrix endpoints (in-process, at a given concurrency).
+Results are written as JSON; pass an earlier results file to --compare to see the change.
+
+    python -m benchmarks.suite --latency 0.05 --requests 100 --concurrency 10
+    python -m benchmarks.suite --compare bench_results/suite-20260101-120000.json
+"""
+import os
+import sys
+import io
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fixtures import write_corpus, questions
+
+HEADERS = {"X-API-Key": "supersecretkey"}
+RESULTS_DIR = "bench_results"
+REPLY = "Core values are the principles you choose to live by."
+DECISION_MATRIX = {
+    "options": ["Job A", "Job B", "Job C"],
+    "criteria": ["Salary", "Growth", "Balance", "Commute"],
+    "weights": [0.4, 0.3, 0.2, 0.1],
+    "scores": [[7, 8, 6, 5], [9, 6, 5, 7], [6, 9, 8, 8]],
+}
+
+
+def summarize(latencies: list, elapsed: float, units: int = None, errors: int = 0) -> dict:
+    """
+    Latency percentiles (ms) of the individual operations and throughput over the wall-clock
+    time; units is the amount of work done (operations by default, e.g. chunks for ingest).
+    """
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round((len(ordered) if units is None else units) / elapsed, 2),
+    }
+
+
+def bench_ingest(pdfs_dir: str, index_dir: str, embeddings, runs: int) -> dict:
+    from app.knowledge_base.ingest_and_index import ingest_all_pdfs_to_faiss
+    latencies, chunks = [], 0
+    start = time.perf_counter()
+    for _ in range(runs):
+        began = time.perf_counter()
+        report = ingest_all_pdfs_to_faiss(pdfs_dir=pdfs_dir, index_dir=index_dir, embeddings=embeddings,
+                                          full_rebuild=True)
+        latencies.append(time.perf_counter() - began)
+        chunks += report["added"]
+    result = summarize(latencies, time.perf_counter() - start, units=chunks)
+    result["unit"] = "chunks"
+    result["chunks_per_run"] = chunks // runs
+    return result
+
+
+def bench_retrieve(retriever, queries: list) -> dict:
+    latencies, not_found = [], 0
+    start = time.perf_counter()
+    for query in queries:
+        began = time.perf_counter()
+        result = retriever.retrieve(query)
+        latencies.append(time.perf_counter() - began)
+        not_found += result.not_found
+    result = summarize(latencies, time.perf_counter() - start)
+    result["not_found"] = not_found
+    return result
+
+
+async def bench_endpoint(client, path: str, payloads: list, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def call(payload):
+        nonlocal errors
+        async with semaphore:
+            began = time.perf_counter()
+            response = await client.post(path, json=payload, headers=HEADERS)
+            latencies.append(time.perf_counter() - began)
+            errors += response.status_code != 200
+
+    # One untimed call so first-use setup (agent construction, imports) is not measured
+    await client.post(path, json=payloads[0], headers=HEADERS)
+    start = time.perf_counter()
+    await asyncio.gather(*[call(payload) for payload in payloads])
+    return summarize(latencies, time.perf_counter() - start, errors=errors)
+
+
+async def bench_endpoints(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.limiter import limiter
+    from app.services.llm.answer_cache import answer_cache
+    limiter.enabled = False
+    # Distinct questions never hit the answer cache; turning it off also skips its embedding call
+    answer_cache.enabled = args.answer_cache
+    chats = [{"user_message": q, "session_id": f"bench-{i}"} for i, q in enumerate(questions(args.requests))]
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for name, path, payloads in (("chat", "/chat", chats), ("memory_chat", "/memory-chat", chats),
+                                     ("decision_matrix", "/decision-matrix", [DECISION_MATRIX] * args.requests)):
+            results[name] = await bench_endpoint(client, path, payloads, args.concurrency)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict = None):
+    header = f"{'benchmark':16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>9} {'errors':>6}"
+    print(header + ("   vs baseline (p50 / p95 / per s)" if baseline else ""))
+    for name, r in results.items():
+        line = (f"{name:16} {r['count']:6} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} "
+                f"{r['throughput_per_s']:9.1f} {r['errors']:6}")
+        old = (baseline or {}).get(name)
+        if old:
+            line += "   " + " / ".join(
+                f"{(r[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+                for key in ("p50_ms", "p95_ms", "throughput_per_s"))
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake server latency per request (s).")
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--reply", default=REPLY, help="Fixed chat completion returned by the fake server.")
+    parser.add_argument("--books", type=int, default=8, help="PDFs in the fixture corpus.")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per PDF.")
+    parser.add_argument("--ingest-runs", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200, help="AdvancedRetriever.retrieve calls.")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint.")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on.")
+    parser.add_argument("--output", help=f"Results file (default {RESULTS_DIR}/suite-<timestamp>.json).")
+    parser.add_argument("--compare", help="Earlier results file to compare against.")
+    args = parser.parse_args()
+    # One log line per query/request would dominate the timings
+    logging.disable(logging.INFO)
+
+    started = datetime.now(timezone.utc)
+    with FakeOpenAIServer(latency=args.latency, dimensions=args.dimensions, reply=args.reply) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        # Must be set before the app modules create their OpenAI clients
+        os.environ["OPENAI_API_KEY"] = "test"
+        os.environ["OPENAI_API_BASE"] = server.url
+        from langchain_openai import OpenAIEmbeddings
+        from app.knowledge_base.vector_store import SharedVectorStore
+        from app.services.core.retrieval import AdvancedRetriever
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-small", base_url=server.url, api_key="test",
+                                      check_embedding_ctx_length=False, max_retries=0)
+        pdfs_dir, index_dir = os.path.join(tmp, "pdfs"), os.path.join(tmp, "faiss_index")
+        write_corpus(pdfs_dir, books=args.books, pages=args.pages)
+
+        results = {"ingest": bench_ingest(pdfs_dir, index_dir, embeddings, args.ingest_runs)}
+        store = SharedVectorStore(index_dir=index_dir, embeddings_factory=lambda: embeddings, check_interval=3600)
+        store.get()
+        results["retrieve"] = bench_retrieve(AdvancedRetriever(store=store), questions(args.queries, seed=2))
+        # The agent executor prints every chain step
+        with redirect_stdout(io.StringIO()):
+            results.update(asyncio.run(bench_endpoints(args)))
+        upstream_requests = server.requests
+
+    report = {
+        "meta": {
+            "timestamp": started.isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "upstream_requests": upstream_requests,
+            "params": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"suite-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"baseline: {args.compare} (commit {baseline['meta'].get('commit')})")
+    print(f"upstream latency {args.latency * 1000:.0f} ms, concurrency {args.concurrency}, "
+          f"corpus {args.books} x {args.pages} pages")
+    print_results(results, baseline and baseline["results"])
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import time
+from fastapi.testclient import TestClient
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.main import app
+from app.limiter import limiter
+from app.routers import admin
+from app.knowledge_base.index_admin import IndexWriter
+from app.knowledge_base.index_factory import index_type_of
+from app.knowledge_base.ingest_and_index import ingest_all_pdfs_to_faiss, load_manifest
+from app.knowledge_base.vector_store import SharedVectorStore
+from benchmarks.fixtures import write_pdf
+
+HEADERS = {"X-API-Key": "admin-test-key"}
+
+
+def wait_for(client, job):
+    for _ in range(200):
+        job = client.get(f"/admin/jobs/{job['id']}", headers=HEADERS).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job did not finish: {job}")
+
+
+def pdf_bytes(tmp_path, name, pages):
+    path = tmp_path / name
+    write_pdf(path, pages)
+    return path.read_bytes()
+
+
+def make_client(monkeypatch, tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    store = SharedVectorStore(index_dir=str(tmp_path / "faiss_index"), embeddings_factory=lambda: embeddings,
+                              check_interval=3600)
+    writer = IndexWriter(pdfs_dir=str(tmp_path / "pdfs"), index_dir=str(tmp_path / "faiss_index"), store=store)
+    monkeypatch.setattr(admin, "index_writer", writer)
+    monkeypatch.setattr(admin, "ADMIN_API_KEY", HEADERS["X-API-Key"])
+    monkeypatch.setattr(limiter, "enabled", False)
+    return TestClient(app), store
+
+
+def test_upload_list_and_delete_documents(monkeypatch, tmp_path):
+    client, store = make_client(monkeypatch, tmp_path)
+    assert client.get("/admin/documents", headers=HEADERS).json() == {"sources": [], "chunks": 0}
+
+    response = client.put("/admin/documents/values.pdf", headers=HEADERS,
+                          content=pdf_bytes(tmp_path, "a.pdf", ["Core values guide choices.", "Name them."]))
+    assert response.status_code == 202 and response.headers["location"] == f"/admin/jobs/{response.json()['id']}"
+    job = wait_for(client, response.json())
+    assert job["status"] == "done" and job["report"]["added"] == 2
+    first = store.get()
+
+    job = wait_for(client, client.put("/admin/documents/habits.pdf", headers=HEADERS,
+                                      content=pdf_bytes(tmp_path, "b.pdf", ["Habits compound."])).json())
+    assert job["report"] == {"reused": 2, "added": 1, "removed": 0, "files": 2}
+    assert client.get("/admin/documents", headers=HEADERS).json() == {
+        "sources": [{"source": "habits.pdf", "chunks": 1}, {"source": "values.pdf", "chunks": 2}], "chunks": 3}
+    # The new generation is served right away, readers holding the old one can keep using it
+    assert store.get() is not first and first.index.ntotal == 2
+    assert {doc.metadata["source"] for doc in first.similarity_search("habits", k=2)} == {"values.pdf"}
+
+    job = wait_for(client, client.delete("/admin/documents/values.pdf", headers=HEADERS).json())
+    assert job["status"] == "done" and job["report"]["removed"] == 2
+    assert client.get("/admin/documents", headers=HEADERS).json() == {
+        "sources": [{"source": "habits.pdf", "chunks": 1}], "chunks": 1}
+    assert not (tmp_path / "pdfs" / "values.pdf").exists()
+
+
+def test_invalid_requests_and_failed_jobs(monkeypatch, tmp_path):
+    client, store = make_client(monkeypatch, tmp_path)
+    assert client.put("/admin/documents/notes.txt", headers=HEADERS, content=b"%PDF-1.4").status_code == 400
+    assert client.put("/admin/documents/notes.pdf", headers=HEADERS, content=b"plain text").status_code == 400
+    assert client.delete("/admin/documents/missing.pdf", headers=HEADERS).status_code == 404
+    assert client.get("/admin/documents", headers={"X-API-Key": "wrong"}).status_code == 401
+
+    # A PDF that cannot be parsed fails its job and is not left behind in the pdfs directory
+    job = wait_for(client, client.put("/admin/documents/broken.pdf", headers=HEADERS,
+                                      content=b"%PDF-1.4 not really a pdf").json())
+    assert job["status"] == "failed" and job["error"]
+    assert not (tmp_path / "pdfs" / "broken.pdf").exists()
+    assert admin.index_writer.stats() == {"pending": 0, "completed": 0, "failed": 1}
+
+
+def test_admin_endpoints_are_disabled_without_a_key(monkeypatch, tmp_path):
+    client, store = make_client(monkeypatch, tmp_path)
+    monkeypatch.setattr(admin, "ADMIN_API_KEY", None)
+    assert client.get("/admin/documents", headers=HEADERS).status_code == 503
+    assert client.get("/admin/documents", headers={"X-API-Key": "supersecretkey"}).status_code == 503
+    assert client.put("/admin/documents/values.pdf", headers=HEADERS, content=b"%PDF-1.4").status_code == 503
+    assert admin.index_writer.stats() == {"pending": 0, "completed": 0, "failed": 0}
+
+
+def test_changes_keep_the_index_type(monkeypatch, tmp_path):
+    client, store = make_client(monkeypatch, tmp_path)
+    (tmp_path / "pdfs").mkdir()
+    write_pdf(tmp_path / "pdfs" / "values.pdf", ["Core values guide choices.", "Name them."])
+    ingest_all_pdfs_to_faiss(pdfs_dir=str(tmp_path / "pdfs"), index_dir=str(tmp_path / "faiss_index"),
+                             embeddings=store.embeddings, index_type="hnsw")
+
+    job = wait_for(client, client.put("/admin/documents/habits.pdf", headers=HEADERS,
+                                      content=pdf_bytes(tmp_path, "b.pdf", ["Habits compound."])).json())
+    assert job["status"] == "done" and job["report"]["added"] == 1
+    assert index_type_of(store.get().index) == "hnsw"
+    assert load_manifest(str(tmp_path / "faiss_index"))["index"]["type"] == "hnsw"
+
+
+def test_uploads_without_content_length_are_size_limited(monkeypatch, tmp_path):
+    client, store = make_client(monkeypatch, tmp_path)
+    monkeypatch.setattr(admin, "ADMIN_MAX_UPLOAD_BYTES", 1000)
+
+    def chunks():
+        yield b"%PDF-1.4 "
+        for _ in range(10):
+            yield b"x" * 200
+
+    response = client.put("/admin/documents/big.pdf", headers=HEADERS, content=chunks())
+    assert response.status_code == 413
+    assert "content-length" not in response.request.headers
+    assert admin.index_writer.stats() == {"pending": 0, "completed": 0, "failed": 0}
@@ -0,0 +1,42 @@
+import time
+import asyncio
+import httpx
+from app.main import app
+from app.limiter import limiter
+from app.routers import chat
+
+HEADERS = {"X-API-Key": "supersecretkey"}
+
+
+async def slow_agent(user_message: str, session_id: str = None) -> str:
+    await asyncio.sleep(0.3)
+    return f"answer to {user_message}"
+
+
+async def post_concurrently(n: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        chats = [client.post("/chat", json={"user_message": f"q{i}"}, headers=HEADERS) for i in range(n)]
+        health = client.get("/health")
+        responses = await asyncio.gather(health, *chats)
+        return time.perf_counter() - start, responses
+
+
+def test_concurrent_chats_do_not_serialize(monkeypatch):
+    monkeypatch.setattr(chat, "achat_with_agent", slow_agent)
+    monkeypatch.setattr(limiter, "enabled", False)
+    elapsed, responses = asyncio.run(post_concurrently(5))
+    assert all(r.status_code == 200 for r in responses)
+    assert responses[1].json()["response"] == "answer to q0"
+    # Five 0.3s chats overlap instead of taking 1.5s back to back
+    assert elapsed < 1.0
+
+
+def test_concurrency_cap(monkeypatch):
+    monkeypatch.setattr(chat, "achat_with_agent", slow_agent)
+    monkeypatch.setattr(limiter, "enabled", False)
+    monkeypatch.setattr(chat, "chat_semaphore", asyncio.Semaphore(1))
+    elapsed, responses = asyncio.run(post_concurrently(3))
+    assert all(r.status_code == 200 for r in responses)
+    assert elapsed >= 0.9
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.limiter import limiter
+from app.routers import chat
+from app.services.llm.streaming import ttft_stats
+
+client = TestClient(app)
+HEADERS = {"X-API-Key": "supersecretkey"}
+
+
+async def fake_stream(user_message: str, session_id: str = None):
+    yield "tool_start", {"tool": "knowledge_base_search", "input": {"query": user_message}}
+    yield "tool_end", {"tool": "knowledge_base_search"}
+    for token in ["Core ", "values."]:
+        yield "token", token
+    yield "done", {"response": "Core values."}
+
+
+def test_chat_stream_sends_sse_events(monkeypatch):
+    monkeypatch.setattr(chat, "astream_chat_with_agent", fake_stream)
+    monkeypatch.setattr(limiter, "enabled", False)
+    before = ttft_stats["chat"].count
+    response = client.post("/chat/stream", json={"user_message": "core values"}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line.split(": ", 1)[1] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events == ["tool_start", "tool_end", "token", "token", "done"]
+    assert 'data: "Core "' in response.text
+    assert ttft_stats["chat"].count == before + 1
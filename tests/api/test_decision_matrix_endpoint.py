@@ -0,0 +1,50 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.limiter import limiter
+from app.routers.decision_matrix import MAX_OPTIONS, MAX_BATCH_TOTALS, MAX_SENSITIVITY_PRODUCTS
+
+HEADERS = {"X-API-Key": "supersecretkey"}
+
+
+def batch(options=2, weight_sets=1, score_sets=1):
+    return {
+        "options": [f"option {i}" for i in range(options)],
+        "criteria": ["cost", "fun"],
+        "weight_sets": [[0.5, 0.5]] * weight_sets,
+        "score_sets": [[[1.0, 2.0]] * options] * score_sets,
+    }
+
+
+def test_batch_size_is_capped(monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", False)
+    client = TestClient(app)
+    response = client.post("/decision-matrix/batch", json=batch(weight_sets=2, score_sets=3), headers=HEADERS)
+    assert response.status_code == 200 and len(response.json()["best"]) == 3
+
+    too_many_totals = batch(weight_sets=MAX_BATCH_TOTALS // 2 + 1)
+    assert client.post("/decision-matrix/batch", json=too_many_totals, headers=HEADERS).status_code == 422
+    too_many_options = batch(options=MAX_OPTIONS + 1)
+    assert client.post("/decision-matrix/batch", json=too_many_options, headers=HEADERS).status_code == 422
+
+
+def sensitivity(options=2, criteria=2, samples=100):
+    return {
+        "options": [f"option {i}" for i in range(options)],
+        "criteria": [f"criterion {i}" for i in range(criteria)],
+        "weights": [1.0] * criteria,
+        "scores": [[float(i)] * criteria for i in range(options)],
+        "samples": samples,
+        "seed": 1,
+    }
+
+
+def test_sensitivity_size_is_capped(monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", False)
+    client = TestClient(app)
+    response = client.post("/decision-matrix/sensitivity", json=sensitivity(), headers=HEADERS)
+    assert response.status_code == 200 and response.json()["result"]["best_option"] == "option 1"
+
+    too_much_work = sensitivity(options=MAX_OPTIONS, criteria=50, samples=MAX_SENSITIVITY_PRODUCTS // 5000 + 1)
+    assert client.post("/decision-matrix/sensitivity", json=too_much_work, headers=HEADERS).status_code == 422
+    too_many_options = sensitivity(options=MAX_OPTIONS + 1, samples=1)
+    assert client.post("/decision-matrix/sensitivity", json=too_many_options, headers=HEADERS).status_code == 422
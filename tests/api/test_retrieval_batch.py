@@ -0,0 +1,35 @@
+import orjson
+from fastapi.testclient import TestClient
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.main import app
+from app.limiter import limiter
+from app.knowledge_base.vector_store import SharedVectorStore
+from app.routers import retrieval
+from app.services.core.retrieval import AdvancedRetriever
+
+HEADERS = {"X-API-Key": "supersecretkey"}
+
+
+def test_batch_endpoint_streams_ndjson_in_order(tmp_path, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    FAISS.from_texts(["core values", "growth mindset", "courage"], embeddings).save_local(str(tmp_path))
+    store = SharedVectorStore(index_dir=str(tmp_path), embeddings_factory=lambda: embeddings, check_interval=60)
+    monkeypatch.setattr(retrieval, "retriever", AdvancedRetriever(store=store, mode="vector"))
+    monkeypatch.setattr(retrieval, "RETRIEVAL_BATCH_SLICE", 2)
+    monkeypatch.setattr(limiter, "enabled", False)
+    client = TestClient(app)
+
+    queries = ["values", "mindset", "courage", ""]
+    response = client.post("/retrieval/batch", json={"queries": queries, "k": 1}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [line["original_query"] for line in lines] == queries
+    assert [len(line["chunks"]) for line in lines] == [1, 1, 1, 0]
+
+    assert client.post("/retrieval/batch", json={"queries": []}, headers=HEADERS).status_code == 422
+    assert client.post("/retrieval/batch", json={"queries": ["values"], "k": retrieval.RETRIEVAL_MAX_K + 1},
+                       headers=HEADERS).status_code == 422
+    assert client.post("/retrieval/batch", json={"queries": ["values"], "k": 0}, headers=HEADERS).status_code == 422
+    assert client.post("/retrieval/batch", json={"queries": ["values"]}).status_code == 403
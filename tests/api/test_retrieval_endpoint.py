@@ -2,9 +2,10 @@ from fastapi.testclient import TestClient
 from app.main import app
 
 client = TestClient(app)
+HEADERS = {"X-API-Key": "supersecretkey"}
 
 def test_retrieval_endpoint():
-    response = client.post("/retrieval", json={"query": "What are core values?", "k": 1})
+    response = client.post("/retrieval", json={"query": "What are core values?", "k": 1}, headers=HEADERS)
     assert response.status_code == 200
     data = response.json()
     assert "chunks" in data
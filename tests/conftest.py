@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture
+def openai_api_key(monkeypatch):
+    """A dummy key for tests that build OpenAI clients but never reach the API (mocked transports)."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
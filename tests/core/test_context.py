@@ -0,0 +1,97 @@
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.lexical_index import LexicalIndex
+from app.knowledge_base.vector_store import SharedVectorStore
+from app.services.core.context import compact_context, overlap_merge, stored_vectors
+from app.services.core.retrieval import AdvancedRetriever
+
+# No repeated passages, so the only overlaps are the ones the splitter makes
+PAGE = " ".join(f"Session {i}: the coach asks client {i * 7} which values drive choice {i * 3}." for i in range(12))
+
+
+def overlapping_chunks(text, size=200, overlap=60):
+    return [text[start:start + size] for start in range(0, len(text) - overlap, size - overlap)]
+
+
+def test_overlap_merge_joins_splitter_neighbours():
+    first, second = PAGE[:200], PAGE[140:340]
+    assert overlap_merge(first, second) == PAGE[:340]
+    assert overlap_merge(second, first) is None
+    assert overlap_merge(PAGE[:300], PAGE[50:120]) == PAGE[:300]
+    assert overlap_merge("completely different text " * 3, second) is None
+
+
+def make_store(texts, metadatas, vectors=None):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    vectors = vectors if vectors is not None else embeddings.embed_documents(texts)
+    return FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas,
+                                 ids=[f"c{i}" for i in range(len(texts))])
+
+
+def test_overlapping_chunks_of_a_page_are_merged():
+    chunks = overlapping_chunks(PAGE)
+    store = make_store(chunks, [{"source": "values.pdf", "page": 3}] * len(chunks))
+    candidates = [(store.docstore.search(f"c{i}"), float(i)) for i in range(3)]
+    results, report = compact_context(store, candidates, k=3, token_budget=0)
+    # Three overlapping chunks become one passage, without the repeated overlap
+    assert len(results) == 1 and report["merged"] == 2
+    assert results[0][0].page_content == PAGE[:200 + 2 * 140]
+    assert results[0][1] == 0.0
+    assert report["tokens_saved"] > 0
+
+
+def test_merge_wider_than_k_is_kept_within_the_budget():
+    chunks = overlapping_chunks(PAGE)[:3]
+    texts = chunks + ["an unrelated note about sleep and recovery " * 3]
+    store = make_store(texts, [{"source": "values.pdf", "page": 3}] * 3 + [{"source": "sleep.pdf"}])
+    candidates = [(store.docstore.search(f"c{i}"), float(i)) for i in range(4)]
+    results, report = compact_context(store, candidates, k=2, mmr_lambda=1.0)
+    # The best ranked passage spans three chunks: it takes both slots and is trimmed to the top-2 tokens
+    assert len(results) == 1 and results[0][0].page_content.startswith(PAGE[:100])
+    assert 0 < report["tokens_after"] <= report["tokens_before"]
+
+    alone, _ = compact_context(store, candidates[:3], k=2)
+    assert len(alone) == 1 and alone[0][0].page_content.startswith(PAGE[:100])
+
+
+def test_near_duplicates_dropped_and_mmr_prefers_novel_chunks():
+    rng = np.random.default_rng(0)
+    base, other = rng.normal(size=16), rng.normal(size=16)
+    texts = ["coaching values one", "coaching values one, reworded", "habits and goals", "values again"]
+    vectors = [base, base + 0.01, other, base + 0.5 * rng.normal(size=16)]
+    store = make_store(texts, [{"source": f"b{i}.pdf"} for i in range(4)], [v.tolist() for v in vectors])
+    candidates = [(store.docstore.search(f"c{i}"), 1.0 - i / 10) for i in range(4)]
+    assert stored_vectors(store, [doc for doc, _ in candidates]).shape == (4, 16)
+    results, report = compact_context(store, candidates, k=2, query_vector=base.tolist(), mmr_lambda=0.5)
+    assert report["near_duplicates"] == 1
+    # The unrelated chunk beats the close paraphrase of the best one, picks keep rank order
+    assert [doc.page_content for doc, _ in results] == ["coaching values one", "habits and goals"]
+
+
+def test_token_budget_trims_the_last_chunk():
+    texts = ["alpha " * 100, "beta " * 100, "gamma " * 100]
+    store = make_store(texts, [{"source": f"b{i}.pdf"} for i in range(3)])
+    candidates = [(store.docstore.search(f"c{i}"), float(i)) for i in range(3)]
+    results, report = compact_context(store, candidates, k=3, token_budget=250, near_duplicate=1.0,
+                                      mmr_lambda=1.0)
+    assert [doc.page_content.split()[0] for doc, _ in results] == ["alpha", "beta"]
+    assert report["tokens_after"] <= 250 < report["tokens_before"]
+    assert len(results[1][0].page_content) < len(texts[1])
+
+
+def test_retriever_reports_tokens_saved(tmp_path):
+    chunks = overlapping_chunks(PAGE)
+    store = make_store(chunks, [{"source": "values.pdf", "page": 3}] * len(chunks))
+    store.save_local(str(tmp_path))
+    LexicalIndex.from_vector_store(store).save(str(tmp_path))
+    shared = SharedVectorStore(index_dir=str(tmp_path), embeddings_factory=lambda: store.embeddings,
+                               check_interval=60)
+    plain = AdvancedRetriever(k=3, store=shared, mode="lexical", compress=False).retrieve("coach values habits")
+    compact = AdvancedRetriever(k=3, store=shared, mode="lexical").retrieve("coach values habits")
+    assert plain.context is None and len(plain.chunks) == 3
+    assert compact.context["merged"] > 0
+    assert 0 <= compact.context["tokens_saved"] == compact.context["tokens_before"] - compact.context["tokens_after"]
+    # The overlap the splitter repeats between neighbouring chunks is sent once
+    texts = [c.text for c in compact.chunks]
+    assert all(a[-40:] not in b for a in texts for b in texts if a is not b)
@@ -0,0 +1,49 @@
+import pytest
+from app.services.core.decision_matrix import (
+    calculate_decision_matrix, batch_decision_matrix, sensitivity_analysis,
+)
+
+OPTIONS = ["Nurse", "Teacher", "Engineer"]
+CRITERIA = ["salary", "hours", "passion"]
+SCORES = [[3, 2, 5], [2, 4, 4], [5, 3, 2]]
+
+
+def test_calculate_decision_matrix():
+    result = calculate_decision_matrix(OPTIONS, CRITERIA, [10, 5, 1], SCORES)
+    assert result == {"Nurse": 45.0, "Teacher": 44.0, "Engineer": 67.0}
+
+
+def test_calculate_decision_matrix_invalid():
+    with pytest.raises(ValueError):
+        calculate_decision_matrix(OPTIONS, CRITERIA, [1, 2], SCORES)
+    with pytest.raises(ValueError):
+        calculate_decision_matrix(OPTIONS, CRITERIA, [1, 2, 3], [[1, 2], [1, 2], [1, 2]])
+
+
+def test_batch_matches_single_calls():
+    weight_sets = [[10, 5, 1], [1, 1, 10]]
+    score_sets = [SCORES, [[1, 1, 1], [2, 2, 2], [3, 3, 3]]]
+    result = batch_decision_matrix(OPTIONS, CRITERIA, weight_sets, score_sets)
+    for m, scores in enumerate(score_sets):
+        for w, weights in enumerate(weight_sets):
+            single = calculate_decision_matrix(OPTIONS, CRITERIA, weights, scores)
+            assert result["totals"][m][w] == pytest.approx([single[o] for o in OPTIONS])
+            assert result["best"][m][w] == max(single, key=single.get)
+    assert result["rankings"][0][1] == ["Nurse", "Teacher", "Engineer"]
+
+
+def test_sensitivity_analysis():
+    clear_winner = sensitivity_analysis(OPTIONS, CRITERIA, [10, 5, 1], SCORES, perturbation=0.1, seed=1)
+    assert clear_winner["best_option"] == "Engineer"
+    assert clear_winner["stability"] == 1.0
+    close_call = sensitivity_analysis(["A", "B"], ["x", "y"], [1, 1], [[2, 1], [1, 2.05]],
+                                      perturbation=0.5, samples=2000, seed=1)
+    assert 0.0 < close_call["stability"] < 1.0
+    assert sum(close_call["top_choice_frequency"].values()) == pytest.approx(1.0)
+
+
+def test_batch_rejects_ragged_input():
+    with pytest.raises(ValueError):
+        batch_decision_matrix(OPTIONS, CRITERIA, [[1, 2, 3], [1, 2]], [SCORES])
+    with pytest.raises(ValueError):
+        batch_decision_matrix(OPTIONS, CRITERIA, [[1, 2, 3]], [SCORES[:2]])
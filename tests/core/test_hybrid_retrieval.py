@@ -0,0 +1,66 @@
+import asyncio
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.lexical_index import LexicalIndex
+from app.knowledge_base.vector_store import SharedVectorStore
+from app.services.core.retrieval import AdvancedRetriever
+
+TEXTS = [
+    "Core values guide every choice a client makes.",
+    "Brene Brown writes about vulnerability and courage.",
+    "A growth mindset embraces challenges, says Carol Dweck.",
+    "Courage grows when values and actions line up.",
+]
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    queries: int = 0
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+
+def make_retriever(tmp_path, mode="hybrid"):
+    embeddings = CountingEmbeddings(size=8)
+    store = FAISS.from_texts(TEXTS, embeddings, ids=[f"c{i}" for i in range(len(TEXTS))])
+    store.save_local(str(tmp_path))
+    LexicalIndex.from_vector_store(store).save(str(tmp_path))
+    shared = SharedVectorStore(index_dir=str(tmp_path), embeddings_factory=lambda: embeddings, check_interval=60)
+    return AdvancedRetriever(k=2, store=shared, mode=mode), embeddings
+
+
+def test_lexical_mode_skips_embedding(tmp_path):
+    retriever, embeddings = make_retriever(tmp_path, mode="lexical")
+    result = retriever.retrieve("Carol Dweck")
+    assert result.mode == "lexical"
+    assert "Carol Dweck" in result.chunks[0].text
+    assert embeddings.queries == 0
+
+
+def test_hybrid_fast_path_on_confident_lexical_match(tmp_path):
+    retriever, embeddings = make_retriever(tmp_path)
+    result = retriever.retrieve("Brene Brown vulnerability", k=1)
+    assert result.mode == "lexical"
+    assert "Brene Brown" in result.chunks[0].text
+    assert embeddings.queries == 0
+
+
+def test_hybrid_fuses_dense_and_lexical_when_ambiguous(tmp_path):
+    retriever, embeddings = make_retriever(tmp_path)
+    # No chunk contains both terms, so BM25 alone is not trusted
+    result = retriever.retrieve("courage mindset", k=2)
+    assert result.mode == "hybrid"
+    assert embeddings.queries == 1
+    assert len(result.chunks) == 2
+    assert result.chunks[0].score >= result.chunks[1].score
+
+
+def test_vector_mode_and_async(tmp_path):
+    retriever, embeddings = make_retriever(tmp_path, mode="vector")
+    result = asyncio.run(retriever.aretrieve("core values"))
+    assert result.mode == "vector"
+    assert len(result.chunks) == 2
+    assert embeddings.queries == 1
+    hybrid = asyncio.run(retriever.aretrieve("courage mindset", mode="hybrid"))
+    assert hybrid.mode == "hybrid" and len(hybrid.chunks) == 2
@@ -0,0 +1,88 @@
+import uuid
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.messages import AIMessage
+from app.services import metrics
+from app.services.metrics import (
+    MetricsCallbackHandler, MetricsMiddleware, MetricsRegistry, Histogram, span, stage_seconds, llm_tokens,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("work_seconds", "Work.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, stage="a")
+    lines = histogram.render()
+    assert 'work_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'work_seconds_bucket{stage="a",le="1.0"} 3' in lines
+    assert 'work_seconds_bucket{stage="a",le="+Inf"} 4' in lines
+    assert 'work_seconds_count{stage="a"} 4' in lines
+    assert histogram.snapshot(stage="a")["sum"] == 4.25
+
+
+def test_stats_sources_are_flattened_into_gauges():
+    registry = MetricsRegistry()
+    registry.register_stats("cache", lambda: {"hits": 3, "hit_ratio": 0.75, "model": "x", "enabled": True,
+                                              "latency": {"p50": 0.1, "p95": None}})
+
+    def broken():
+        raise RuntimeError("not configured")
+
+    registry.register_stats("broken", broken)
+    text = registry.render()
+    assert "cache_hits 3\n" in text
+    assert "cache_hit_ratio 0.75\n" in text
+    assert "cache_enabled 1\n" in text
+    assert "cache_latency_p50 0.1\n" in text
+    assert "model" not in text and "p95" not in text and "broken" not in text
+
+
+def test_disabled_spans_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics.registry, "enabled", False)
+    before = stage_seconds.snapshot(stage="disabled-stage")
+    with span("disabled-stage"):
+        pass
+    assert before is None and stage_seconds.snapshot(stage="disabled-stage") is None
+
+
+def test_callback_handler_times_tools_and_counts_tokens():
+    handler = MetricsCallbackHandler()
+    run_id = uuid.uuid4()
+    handler.on_tool_start({"name": "bmi_calculator"}, "{}", run_id=run_id)
+    handler.on_tool_end("24.2", run_id=run_id)
+    assert stage_seconds.snapshot(stage="tool:bmi_calculator")["count"] >= 1
+
+    before = llm_tokens._values.get(("test-model", "prompt"), 0)
+    run_id = uuid.uuid4()
+    handler.on_chat_model_start({}, [[]], run_id=run_id)
+    message = AIMessage(content="ok", usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15})
+    handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]],
+                                 llm_output={"model_name": "test-model"}), run_id=run_id)
+    assert llm_tokens._values[("test-model", "prompt")] == before + 12
+    assert llm_tokens._values[("test-model", "completion")] >= 3
+
+
+def test_middleware_reports_stages_and_in_flight():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/work")
+    def work():
+        with span("embedding"):
+            pass
+        with span("embedding"):
+            pass
+        return {"in_flight": metrics.requests_in_flight._values[("/work",)]}
+
+    client = TestClient(app)
+    response = client.get("/work")
+    assert response.json() == {"in_flight": 1}
+    assert response.headers["server-timing"].startswith("embedding;dur=")
+    assert 'desc="embedding x2"' in response.headers["server-timing"]
+    assert metrics.requests_in_flight._values[("/work",)] == 0
+    assert metrics.request_seconds.snapshot(method="GET", path="/work", status="200")["count"] >= 1
+
+    # Unknown paths share one label
+    assert client.get("/nope").status_code == 404
+    assert metrics.request_seconds.snapshot(method="GET", path="other", status="404") is not None
@@ -0,0 +1,116 @@
+import json
+import time
+import threading
+import concurrent.futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.services.core.quote import QuotePool, FALLBACK_QUOTES, format_quote
+
+
+class StubQuotes:
+    """Local stand-in for the ZenQuotes bulk endpoint."""
+
+    def __init__(self, count=50, delay=0.0, status=200):
+        self.count = count
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(stub.delay)
+                body = json.dumps([{"q": f"Quote {i}", "a": f"Author {i}"} for i in range(stub.count)]).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/quotes"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubQuotes()
+    yield server
+    server.close()
+
+
+FALLBACK = {format_quote(*item) for item in FALLBACK_QUOTES}
+
+
+def test_serves_prefetched_quotes_from_memory(stub):
+    pool = QuotePool(url=stub.url, low_water=5)
+    try:
+        pool.refill_now(timeout=5)
+        quotes = [pool.get() for _ in range(20)]
+        assert all(q.startswith('"Quote ') and " – Author " in q for q in quotes)
+        assert len(set(quotes)) == 20
+        # One bulk request filled the pool
+        assert stub.requests == 1
+        assert pool.stats()["fallbacks"] == 0
+    finally:
+        pool.close()
+
+
+def test_empty_pool_falls_back_without_waiting(stub):
+    stub.delay = 1.0
+    pool = QuotePool(url=stub.url, timeout=5)
+    try:
+        start = time.perf_counter()
+        quote = pool.get()
+        assert time.perf_counter() - start < 0.1
+        assert quote in FALLBACK
+        # The background refill still lands
+        pool.refill_now(timeout=5)
+        assert pool.get().startswith('"Quote ')
+    finally:
+        pool.close()
+
+
+def test_slow_upstream_times_out_to_fallback(stub):
+    stub.delay = 0.5
+    pool = QuotePool(url=stub.url, timeout=0.1)
+    try:
+        pool.refill_now(timeout=5)
+        assert pool.stats()["errors"] == 1
+        assert pool.get() in FALLBACK
+    finally:
+        pool.close()
+
+
+def test_upstream_error_is_counted(stub):
+    stub.status = 429
+    pool = QuotePool(url=stub.url)
+    try:
+        pool.refill_now(timeout=5)
+        assert pool.stats()["errors"] == 1
+        assert pool.stats()["pooled"] == 0
+    finally:
+        pool.close()
+
+
+def test_refills_below_low_water_mark_once(stub):
+    stub.count = 10
+    pool = QuotePool(url=stub.url, low_water=5)
+    try:
+        pool.refill_now(timeout=5)
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda _: pool.get(), range(8)))
+        pool.refill_now(timeout=5)
+        # Concurrent gets below the mark share a single refill
+        assert stub.requests <= 3
+        assert pool.stats()["pooled"] >= 10
+    finally:
+        pool.close()
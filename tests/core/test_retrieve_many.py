@@ -0,0 +1,62 @@
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.embedding_cache import CachedQueryEmbeddings
+from app.knowledge_base.lexical_index import LexicalIndex
+from app.knowledge_base.vector_store import SharedVectorStore
+from app.services.core.retrieval import AdvancedRetriever
+
+TEXTS = [f"Chapter {i} talks about courage, values and habit number {i}." for i in range(30)]
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    requests: int = 0
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.requests += 1
+        return super().embed_query(text)
+
+
+def make_retriever(tmp_path, mode="vector"):
+    base = CountingEmbeddings(size=16)
+    store = FAISS.from_texts(TEXTS, base, ids=[f"c{i}" for i in range(len(TEXTS))])
+    store.save_local(str(tmp_path))
+    LexicalIndex.from_vector_store(store).save(str(tmp_path))
+    embeddings = CachedQueryEmbeddings(base, db_path=None)
+    shared = SharedVectorStore(index_dir=str(tmp_path), embeddings_factory=lambda: embeddings, check_interval=60)
+    base.requests = 0
+    return AdvancedRetriever(k=3, store=shared, mode=mode), base
+
+
+def test_batch_matches_loop_in_input_order(tmp_path):
+    retriever, base = make_retriever(tmp_path)
+    queries = [f"question {i}" for i in range(20)]
+    batch = retriever.retrieve_many(queries)
+    assert base.requests == 1
+    loop = [retriever.retrieve(query) for query in queries]
+    # The loop is served from the query cache filled by the batch
+    assert base.requests == 1
+    for one, many in zip(loop, batch):
+        assert many.original_query == one.original_query
+        assert [c.text for c in many.chunks] == [c.text for c in one.chunks]
+        assert [c.score for c in many.chunks] == pytest.approx([c.score for c in one.chunks], rel=1e-4)
+
+
+def test_invalid_queries_get_empty_results(tmp_path):
+    retriever, _ = make_retriever(tmp_path)
+    results = retriever.retrieve_many(["courage", "   ", "values"])
+    assert [r.not_found for r in results] == [False, True, False]
+
+
+def test_hybrid_batch_skips_embedding_for_lexical_matches(tmp_path):
+    retriever, base = make_retriever(tmp_path, mode="hybrid")
+    results = retriever.retrieve_many(["habit number 7", "something unrelated", "anything else"])
+    assert results[0].mode == "lexical"
+    assert "number 7." in results[0].chunks[0].text
+    assert [r.mode for r in results[1:]] == ["hybrid", "hybrid"]
+    # Only the two queries that need dense search were embedded, in one request
+    assert base.requests == 1
@@ -0,0 +1,98 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.services.singleflight import SingleFlight, singleflight_stats
+from app.services.core.retrieval import AdvancedRetriever, RetrievalResult, retrieval_flights
+
+
+def test_concurrent_identical_calls_share_one_run():
+    group = SingleFlight("test_threads")
+    runs = []
+    started = threading.Event()
+
+    def slow(value):
+        runs.append(value)
+        started.set()
+        time.sleep(0.1)
+        return {"value": value}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        leader = pool.submit(group.do, "key", slow, 1)
+        started.wait()
+        followers = [pool.submit(group.do, "key", slow, 1) for _ in range(7)]
+        other = pool.submit(group.do, "other", slow, 2)
+        results = [leader.result()] + [f.result() for f in followers]
+    assert sorted(runs) == [1, 2] and other.result() == {"value": 2}
+    # Everyone gets the leader's result
+    assert all(result is results[0] for result in results)
+    assert group.stats() == {"calls": 9, "executed": 2, "coalesced": 7, "errors": 0, "in_flight": 0}
+    assert singleflight_stats()["test_threads"]["coalesced"] == 7
+    # Nothing is kept once the call is done
+    assert group.do("key", lambda: "fresh") == "fresh"
+
+
+def test_exceptions_reach_every_waiter():
+    group = SingleFlight("test_errors")
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise TimeoutError("upstream timed out")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(group.do, "key", failing)
+        started.wait()
+        futures = [leader] + [pool.submit(group.do, "key", failing) for _ in range(3)]
+        for future in futures:
+            with pytest.raises(TimeoutError):
+                future.result()
+    assert group.stats()["errors"] == 1 and group.stats()["coalesced"] == 3
+
+
+def test_async_callers_share_a_task_that_survives_cancellation():
+    group = SingleFlight("test_async")
+    runs = []
+
+    async def fetch():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        first = asyncio.ensure_future(group.ado("key", fetch))
+        await asyncio.sleep(0)
+        others = [asyncio.ensure_future(group.ado("key", fetch)) for _ in range(3)]
+        # The caller that started the work goes away, the others still get the answer
+        first.cancel()
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(run()) == ["answer"] * 3
+    assert runs == [1] and group.stats()["coalesced"] == 3
+
+
+def test_retriever_coalesces_equivalent_queries(monkeypatch):
+    retriever = AdvancedRetriever(k=2, store=object(), mode="vector")
+    calls = []
+    started = threading.Event()
+
+    def slow_retrieve(query, k=None, mode=None):
+        calls.append(query)
+        started.set()
+        time.sleep(0.1)
+        return RetrievalResult(original_query=query, translated_query=query.strip().lower(), chunks=[])
+
+    monkeypatch.setattr(retriever, "_retrieve", slow_retrieve)
+    before = retrieval_flights.stats()["coalesced"]
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        leader = pool.submit(retriever.retrieve, "Values and goals")
+        started.wait()
+        follower = pool.submit(retriever.retrieve, "  values AND goals ")
+        other_k = pool.submit(retriever.retrieve, "values and goals", 5)
+    assert len(calls) == 2
+    assert retrieval_flights.stats()["coalesced"] == before + 1
+    # A joined caller still sees its own query
+    assert follower.result().original_query == "  values AND goals "
+    assert leader.result().original_query == "Values and goals"
@@ -0,0 +1,7 @@
+import pytest
+from benchmarks.fixtures import write_pdf
+
+
+@pytest.fixture
+def make_pdf():
+    return write_pdf
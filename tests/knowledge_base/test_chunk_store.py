@@ -0,0 +1,89 @@
+import os
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.chunk_store import ChunkStore, has_chunk_store, write_chunk_store
+from app.knowledge_base.ingest_and_index import ingest_all_pdfs_to_faiss
+from app.knowledge_base.vector_store import SharedVectorStore, load_vector_store
+from app.knowledge_base.generations import current_dir
+
+TEXTS = ["Core values guide choices.", "Mut – Zuversicht & Wachstum ✓", "Growth mindset habits."]
+METADATAS = [{"source": "values.pdf", "page": 0, "author": "A"}, {"source": "de.pdf", "page": 3},
+             {"source": "values.pdf"}]
+
+
+def make_store(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    store = FAISS.from_texts(TEXTS, embeddings, metadatas=METADATAS, ids=["c-0", "c-1", "c-2"])
+    store.save_local(str(tmp_path))
+    write_chunk_store(str(tmp_path), store)
+    return store, embeddings
+
+
+def test_chunk_store_round_trip(tmp_path):
+    store, _ = make_store(tmp_path)
+    assert has_chunk_store(str(tmp_path))
+    chunks = ChunkStore(str(tmp_path))
+    assert len(chunks) == 3
+    for chunk_id in ("c-0", "c-1", "c-2"):
+        original, loaded = store.docstore.search(chunk_id), chunks.search(chunk_id)
+        assert loaded.page_content == original.page_content
+        assert loaded.metadata == original.metadata
+        assert loaded.id == chunk_id
+    assert chunks.search("missing") == "ID missing not found."
+    ids = chunks.index_to_docstore_id()
+    assert dict(ids) == store.index_to_docstore_id
+
+
+def test_mapped_store_matches_in_memory_stores(tmp_path):
+    _, embeddings = make_store(tmp_path)
+    mapped = load_vector_store(str(tmp_path), embeddings, mmap=True)
+    in_memory = load_vector_store(str(tmp_path), embeddings, mmap=False, shared_chunks=False)
+    assert isinstance(mapped.docstore, ChunkStore)
+    assert not isinstance(in_memory.docstore, ChunkStore)
+    # Chunk files are preferred over the pickle even without mmap
+    (tmp_path / "index.pkl").unlink()
+    unmapped = load_vector_store(str(tmp_path), embeddings, mmap=False)
+    assert isinstance(unmapped.docstore, ChunkStore)
+    for query in ("values", "Wachstum", "habits"):
+        expected = [(d.id, d.page_content, d.metadata, s) for d, s in mapped.similarity_search_with_score(query, k=3)]
+        for store in (in_memory, unmapped):
+            assert [(d.id, d.page_content, d.metadata, s)
+                    for d, s in store.similarity_search_with_score(query, k=3)] == expected
+
+
+def test_hot_chunks_are_cached_and_returned_as_copies(tmp_path):
+    make_store(tmp_path)
+    chunks = ChunkStore(str(tmp_path), cache_size=2)
+    first = chunks.search("c-0")
+    first.metadata["seen"] = True
+    again = chunks.search("c-0")
+    assert "seen" not in again.metadata and again.page_content == TEXTS[0]
+    chunks.search("c-1")
+    chunks.search("c-2")
+    stats = chunks.stats()
+    assert (stats["cached"], stats["cache_hits"], stats["cache_misses"]) == (2, 1, 3)
+
+
+def test_ingest_writes_chunk_files_served_by_the_shared_store(tmp_path, make_pdf):
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    make_pdf(pdfs / "book.pdf", ["Courage grows with practice.", "Habits compound."])
+    index_dir = tmp_path / "faiss_index"
+    embeddings = DeterministicFakeEmbedding(size=8)
+    ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index_dir), embeddings=embeddings)
+    shared = SharedVectorStore(index_dir=str(index_dir), embeddings_factory=lambda: embeddings, check_interval=60)
+    store = shared.get()
+    assert shared.stats()["shared_chunks"]
+    # FAISS keeps only the vectors, nothing is pickled
+    assert not os.path.exists(os.path.join(current_dir(str(index_dir)), "index.pkl"))
+    # The flat index is memory-mapped too, hence read-only
+    assert faiss.downcast_index(store.index).ntotal == 2
+    assert {doc.metadata["page"] for doc in store.similarity_search("courage", k=2)} == {0, 1}
+    assert shared.lexical().search("habits", 1)[0][0] == store.index_to_docstore_id[1]
+
+    # Incremental ingest still updates the docstore in place
+    make_pdf(pdfs / "more.pdf", ["Extra page."])
+    assert ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index_dir), embeddings=embeddings)["added"] == 1
+    assert len(ChunkStore(current_dir(str(index_dir)))) == 3
+    assert not os.path.exists(os.path.join(current_dir(str(index_dir)), "index.pkl"))
@@ -0,0 +1,49 @@
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.embedding_cache import CachedQueryEmbeddings
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+def test_repeated_query_hits_memory():
+    inner = CountingEmbeddings(size=8)
+    cache = CachedQueryEmbeddings(inner, db_path=None)
+    first = cache.embed_query("what are core values?")
+    second = cache.embed_query("what are core values?")
+    assert inner.calls == 1
+    assert second == first
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_is_bounded():
+    cache = CachedQueryEmbeddings(CountingEmbeddings(size=8), max_entries=2, db_path=None)
+    for query in ["a", "b", "c"]:
+        cache.embed_query(query)
+    assert cache.stats()["entries"] == 2
+    cache.embed_query("a")
+    assert cache.stats()["misses"] == 4
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / "embeddings.sqlite")
+    CachedQueryEmbeddings(CountingEmbeddings(size=8), db_path=db_path).embed_query("growth mindset")
+    inner = CountingEmbeddings(size=8)
+    cache = CachedQueryEmbeddings(inner, db_path=db_path)
+    cache.embed_query("growth mindset")
+    assert inner.calls == 0
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_invalidate_drops_entries(tmp_path):
+    inner = CountingEmbeddings(size=8)
+    cache = CachedQueryEmbeddings(inner, db_path=str(tmp_path / "embeddings.sqlite"))
+    cache.embed_query("courage")
+    cache.invalidate()
+    cache.embed_query("courage")
+    assert inner.calls == 2
@@ -0,0 +1,41 @@
+import pytest
+from langchain_openai import OpenAIEmbeddings
+from benchmarks.fake_openai import FakeOpenAIServer, fake_vector
+from app.knowledge_base.embedding_scheduler import EmbeddingScheduler, EmbeddingCheckpoint
+
+
+def fake_embeddings(server):
+    return OpenAIEmbeddings(model="text-embedding-3-small", base_url=server.url, api_key="test",
+                            check_embedding_ctx_length=False, max_retries=0)
+
+
+def test_batches_run_concurrently_in_order():
+    texts = [f"chunk {i}" for i in range(20)]
+    with FakeOpenAIServer(latency=0.05) as server:
+        scheduler = EmbeddingScheduler(fake_embeddings(server), batch_size=4, max_in_flight=3)
+        vectors = scheduler.embed(texts)
+    assert len(vectors) == 20
+    assert server.requests == 5
+    assert 1 < server.max_in_flight <= 3
+    assert vectors[7] == pytest.approx(fake_vector("chunk 7", 64), abs=1e-6)
+
+
+def test_throttled_batches_are_retried():
+    with FakeOpenAIServer(fail_first=2, fail_status=429) as server:
+        scheduler = EmbeddingScheduler(fake_embeddings(server), batch_size=10, max_in_flight=1)
+        vectors = scheduler.embed(["a", "b", "c"])
+    assert len(vectors) == 3
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_checkpoint_resumes_without_reembedding(tmp_path):
+    checkpoint = EmbeddingCheckpoint(str(tmp_path / "checkpoint.sqlite"))
+    texts = [f"chunk {i}" for i in range(6)]
+    ids = [f"doc-{i}" for i in range(6)]
+    with FakeOpenAIServer() as server:
+        EmbeddingScheduler(fake_embeddings(server), batch_size=2, checkpoint=checkpoint).embed(texts[:4], ids[:4])
+        scheduler = EmbeddingScheduler(fake_embeddings(server), batch_size=2, checkpoint=checkpoint)
+        vectors = scheduler.embed(texts, ids)
+    assert scheduler.stats()["resumed"] == 4
+    assert scheduler.stats()["embedded"] == 2
+    assert all(vector is not None for vector in vectors)
@@ -0,0 +1,37 @@
+import os
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.generations import CURRENT_NAME, current_dir, new_generation
+from app.knowledge_base.ingest_and_index import ingest_all_pdfs_to_faiss
+from app.knowledge_base.vector_store import SharedVectorStore
+
+
+def test_readers_only_see_published_generations(tmp_path, make_pdf):
+    pdfs, index_dir = tmp_path / "pdfs", tmp_path / "faiss_index"
+    pdfs.mkdir()
+    embeddings = DeterministicFakeEmbedding(size=8)
+    # An index written before generations existed is still served, then replaced by the first publish
+    FAISS.from_texts(["Legacy chunk."], embeddings).save_local(str(index_dir))
+    shared = SharedVectorStore(index_dir=str(index_dir), embeddings_factory=lambda: embeddings, check_interval=60)
+    assert shared.get().index.ntotal == 1
+
+    make_pdf(pdfs / "values.pdf", ["Core values guide choices.", "Name them."])
+    ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index_dir), embeddings=embeddings)
+    assert sorted(os.listdir(index_dir)) == [CURRENT_NAME, os.path.basename(current_dir(str(index_dir)))]
+    first = shared.reload()
+    assert first.index.ntotal == 2
+
+    # Files of a generation that is still being written are never picked up
+    partial = new_generation(str(index_dir))
+    FAISS.from_texts(["Half written."], embeddings).save_local(partial)
+    assert shared.reload() is first
+
+    for n in range(3):
+        make_pdf(pdfs / f"habits{n}.pdf", [f"Habit {n} compounds."])
+        ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index_dir), embeddings=embeddings)
+    store = shared.reload()
+    assert store is not first and store.index.ntotal == 5
+    assert {doc.metadata["source"] for doc in store.similarity_search("habit", k=5)} == \
+        {"values.pdf", "habits0.pdf", "habits1.pdf", "habits2.pdf"}
+    # The current generation and the one before it are kept
+    assert len([name for name in os.listdir(index_dir) if name.startswith("gen-")]) == 2
@@ -0,0 +1,89 @@
+import os
+import json
+import faiss
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.index_factory import (
+    build_index, factory_string, index_type_of, read_index, tune_index, VECTORS_NAME,
+)
+from app.knowledge_base.ingest_and_index import ingest_all_pdfs_to_faiss
+from app.knowledge_base.vector_store import load_vector_store
+from app.knowledge_base.generations import current_dir
+
+
+def clustered_vectors(n=3000, d=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, d))
+    return (centers[rng.integers(0, 20, n)] + 0.1 * rng.normal(size=(n, d))).astype(np.float32)
+
+
+def test_factory_strings():
+    assert factory_string("flat", 1536, 100) == "Flat"
+    assert factory_string("hnsw", 1536, 100, hnsw_m=16) == "HNSW16,Flat"
+    assert factory_string("ivf_flat", 1536, 100000) == "IVF1264,Flat"
+    # PQ sub-quantizers are reduced to a divisor of the dimension
+    assert factory_string("ivf_pq", 100, 100000, nlist=64, pq_m=64) == "IVF64,PQ50np"
+    with pytest.raises(ValueError):
+        factory_string("lsh", 8, 10)
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq", "hnsw"])
+def test_approximate_indexes_find_neighbours(index_type):
+    vectors = clustered_vectors()
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    index = tune_index(build_index(vectors, index_type, pq_m=8), nprobe=8, ef_search=64)
+    assert index_type_of(index) == index_type
+    queries = vectors[:50] + 0.01
+    _, truth = exact.search(queries, 10)
+    _, found = index.search(queries, 10)
+    recall = np.mean([len(set(t) & set(f)) / 10 for t, f in zip(truth, found)])
+    assert recall > 0.5
+
+
+def test_small_collections_fall_back_from_pq():
+    index = build_index(clustered_vectors(n=100), "ivf_pq")
+    assert index_type_of(index) == "ivf_flat"
+
+
+def test_mmap_loading_of_ivf(tmp_path):
+    index = build_index(clustered_vectors(), "ivf_flat")
+    faiss.write_index(index, str(tmp_path / "index.faiss"))
+    loaded = tune_index(read_index(str(tmp_path / "index.faiss"), mmap=True), nprobe=4)
+    assert faiss.downcast_index(loaded).nprobe == 4
+    assert loaded.ntotal == index.ntotal
+    assert loaded.search(clustered_vectors()[:1], 1)[1][0][0] == 0
+
+
+def test_ingest_with_ivf_index_and_incremental_update(tmp_path, make_pdf):
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    for n in range(3):
+        make_pdf(pdfs / f"book{n}.pdf", [f"Book {n} page {p} about courage." for p in range(4)])
+    index_dir = tmp_path / "faiss_index"
+    embeddings = DeterministicFakeEmbedding(size=8)
+
+    def ingest(index_type):
+        return ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index_dir), embeddings=embeddings,
+                                        index_type=index_type)
+
+    ingest("ivf_flat")
+    generation = index_dir / os.path.basename(current_dir(str(index_dir)))
+    assert json.loads((generation / "manifest.json").read_text())["index"] == {"type": "ivf_flat", "vectors": 12}
+    assert (generation / VECTORS_NAME).exists()
+    store = load_vector_store(str(index_dir), embeddings)
+    assert index_type_of(store.index) == "ivf_flat"
+    assert len(store.similarity_search("courage", k=2)) == 2
+
+    # Incremental update: the IVF index is rebuilt from the saved exact vectors
+    make_pdf(pdfs / "book3.pdf", ["Extra page."])
+    report = ingest("ivf_flat")
+    assert report["reused"] == 12 and report["added"] == 1
+    assert load_vector_store(str(index_dir), embeddings).index.ntotal == 13
+
+    # Switching the type rebuilds the index without re-embedding
+    report = ingest("flat")
+    assert report["added"] == 0
+    assert index_type_of(load_vector_store(str(index_dir), embeddings).index) == "flat"
+    assert not os.path.exists(os.path.join(current_dir(str(index_dir)), VECTORS_NAME))
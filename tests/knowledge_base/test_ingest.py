@@ -0,0 +1,157 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.ingest_and_index import ingest_all_pdfs_to_faiss, load_manifest, update_source
+from app.knowledge_base.index_factory import index_type_of
+from app.knowledge_base.lexical_index import LexicalIndex
+from app.knowledge_base.vector_store import load_vector_store
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    embedded: int = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def run_ingest(pdfs, index, embeddings):
+    return ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index), embeddings=embeddings)
+
+
+def test_incremental_ingest(tmp_path, make_pdf):
+    pdfs = tmp_path / "pdfs"
+    index = tmp_path / "faiss_index"
+    pdfs.mkdir()
+    make_pdf(pdfs / "values.pdf", ["Core values guide choices.", "Courage is a core value."])
+    make_pdf(pdfs / "mindset.pdf", ["A growth mindset embraces challenges."])
+
+    embeddings = CountingEmbeddings(size=8)
+    report = run_ingest(pdfs, index, embeddings)
+    assert report == {"reused": 0, "added": 3, "removed": 0, "files": 2}
+
+    # Nothing changed: nothing is embedded again
+    embeddings = CountingEmbeddings(size=8)
+    report = run_ingest(pdfs, index, embeddings)
+    assert report["reused"] == 3 and report["added"] == 0
+    assert embeddings.embedded == 0
+
+    # One book changed, one deleted, one added
+    make_pdf(pdfs / "values.pdf", ["Core values guide choices."])
+    (pdfs / "mindset.pdf").unlink()
+    make_pdf(pdfs / "gifts.pdf", ["Let go of perfectionism."])
+    embeddings = CountingEmbeddings(size=8)
+    report = run_ingest(pdfs, index, embeddings)
+    assert report == {"reused": 0, "added": 2, "removed": 3, "files": 2}
+    assert embeddings.embedded == 2
+
+    store = load_vector_store(str(index), embeddings)
+    assert store.index.ntotal == 2
+    sources = {store.docstore.search(chunk_id).metadata["source"] for chunk_id in store.index_to_docstore_id.values()}
+    assert sources == {"values.pdf", "gifts.pdf"}
+    assert set(load_manifest(str(index))["files"]) == {"values.pdf", "gifts.pdf"}
+
+
+def test_pipeline_ingest_matches_serial(tmp_path, make_pdf):
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    for n in range(5):
+        make_pdf(pdfs / f"book{n}.pdf", [f"Book {n} page {p} about courage." for p in range(3)])
+    make_pdf(pdfs / "blank.pdf", [""])
+
+    serial = ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(tmp_path / "serial"),
+                                      embeddings=CountingEmbeddings(size=8))
+    embeddings = CountingEmbeddings(size=8)
+    piped = ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(tmp_path / "piped"), embeddings=embeddings,
+                                     pipeline=True, workers=2, batch_size=4)
+    assert piped == serial
+    assert embeddings.embedded == 15
+    assert load_manifest(str(tmp_path / "piped")) == load_manifest(str(tmp_path / "serial"))
+    store = load_vector_store(str(tmp_path / "piped"), embeddings)
+    assert store.index.ntotal == 15
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_identical_pdfs_under_different_names(tmp_path, make_pdf, pipeline):
+    pdfs, index = tmp_path / "pdfs", tmp_path / "faiss_index"
+    pdfs.mkdir()
+    make_pdf(pdfs / "values.pdf", ["Core values guide choices.", "Name them."])
+    (pdfs / "values-copy.pdf").write_bytes((pdfs / "values.pdf").read_bytes())
+
+    def ingest():
+        return ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index),
+                                        embeddings=CountingEmbeddings(size=8), pipeline=pipeline, workers=2)
+
+    assert ingest() == {"reused": 0, "added": 4, "removed": 0, "files": 2}
+    files = load_manifest(str(index))["files"]
+    assert not set(files["values.pdf"]["chunk_ids"]) & set(files["values-copy.pdf"]["chunk_ids"])
+
+    # Removing one copy keeps the chunks of the other
+    (pdfs / "values.pdf").unlink()
+    assert ingest() == {"reused": 2, "added": 0, "removed": 2, "files": 1}
+    store = load_vector_store(str(index), CountingEmbeddings(size=8))
+    assert store.index.ntotal == 2
+    assert {store.docstore.search(chunk_id).metadata["source"]
+            for chunk_id in store.index_to_docstore_id.values()} == {"values-copy.pdf"}
+
+
+def index_contents(index_dir):
+    store = load_vector_store(str(index_dir), CountingEmbeddings(size=8))
+    chunks = {chunk_id: store.docstore.search(chunk_id) for chunk_id in store.index_to_docstore_id.values()}
+    lexical = LexicalIndex.load(str(index_dir))
+    return ({chunk_id: (doc.page_content, doc.metadata) for chunk_id, doc in chunks.items()},
+            store.similarity_search("courage habits", k=3), lexical.search("courage habits", 3),
+            index_type_of(store.index))
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+def test_update_source_matches_a_full_ingest(tmp_path, make_pdf, index_type):
+    pdfs, index = tmp_path / "pdfs", tmp_path / "faiss_index"
+    pdfs.mkdir()
+    make_pdf(pdfs / "values.pdf", ["Core values guide choices.", "Courage is a core value."])
+    make_pdf(pdfs / "mindset.pdf", ["A growth mindset embraces challenges.", "Habits compound."])
+    ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index), embeddings=CountingEmbeddings(size=8),
+                             index_type=index_type)
+
+    make_pdf(pdfs / "habits.pdf", ["Tiny habits, big courage."])
+    embeddings = CountingEmbeddings(size=8)
+    report = update_source(str(index), "habits.pdf", str(pdfs / "habits.pdf"), embeddings)
+    assert report == {"reused": 4, "added": 1, "removed": 0, "files": 3}
+    assert embeddings.embedded == 1
+    make_pdf(pdfs / "values.pdf", ["Core values guide choices, with courage."])
+    assert update_source(str(index), "values.pdf", str(pdfs / "values.pdf"), embeddings)["removed"] == 2
+    (pdfs / "mindset.pdf").unlink()
+    assert update_source(str(index), "mindset.pdf", None, embeddings) == \
+        {"reused": 2, "added": 0, "removed": 2, "files": 2}
+    assert update_source(str(index), "mindset.pdf", None, embeddings)["removed"] == 0
+
+    rebuilt = tmp_path / "rebuilt"
+    ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(rebuilt), embeddings=CountingEmbeddings(size=8),
+                             index_type=index_type)
+    updated, expected = index_contents(index), index_contents(rebuilt)
+    assert updated[0] == expected[0] and updated[2] == expected[2] and updated[3] == expected[3] == index_type
+    assert [doc.page_content for doc in updated[1]] == [doc.page_content for doc in expected[1]]
+    assert load_manifest(str(index))["files"] == load_manifest(str(rebuilt))["files"]
+
+
+@pytest.mark.parametrize("in_place", [True, False])
+def test_removing_the_last_document_leaves_an_empty_index(tmp_path, make_pdf, in_place):
+    pdfs, index = tmp_path / "pdfs", tmp_path / "faiss_index"
+    pdfs.mkdir()
+    make_pdf(pdfs / "values.pdf", ["Core values guide choices.", "Courage is a core value."])
+    embeddings = CountingEmbeddings(size=8)
+    ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index), embeddings=embeddings, index_type="ivf_flat")
+
+    (pdfs / "values.pdf").unlink()
+    if in_place:
+        assert update_source(str(index), "values.pdf", None, embeddings)["removed"] == 2
+    else:
+        ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index), embeddings=embeddings,
+                                 index_type="ivf_flat")
+    store = load_vector_store(str(index), embeddings)
+    assert store.index.ntotal == 0 and store.similarity_search("courage", k=2) == []
+
+    # Documents can be added again afterwards
+    make_pdf(pdfs / "habits.pdf", ["Tiny habits, big courage."])
+    assert update_source(str(index), "habits.pdf", str(pdfs / "habits.pdf"), embeddings)["added"] == 1
+    store = load_vector_store(str(index), embeddings)
+    assert [doc.page_content for doc in store.similarity_search("courage", k=2)] == ["Tiny habits, big courage."]
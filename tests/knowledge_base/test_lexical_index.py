@@ -0,0 +1,67 @@
+import os
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.lexical_index import LexicalIndex, tokenize, LEXICAL_INDEX_NAME
+from app.knowledge_base.ingest_and_index import ingest_all_pdfs_to_faiss
+from app.knowledge_base.generations import current_dir
+
+CHUNKS = [
+    ("c0", "Core values guide every choice a client makes."),
+    ("c1", "Brene Brown writes about vulnerability and courage."),
+    ("c2", "A growth mindset embraces challenges, says Carol Dweck."),
+    ("c3", "Courage grows when values and actions line up."),
+]
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("What are the Core Values of a coach?") == ["core", "values", "coach"]
+
+
+def test_bm25_ranks_exact_terms_first():
+    index = LexicalIndex.build(CHUNKS)
+    hits = index.search("Carol Dweck mindset", k=2)
+    assert hits[0][0] == "c2"
+    assert len(hits) == 1  # no other chunk shares a term
+    assert [chunk_id for chunk_id, _ in index.search("courage", k=5)] in (["c1", "c3"], ["c3", "c1"])
+    assert index.search("unknownterm", k=3) == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = LexicalIndex.build(CHUNKS)
+    index.save(str(tmp_path))
+    loaded = LexicalIndex.load(str(tmp_path))
+    assert loaded.chunk_ids == index.chunk_ids
+    assert loaded.search("vulnerability courage", k=3) == index.search("vulnerability courage", k=3)
+    assert loaded.stats()["chunks"] == 4
+    assert LexicalIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_confident_search_requires_full_coverage_and_margin():
+    index = LexicalIndex.build(CHUNKS)
+    assert index.confident_search("brene brown vulnerability", k=1, min_margin=1.5)[0][0] == "c1"
+    # Terms the corpus has never seen do not count against a match
+    assert index.confident_search("brene brown spreadsheets", k=1, min_margin=1.5)[0][0] == "c1"
+    # No chunk has both terms, so the best one only partially matches
+    assert index.confident_search("courage mindset", k=1, min_margin=1.5) is None
+    # Full matches do not clearly beat partial ones
+    assert index.confident_search("courage values", k=1, min_margin=3.0) is None
+    assert index.confident_search("unknownterm", k=1, min_margin=1.5) is None
+
+
+def test_from_vector_store_uses_docstore_ids():
+    store = FAISS.from_texts([text for _, text in CHUNKS], DeterministicFakeEmbedding(size=8),
+                             ids=[chunk_id for chunk_id, _ in CHUNKS])
+    index = LexicalIndex.from_vector_store(store)
+    assert sorted(index.chunk_ids) == ["c0", "c1", "c2", "c3"]
+
+
+def test_ingest_writes_lexical_index(tmp_path, make_pdf):
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    make_pdf(pdfs / "values.pdf", ["Core values guide choices.", "Courage is a core value."])
+    index_dir = tmp_path / "faiss_index"
+    ingest_all_pdfs_to_faiss(pdfs_dir=str(pdfs), index_dir=str(index_dir), embeddings=DeterministicFakeEmbedding(size=8))
+    assert os.path.exists(os.path.join(current_dir(str(index_dir)), LEXICAL_INDEX_NAME))
+    index = LexicalIndex.load(str(index_dir))
+    assert len(index) == 2
+    assert index.search("courage", k=1)
@@ -0,0 +1,73 @@
+import time
+import asyncio
+import threading
+import httpx
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base import retrieval_qa
+from app.knowledge_base.vector_store import SharedVectorStore
+from app.services.llm.gateway import LLMGateway
+
+pytestmark = pytest.mark.usefixtures("openai_api_key")
+
+COMPLETION = {
+    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "Name what matters."},
+                 "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8},
+}
+
+
+def setup_qa(monkeypatch, tmp_path, handler):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    texts = ["Core values guide choices.", "Goals need a deadline.", "Habits beat motivation."]
+    FAISS.from_texts(texts, embeddings, metadatas=[{"source": f"book_{i}.pdf"} for i in range(3)]) \
+        .save_local(str(tmp_path))
+    store = SharedVectorStore(index_dir=str(tmp_path), embeddings_factory=lambda: embeddings, check_interval=60)
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(retrieval_qa, "shared_vector_store", store)
+    monkeypatch.setattr(retrieval_qa, "gateway", LLMGateway(transport=transport, async_transport=transport))
+    monkeypatch.setattr(retrieval_qa, "_qa_chains", {})
+    return store
+
+
+def test_chains_are_built_once_per_settings(monkeypatch, tmp_path):
+    setup_qa(monkeypatch, tmp_path, lambda request: httpx.Response(200, json=COMPLETION))
+    builds = retrieval_qa.qa_chain_stats["builds"]
+    chain = retrieval_qa.get_qa_chain(k=2)
+    assert retrieval_qa.get_qa_chain(k=2) is chain
+    assert retrieval_qa.get_qa_chain(k=3) is not chain
+    assert retrieval_qa.get_qa_chain(k=2, temperature=0.5) is not chain
+    assert retrieval_qa.qa_chain_stats["builds"] == builds + 3
+
+    answer, sources = retrieval_qa.answer_query("What are core values?", k=2)
+    assert answer == "Name what matters."
+    assert len(sources) == 2 and all(source.startswith("book_") for source in sources)
+    answer, sources = asyncio.run(retrieval_qa.aanswer_query("What are core values?", k=2))
+    assert answer == "Name what matters." and len(sources) == 2
+    assert retrieval_qa.qa_chain_stats["builds"] == builds + 3
+
+
+def test_batch_answers_in_order_with_bounded_concurrency(monkeypatch, tmp_path):
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def handler(request):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return httpx.Response(200, json=COMPLETION)
+
+    setup_qa(monkeypatch, tmp_path, handler)
+    questions = [f"Question {i} about habits?" for i in range(6)]
+    start = time.perf_counter()
+    results = retrieval_qa.answer_queries(questions, k=1, max_concurrency=3)
+    elapsed = time.perf_counter() - start
+    assert [answer for answer, _ in results] == ["Name what matters."] * 6
+    assert active["max"] == 3
+    # Two rounds of three, not six sequential calls
+    assert elapsed < 6 * 0.05
@@ -0,0 +1,58 @@
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.knowledge_base.embedding_cache import CachedQueryEmbeddings
+from app.knowledge_base.vector_store import SharedVectorStore
+
+
+def fake_embeddings():
+    return DeterministicFakeEmbedding(size=8)
+
+
+def build_index(index_dir, texts):
+    FAISS.from_texts(texts, fake_embeddings()).save_local(str(index_dir))
+
+
+def test_shared_store_loads_once(tmp_path):
+    build_index(tmp_path, ["core values", "growth mindset"])
+    shared = SharedVectorStore(index_dir=str(tmp_path), embeddings_factory=fake_embeddings, check_interval=60)
+    first = shared.get()
+    assert shared.get() is first
+    stats = shared.stats()
+    assert stats["loaded"] is True
+    assert stats["vectors"] == 2
+    assert stats["reload_count"] == 0
+    assert stats["index_bytes"] > 0
+
+
+def test_shared_store_hot_reload(tmp_path):
+    build_index(tmp_path, ["core values"])
+    shared = SharedVectorStore(index_dir=str(tmp_path), embeddings_factory=fake_embeddings, check_interval=0)
+    first = shared.get()
+    assert shared.get() is first
+    build_index(tmp_path, ["core values", "growth mindset", "vulnerability"])
+    second = shared.get()
+    assert second is not first
+    assert second.index.ntotal == 3
+    assert shared.stats()["reload_count"] == 1
+
+
+def test_shared_store_keeps_old_index_on_bad_reload(tmp_path):
+    build_index(tmp_path, ["core values"])
+    shared = SharedVectorStore(index_dir=str(tmp_path), embeddings_factory=fake_embeddings, check_interval=0)
+    first = shared.get()
+    (tmp_path / "index.pkl").write_bytes(b"partial write")
+    assert shared.get() is first
+    assert shared.stats()["last_error"]
+
+
+def test_embeddings_stats_do_not_build_the_client(tmp_path):
+    built = []
+
+    def factory():
+        built.append(True)
+        return CachedQueryEmbeddings(fake_embeddings(), db_path=None)
+
+    shared = SharedVectorStore(index_dir=str(tmp_path), embeddings_factory=factory, check_interval=60)
+    assert shared.embeddings_stats() == {} and not built
+    shared.embeddings.embed_query("core values")
+    assert shared.embeddings_stats()["misses"] == 1 and len(built) == 1
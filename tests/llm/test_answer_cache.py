@@ -0,0 +1,128 @@
+from langchain_core.embeddings import Embeddings
+from app.services.llm import agent
+from app.services.llm.answer_cache import SemanticAnswerCache, is_cacheable_message
+from app.services.llm.memory import SessionStore, new_session_memory
+
+TOPICS = ["core", "values", "mindset", "growth", "courage", "habits"]
+
+
+class TopicEmbeddings(Embeddings):
+    """Bag of topic words: paraphrases about the same topics get identical vectors."""
+    calls = 0
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(topic in text.lower()) for topic in TOPICS] + [0.01]
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(**kwargs):
+    return SemanticAnswerCache(embeddings_factory=TopicEmbeddings, threshold=0.9, **kwargs)
+
+
+def ask(cache, question, answer=None, tools=()):
+    lookup = cache.lookup(question)
+    if lookup is not None and lookup.answer is None and answer is not None:
+        cache.store(lookup, answer, latency=2.0, tools_used=tools)
+    return lookup
+
+
+def test_paraphrase_hits_and_unrelated_misses():
+    cache = make_cache()
+    assert ask(cache, "what are core values", "Core values are ...").answer is None
+    assert ask(cache, "explain core values").answer == "Core values are ..."
+    assert ask(cache, "how do I build a growth mindset").answer is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["lookups"] == 3
+    assert stats["latency_saved_seconds"] == 2.0
+
+
+def test_ttl_expiry():
+    clock = Clock()
+    cache = make_cache(ttl_seconds=60, clock=clock)
+    ask(cache, "what are core values", "answer")
+    clock.now = 61
+    assert ask(cache, "explain core values").answer is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction():
+    cache = make_cache(max_entries=2)
+    ask(cache, "core values", "a1")
+    ask(cache, "growth mindset", "a2")
+    ask(cache, "core values?")  # touch: growth mindset is now least recently used
+    ask(cache, "courage habits", "a3")
+    assert cache.stats()["evicted"] == 1
+    assert ask(cache, "what about core values").answer == "a1"
+    assert ask(cache, "a growth mindset").answer is None
+
+
+def test_bypass_rules():
+    assert not is_cacheable_message("give me a motivational quote")
+    assert not is_cacheable_message("I weigh 80 kg and I am 180 cm tall")
+    assert is_cacheable_message("tell me more about core values")
+    assert not is_cacheable_message("tell me more about core values", has_history=True)
+
+    cache = make_cache()
+    assert cache.lookup("give me a quote") is None
+    # Answers from random or personal tools are not stored
+    ask(cache, "core values", "Pick: option A", tools=["decision_matrix"])
+    ask(cache, "growth mindset", "Mindset is ...", tools=["knowledge_base_search"])
+    ask(cache, "courage", "Error: upstream failed")
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bypassed"] == 2
+
+
+class FakeExecutor:
+    runs = 0
+
+    def __init__(self):
+        self.memory = new_session_memory()
+
+    def invoke(self, inputs, config=None):
+        FakeExecutor.runs += 1
+        answer = f"answer {FakeExecutor.runs}"
+        self.memory.save_context({"input": inputs["input"]}, {"output": answer})
+        return {"input": inputs["input"], "output": answer}
+
+
+def test_agent_serves_paraphrases_from_cache(monkeypatch):
+    monkeypatch.setattr(agent, "agent_sessions", SessionStore(FakeExecutor))
+    monkeypatch.setattr(agent, "answer_cache", make_cache())
+    FakeExecutor.runs = 0
+    assert agent.chat_with_agent("what are core values", "s1") == "answer 1"
+    assert agent.chat_with_agent("explain core values", "s2") == "answer 1"
+    assert FakeExecutor.runs == 1
+    # The cached turn is part of the session history
+    assert len(agent.agent_sessions.get("s2").memory.chat_memory.messages) == 2
+    # A follow-up in a session with history goes to the agent
+    assert agent.chat_with_agent("tell me more about core values", "s2") == "answer 2"
+
+
+def test_answers_given_with_history_are_not_shared():
+    cache = make_cache()
+    lookup = cache.lookup("What is my name?", has_history=True)
+    cache.store(lookup, "Your name is Alice.", latency=2.0)
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup("What is my name?", has_history=False).answer is None
+
+
+def test_another_session_asking_after_a_history_dependent_turn(monkeypatch):
+    monkeypatch.setattr(agent, "agent_sessions", SessionStore(FakeExecutor))
+    monkeypatch.setattr(agent, "answer_cache", make_cache())
+    FakeExecutor.runs = 0
+    agent.agent_sessions.get("alice").memory.save_context({"input": "My name is Alice"}, {"output": "Hi Alice"})
+    assert agent.chat_with_agent("What is my name?", "alice") == "answer 1"
+    # A fresh session asking the same question is answered by the agent, not from alice's turn
+    assert agent.chat_with_agent("What is my name?", "bob") == "answer 2"
+    assert FakeExecutor.runs == 2
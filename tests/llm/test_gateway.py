@@ -0,0 +1,126 @@
+import uuid
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.limiter import limiter
+from app.services.llm import client
+from app.services.llm.gateway import LLMGateway, UpstreamBusyError
+
+pytestmark = pytest.mark.usefixtures("openai_api_key")
+
+HEADERS = {"X-API-Key": "supersecretkey"}
+COMPLETION = {
+    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "hello"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+}
+
+
+def make_gateway(handler, **kwargs) -> LLMGateway:
+    transport = httpx.MockTransport(handler)
+    gateway = LLMGateway(transport=transport, async_transport=transport, **kwargs)
+    gateway.delays = []
+    gateway.sleep = gateway.delays.append
+
+    async def asleep(seconds):
+        gateway.delays.append(seconds)
+
+    gateway.asleep = asleep
+    return gateway
+
+
+def test_throttled_calls_are_retried_with_backoff():
+    statuses = iter([429, 503, 200])
+
+    def handler(request):
+        status = next(statuses)
+        return httpx.Response(status, json=COMPLETION, headers={"retry-after": "2"} if status == 429 else {})
+
+    gateway = make_gateway(handler, max_retries=3)
+    answer = gateway.chat_model("chat").invoke("hi")
+    assert answer.content == "hello"
+    # The first delay honours the provider's Retry-After
+    assert len(gateway.delays) == 2 and gateway.delays[0] >= 2
+    stats = gateway.stats()
+    chat = stats["callers"]["chat"]
+    assert (chat["calls"], chat["errors"], chat["retries"], chat["throttled"]) == (1, 0, 2, 1)
+    assert stats["in_flight"] == 0
+
+
+def test_exhausted_retries_surface_as_upstream_busy_503(monkeypatch):
+    gateway = make_gateway(lambda request: httpx.Response(429, json={"error": {"message": "slow down"}},
+                                                          headers={"retry-after": "7"}), max_retries=1)
+    monkeypatch.setattr(client, "chat_model", gateway.chat_model("chat"))
+    monkeypatch.setattr(limiter, "enabled", False)
+    with pytest.raises(UpstreamBusyError):
+        client.generate_response("hi")
+
+    response = TestClient(app).post("/memory-chat", headers=HEADERS,
+                                    json={"user_message": "hi", "session_id": uuid.uuid4().hex})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "7"
+    chat = gateway.stats()["callers"]["chat"]
+    # Two calls, each tried twice
+    assert (chat["errors"], chat["retries"], chat["throttled"]) == (2, 2, 4)
+    assert gateway.stats()["in_flight"] == 0
+
+
+def test_other_errors_are_not_retried():
+    gateway = make_gateway(lambda request: httpx.Response(400, json={"error": {"message": "bad request"}}))
+    with pytest.raises(Exception) as error:
+        gateway.chat_model("chat").invoke("hi")
+    assert not isinstance(error.value, UpstreamBusyError)
+    assert gateway.delays == [] and gateway.stats()["callers"]["chat"]["errors"] == 1
+
+
+def test_concurrency_limit_is_shared_by_all_callers():
+    active = {"now": 0, "max": 0}
+
+    async def handler(request):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.05)
+        active["now"] -= 1
+        return httpx.Response(200, json=COMPLETION)
+
+    gateway = make_gateway(handler, max_concurrency=2)
+
+    async def run():
+        calls = [gateway.chat_model(caller).ainvoke("hi") for caller in ("agent", "chat", "auto_score") * 2]
+        return await asyncio.gather(*calls)
+
+    answers = asyncio.run(run())
+    assert [a.content for a in answers] == ["hello"] * 6
+    assert active["max"] == 2
+    assert {caller: stats["calls"] for caller, stats in gateway.stats()["callers"].items()} == {
+        "agent": 2, "chat": 2, "auto_score": 2}
+
+
+def test_full_gateway_rejects_after_queue_timeout():
+    gateway = make_gateway(lambda request: httpx.Response(200, json=COMPLETION), max_concurrency=1,
+                           queue_timeout=0.05)
+    assert gateway.limiter.acquire()
+    with pytest.raises(UpstreamBusyError):
+        gateway.http_client("chat").get("http://llm.test/")
+    gateway.limiter.release()
+    assert gateway.http_client("chat").get("http://llm.test/").status_code == 200
+    assert gateway.stats()["callers"]["chat"]["rejected"] == 1
+
+
+def test_close_releases_both_connection_pools():
+    closed = []
+
+    class Transport(httpx.MockTransport):
+        def close(self):
+            closed.append("sync")
+
+        async def aclose(self):
+            closed.append("async")
+
+    transport = Transport(lambda request: httpx.Response(200, json=COMPLETION))
+    gateway = LLMGateway(transport=transport, async_transport=transport)
+    gateway.close()
+    asyncio.run(gateway.aclose())
+    assert closed == ["sync", "async"]
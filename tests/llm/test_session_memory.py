@@ -0,0 +1,124 @@
+import asyncio
+import time
+import threading
+from app.services.llm.memory import SessionStore, TokenWindowMemory, memory_tokens
+
+
+class Conversation:
+    def __init__(self):
+        self.memory = TokenWindowMemory(max_token_limit=50, return_messages=True)
+
+    def turn(self, text):
+        self.memory.save_context({"input": text}, {"output": text})
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sessions_have_separate_memory():
+    store = SessionStore(Conversation)
+    store.get("alice").turn("my name is Alice")
+    assert store.get("alice").memory.chat_memory.messages
+    assert not store.get("bob").memory.chat_memory.messages
+    # Requests without a session id never share history
+    anonymous = store.get(None)
+    anonymous.turn("my name is Mallory")
+    assert not store.get(None).memory.chat_memory.messages
+    assert store.stats()["live_sessions"] == 2 and store.stats()["ephemeral"] == 2
+
+
+def test_history_is_token_windowed():
+    conversation = Conversation()
+    for i in range(20):
+        conversation.turn(f"message number {i} " * 3)
+    assert memory_tokens(conversation.memory) <= 50
+    assert "19" in conversation.memory.chat_memory.messages[-1].content
+
+
+def test_lru_and_ttl_eviction():
+    clock = Clock()
+    store = SessionStore(Conversation, max_sessions=2, ttl_seconds=60, clock=clock)
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")  # evicts b, the least recently used
+    assert store.stats()["live_sessions"] == 2
+    first_a = store.get("a")
+    clock.now = 120
+    assert store.get("a") is not first_a
+    assert store.stats()["evicted"] == 3
+
+
+def test_global_token_cap_and_metrics():
+    store = SessionStore(Conversation, max_total_tokens=60)
+    for session_id in ("a", "b", "c"):
+        conversation = store.get(session_id)
+        store.observe_prompt(session_id, "hello there")
+        conversation.turn("x" * 100)
+        store.observe_memory(session_id)
+    stats = store.stats()
+    assert stats["buffered_tokens"] <= 60
+    assert stats["live_sessions"] < 3
+    assert stats["prompts"] == 3
+    assert stats["avg_prompt_tokens"] > 0
+
+
+def test_turns_of_a_session_are_serialized():
+    store = SessionStore(Conversation)
+    events = []
+
+    async def turn(session_id, text):
+        async with store.turn(session_id) as conversation:
+            events.append(("start", session_id))
+            await asyncio.sleep(0.01)
+            conversation.turn(text)
+            events.append(("end", session_id))
+
+    async def main():
+        await asyncio.gather(turn("a", "one"), turn("a", "two"), turn("b", "three"))
+
+    asyncio.run(main())
+    a_events = [kind for kind, session_id in events if session_id == "a"]
+    assert a_events == ["start", "end", "start", "end"]
+    # Another session does not wait for them
+    assert events.index(("start", "b")) < events.index(("end", "a"))
+    assert [m.content for m in store.get("a").memory.chat_memory.messages] == ["one", "one", "two", "two"]
+
+
+def test_sync_and_async_turns_of_a_session_are_serialized():
+    store = SessionStore(Conversation)
+    events = []
+
+    def sync_turn(text):
+        with store.sync_turn("a") as conversation:
+            events.append("start sync")
+            time.sleep(0.05)
+            conversation.turn(text)
+            events.append("end sync")
+
+    async def async_turn(text):
+        async with store.turn("a") as conversation:
+            events.append("start async")
+            await asyncio.sleep(0.01)
+            conversation.turn(text)
+            events.append("end async")
+
+    async def main():
+        worker = threading.Thread(target=sync_turn, args=("one",))
+        worker.start()
+        await asyncio.sleep(0.01)
+        # A turn waiting for the sync one and then cancelled must not keep the session locked
+        waiting = asyncio.ensure_future(async_turn("never"))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(async_turn("two"), asyncio.to_thread(worker.join))
+
+    asyncio.run(main())
+    assert events == ["start sync", "end sync", "start async", "end async"]
+    assert [m.content for m in store.get("a").memory.chat_memory.messages] == ["one", "one", "two", "two"]
+    with store.sync_turn("a"):
+        pass
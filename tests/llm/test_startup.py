@@ -0,0 +1,32 @@
+import os
+import sys
+import subprocess
+from app.knowledge_base.vector_store import shared_vector_store
+from app.services import warmup
+from app.services.llm import agent, client
+
+LAZY_IMPORT_CHECK = """
+import sys
+import app.main
+from app.services.llm import agent, client
+assert agent.agent is None and client.chat_model is None
+assert "langchain_openai" not in sys.modules and "langchain.agents" not in sys.modules
+assert "app.services.tools.llm_tools" not in sys.modules
+"""
+
+
+def test_importing_the_app_builds_nothing_and_prints_nothing():
+    env = {**os.environ, "OPENAI_API_KEY": "sk-test", "PYTHONPATH": os.getcwd()}
+    result = subprocess.run([sys.executable, "-c", LAZY_IMPORT_CHECK], env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ""
+
+
+def test_warm_up_builds_models_and_skips_failed_steps(monkeypatch, tmp_path, openai_api_key):
+    monkeypatch.setattr(shared_vector_store, "index_dir", str(tmp_path))
+    report = warmup.warm_up()
+    assert agent.agent is not None and client.chat_model is not None
+    assert isinstance(report["agent"], float)
+    assert report["vector_store"].startswith("error:")
+    # Built once, shared afterwards
+    assert agent.get_agent() is agent.agent
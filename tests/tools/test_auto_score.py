@@ -0,0 +1,63 @@
+import json
+import time
+import threading
+from app.services.tools import llm_tools
+
+
+class FakeLLM:
+    """Answers scoring prompts with fixed JSON and counts calls."""
+
+    def __init__(self, single_answer=None, delay=0.0):
+        self.single_answer = single_answer
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if "each of these criteria" in prompt:
+            content = json.dumps(self.single_answer) if self.single_answer is not None else "not json"
+        else:
+            content = json.dumps({"scores": [4, 2], "explanations": ["good", "bad"]})
+        return type("Response", (), {"content": content})()
+
+
+def reset_cache(monkeypatch):
+    monkeypatch.setattr(llm_tools, "_score_cache", llm_tools.OrderedDict())
+
+
+def test_single_call_scores_all_criteria(monkeypatch):
+    reset_cache(monkeypatch)
+    answer = {"criteria": {"salary": {"scores": [5, 3], "explanations": ["high", "mid"]},
+                           "workload": {"scores": [2, 4], "explanations": ["heavy", "light"]}}}
+    fake = FakeLLM(single_answer=answer)
+    monkeypatch.setattr(llm_tools, "llm", fake)
+    scores, explanations = llm_tools.auto_score(["Nurse", "Teacher"], ["salary", "workload", "passion"],
+                                                with_explanations=True)
+    assert fake.calls == 1
+    assert scores == [[5, 2, 1], [3, 4, 1]]
+    assert explanations[1][0] == "mid"
+
+
+def test_fallback_runs_per_criterion_calls_concurrently(monkeypatch):
+    reset_cache(monkeypatch)
+    fake = FakeLLM(single_answer=None, delay=0.2)
+    monkeypatch.setattr(llm_tools, "llm", fake)
+    monkeypatch.setattr(llm_tools, "AUTO_SCORE_CONCURRENCY", 4)
+    start = time.perf_counter()
+    scores = llm_tools.auto_score(["A", "B"], ["salary", "hours", "growth", "stability"])
+    elapsed = time.perf_counter() - start
+    assert fake.calls == 5  # one failed single call + four concurrent fallbacks
+    assert scores == [[4, 4, 4, 4], [2, 2, 2, 2]]
+    assert elapsed < 0.2 * 5
+
+
+def test_repeated_comparison_hits_cache(monkeypatch):
+    reset_cache(monkeypatch)
+    fake = FakeLLM()
+    monkeypatch.setattr(llm_tools, "llm", fake)
+    llm_tools.auto_score(["Nurse", "Teacher"], ["salary"])
+    llm_tools.auto_score(["nurse", "teacher "], ["Salary"])
+    assert fake.calls == 1